@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+服务商适配层：负责构造请求（地址、请求头、请求体）以及把响应分片、usage 统一为 OpenAI 兼容格式。
+请求体按 (模型, 提示词) 只序列化一次并缓存字节，高频测试时不再重复构造与编码 JSON。
+
+MODELS_CONFIG 中可用 "adapter" 字段指定适配器，未指定时按接口地址识别：
+- openai：OpenAI 兼容接口（默认）
+- qianfan：百度千帆。可选 "appid" 字段作为 appid 请求头；兼容旧版接口分片中的 result / is_end 字段
+- ark：字节火山方舟。model 为推理接入点 ID（ep-xxx），可用 "endpoint_id" 字段单独配置
+新增非 OpenAI 兼容的服务商时，继承 OpenAIAdapter 并覆盖相应方法，再加入 ADAPTERS 即可。
+"""
+
+import json
+import threading
+from urllib.parse import urlparse
+
+# 请求体缓存的最大条目数，超出后整体清空（提示词更新后旧的条目不会再被使用）
+PREPARED_CACHE_SIZE = 4096
+
+
+class PreparedRequest:
+    """预先构造好的请求；body 为序列化后的字节，payload 为对应的 dict（录制/回放按其匹配）"""
+
+    __slots__ = ("adapter", "url", "headers", "body", "payload", "config")
+
+    def __init__(self, adapter, url, headers, body, payload, config):
+        self.adapter = adapter
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.payload = payload
+        self.config = config
+
+
+class OpenAIAdapter:
+    name = "openai"
+
+    def model_name(self, model_key, config):
+        return config.get("payload_model", model_key)
+
+    def headers(self, config):
+        return {
+            "Authorization": f"Bearer {config['api_key']}",
+            "Content-Type": "application/json"
+        }
+
+    def payload(self, model_key, config, prompt):
+        return {
+            "model": self.model_name(model_key, config),
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            "response_format": {"type": "text"}
+        }
+
+    def probe_payload(self, model_key, config, prompt):
+        """熔断状态下的探测请求：非流式、只生成 1 个 token"""
+        return {
+            "model": self.model_name(model_key, config),
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 1,
+            "stream": False
+        }
+
+    def parse_chunk(self, chunk):
+        """把一个流式分片转换为 OpenAI 格式（choices[].delta），None 原样返回"""
+        return chunk
+
+    def normalize_usage(self, usage):
+        """
+        统一 usage 字段：input_tokens / output_tokens 转为 prompt_tokens / completion_tokens，
+        缺少 total_tokens 时补齐，顶层的 reasoning_tokens 移到 completion_tokens_details 中。
+        """
+        if not usage:
+            return {}
+        usage = dict(usage)
+        if "completion_tokens" not in usage and "output_tokens" in usage:
+            usage["completion_tokens"] = usage["output_tokens"]
+        if "prompt_tokens" not in usage and "input_tokens" in usage:
+            usage["prompt_tokens"] = usage["input_tokens"]
+        if usage.get("total_tokens") is None and isinstance(usage.get("completion_tokens"), int):
+            usage["total_tokens"] = (usage.get("prompt_tokens") or 0) + usage["completion_tokens"]
+        details = usage.get("completion_tokens_details") or {}
+        if "reasoning_tokens" not in details and isinstance(usage.get("reasoning_tokens"), int):
+            usage["completion_tokens_details"] = dict(details, reasoning_tokens=usage["reasoning_tokens"])
+        return usage
+
+
+class QianfanAdapter(OpenAIAdapter):
+    name = "qianfan"
+
+    def headers(self, config):
+        headers = super().headers(config)
+        if config.get("appid"):
+            headers["appid"] = str(config["appid"])
+        return headers
+
+    def payload(self, model_key, config, prompt):
+        payload = super().payload(model_key, config, prompt)
+        del payload["response_format"]
+        return payload
+
+    def parse_chunk(self, chunk):
+        # 旧版千帆接口的分片没有 choices，文本在 result 中，结束标记为 is_end
+        if chunk is None or "choices" in chunk or "result" not in chunk:
+            return chunk
+        return {
+            "id": chunk.get("id"),
+            "model": chunk.get("model"),
+            "choices": [{
+                "delta": {"content": chunk.get("result") or ""},
+                "finish_reason": chunk.get("finish_reason") or ("stop" if chunk.get("is_end") else None)
+            }],
+            "usage": chunk.get("usage"),
+        }
+
+
+class ArkAdapter(OpenAIAdapter):
+    name = "ark"
+
+    def model_name(self, model_key, config):
+        return config.get("endpoint_id") or config.get("payload_model", model_key)
+
+    def payload(self, model_key, config, prompt):
+        payload = super().payload(model_key, config, prompt)
+        del payload["response_format"]
+        return payload
+
+
+ADAPTERS = {adapter.name: adapter for adapter in (OpenAIAdapter(), QianfanAdapter(), ArkAdapter())}
+
+# 未指定 adapter 时按接口域名识别
+HOST_ADAPTERS = {
+    "qianfan.baidubce.com": "qianfan",
+    "aip.baidubce.com": "qianfan",
+    "volces.com": "ark",
+}
+
+_prepared = {}
+_prepared_lock = threading.Lock()
+
+
+def get_adapter(config):
+    name = config.get("adapter")
+    if name is None:
+        host = urlparse(config.get("url", "")).hostname or ""
+        name = next((n for suffix, n in HOST_ADAPTERS.items() if host == suffix or host.endswith("." + suffix)),
+                    "openai")
+    try:
+        return ADAPTERS[name]
+    except KeyError:
+        raise ValueError(f"unknown adapter: {name}") from None
+
+
+def prepare(model_key, config, prompt, probe=False):
+    """
+    返回 (适配器, PreparedRequest)。同一模型与提示词的请求只构造、序列化一次；
+    模型配置被替换（例如端点注册表重新加载）后自动重新构造。
+    """
+    key = (model_key, prompt, probe)
+    with _prepared_lock:
+        prepared = _prepared.get(key)
+    if prepared is not None and prepared.config is config:
+        return prepared.adapter, prepared
+    adapter = get_adapter(config)
+    build = adapter.probe_payload if probe else adapter.payload
+    payload = build(model_key, config, prompt)
+    prepared = PreparedRequest(
+        adapter,
+        config["url"],
+        adapter.headers(config),
+        json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+        payload,
+        config,
+    )
+    with _prepared_lock:
+        if len(_prepared) >= PREPARED_CACHE_SIZE:
+            _prepared.clear()
+        _prepared[key] = prepared
+    return adapter, prepared
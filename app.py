@@ -7,26 +7,65 @@ Author: Gwaanl
 """
 
 import os
-import threading
+import time
+import zlib
 import logging
+import sqlite3
 import datetime
 import webbrowser  # 用于自动打开浏览器
+from html import escape
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context, send_from_directory
 from flask_apscheduler import APScheduler
 
 # ======= 导入我们拆分后的其他模块 =======
-from config import Config
-from db_utils import init_db, load_latest_test_result, load_all_test_results, load_test_result_by_id
-from test_runner import background_test_runner, scheduled_job, test_progress
-from test_runner import custom_prompt, set_custom_prompt
+from config import Config, COLLECTOR, PROFILING, TIMESERIES
+import db_utils
+from db_utils import load_latest_test_result, load_all_test_results, load_test_result_by_id, search_probe_results
+from db_utils import load_records_version, record_exists, save_probe_results, load_vantage_summary
+from db_utils import load_run_trace, load_probe_text, PROBE_TEXT_FIELDS
+from db_utils import load_changepoint_alerts, load_changepoint_states, load_alerts_version
+from db_utils import load_probes_version, SERIES_METRICS
+from http_cache import cached_page, init_app as init_http_cache
+import profiling
+import test_runner
+import timeseries
+from health import breaker_snapshot
+from job_scheduler import run_in_slot, register_scheduled_jobs
+from retention import register_retention_job
+import registry
+from run_state import get_run, list_runs
+from run_trace import PHASES, PHASE_COLORS, span_phases, to_chrome_trace
+from rate_limiter import provider_of
 from utils import logger  # 使用同一个 logger 避免多次配置
-from utils import export_tables_to_image
 
 # ======= Flask 应用初始化 =======
 app = Flask(__name__)
 app.config.from_object(Config())
 
+# 响应压缩（brotli / gzip）
+init_http_cache(app)
+
+# 按请求的性能分析（PROFILING["enabled"] 为 False 时不注册任何钩子）
+profiling.init_app(app)
+
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    """请求线程由 werkzeug 按请求创建，结束时把读连接放回连接池，避免每个请求遗留一个连接"""
+    db_utils.release_read_connection()
+
+
+# 页面模板版本，修改页面渲染（HTML/CSS/JS）后需递增，使浏览器缓存的旧页面失效
+RENDER_VERSION = 6
+
+# 已保存的测试记录不会再改变，详情页可以长期缓存；首页与历史页每次都向服务器确认（命中时返回 304）
+RESULT_CACHE_CONTROL = "public, max-age=86400, immutable"
+LISTING_CACHE_CONTROL = "no-cache"
+
+# 首页显示的最近突变告警条数
+ALERTS_ON_INDEX = 5
+
 # 隐藏Flask默认请求日志
 logging.getLogger('werkzeug').setLevel(logging.ERROR)
 
@@ -34,29 +73,294 @@ logging.getLogger('werkzeug').setLevel(logging.ERROR)
 scheduler = APScheduler()
 scheduler.init_app(app)
 scheduler.start()
+register_scheduled_jobs(scheduler)
+register_retention_job(scheduler)
+registry.register_reload_job(scheduler)
+
+
+# ========== 页面 ETag ==========
+def index_etag():
+    """首页内容取决于最新记录、最新告警和当前提示词"""
+    _count, latest_id = load_records_version()
+    prompt_hash = zlib.crc32(test_runner.custom_prompt.encode("utf-8"))
+    return f"i{latest_id}-a{load_alerts_version()}-{prompt_hash:08x}-v{RENDER_VERSION}"
+
+
+def history_etag():
+    """历史列表取决于记录数与最大 id（保留任务删除旧记录时记录数变化）"""
+    count, latest_id = load_records_version()
+    return f"h{count}-{latest_id}-v{RENDER_VERSION}"
+
+
+def probe_text_etag(probe_id, field):
+    """请求明细保存后不再改变"""
+    return f"p{probe_id}-{field}-v{RENDER_VERSION}"
+
+
+def timeseries_etag():
+    """
+    趋势图数据取决于请求参数、实际的起始时间以及请求明细与日汇总的版本；
+    相对时间范围（days）的起始时间随时间滑动（按降采样桶取整），滑过一个桶后 ETag 随之变化
+    """
+    start = timeseries.window_start(request.args.get("start") or None, request.args.get("days", type=float),
+                                    request.args.get("width", 800, type=int))
+    max_id, rollup_requests = load_probes_version()
+    return f"t{zlib.crc32(request.query_string + start.encode()):08x}-{max_id}-{rollup_requests}"
+
+
+def result_etag(record_id):
+    """详情页由记录 id 与页面模板版本唯一确定；记录不存在时不缓存"""
+    if not record_exists(record_id):
+        return None
+    return f"r{record_id}-v{RENDER_VERSION}"
+
+
+# ========== 页面片段 ==========
+def render_warmup_section(warmup_html):
+    """预热请求表格（不计入统计），旧记录没有预热数据时返回空字符串"""
+    if not warmup_html:
+        return ""
+    return f"""
+    <h2>预热请求 (不计入统计)</h2>
+    {warmup_html}
+    """
+
+
+def render_timeline(trace):
+    """
+    请求时间线（甘特图）：每个请求一行，横轴为相对运行开始的秒数，
+    灰色为请求整体，彩色为各阶段（见 run_trace.PHASES），竖线为调度线程启动测试线程的时间。
+    """
+    spans = sorted(trace["spans"], key=lambda s: s["marks"].get("start", 0))
+    if not spans:
+        return "<p>本次运行没有请求时间线数据。</p>"
+    total = max(max(s["marks"].values()) for s in spans) or 1.0
+
+    def pct(seconds):
+        return f"{seconds / total * 100:.3f}%"
+
+    legend = "".join(
+        f'<span style="display:inline-block;width:12px;height:12px;background:{PHASE_COLORS[name]};'
+        f'margin:0 4px 0 12px;vertical-align:middle;"></span>{name}'
+        for name, _start, _end in PHASES
+    )
+    ticks = "".join(
+        f'<div title="spawn {e["args"].get("model_key")} @ {e["at"]:.3f}s" '
+        f'style="position:absolute;left:{pct(e["at"])};top:0;bottom:0;border-left:1px dashed #999;"></div>'
+        for e in trace["events"] if e["name"] == "spawn"
+    )
+    rows = []
+    for span in spans:
+        marks = span["marks"]
+        start = marks.get("start", 0)
+        end = marks.get("end", max(marks.values()))
+        segments = "".join(
+            f'<div title="{name}: {(b - a) * 1000:.0f} ms" style="position:absolute;left:{pct(a)};'
+            f'width:{pct(b - a)};top:3px;bottom:3px;background:{PHASE_COLORS[name]};"></div>'
+            for name, a, b in span_phases(span)
+        )
+        label = f"{span['model_name']} R{span['round']}" + (" (预热)" if span["warmup"] else "")
+        rows.append(f"""
+        <tr>
+            <td style="text-align:left;white-space:nowrap;">{label}<br><small>{span['thread']}</small></td>
+            <td>{start:.3f}s</td>
+            <td>{end - start:.3f}s</td>
+            <td>{span['status'] or '-'}</td>
+            <td style="position:relative;width:60%;padding:0;">
+                {ticks}
+                <div title="{start:.3f}s - {end:.3f}s" style="position:absolute;left:{pct(start)};width:{pct(end - start)};
+                     top:1px;bottom:1px;background:#ddd;"></div>
+                {segments}
+            </td>
+        </tr>""")
+    return f"""
+    <p>横轴总长 {total:.3f} 秒（相对运行开始），虚线为测试线程启动时间。{legend}</p>
+    <table>
+        <tr><th>请求</th><th>开始</th><th>耗时</th><th>状态</th><th>时间线</th></tr>
+        {"".join(rows)}
+    </table>
+    """
+
+
+def render_alerts_table(alerts):
+    """突变告警表格：指标变差（回退）的行标红，记录链接指向检测到突变的那次运行"""
+    if not alerts:
+        return "<p>暂无性能突变告警。</p>"
+    rows = []
+    for a in alerts:
+        magnitude = f"{a['magnitude']:+.1%}" if a["magnitude"] is not None else "-"
+        record = f'<a href="/result/{a["record_id"]}">{a["record_id"]}</a>' if a["record_id"] else "-"
+        style = ' style="background-color:#fdecea;"' if a["regression"] else ""
+        rows.append(
+            f"<tr{style}><td>{a['detected_at'][:19]}</td><td>{a['model_name'] or a['model_key']}</td>"
+            f"<td>{a['metric']}</td><td>{'回退' if a['regression'] else '改善'} ({a['direction']})</td>"
+            f"<td>{a['before_mean']:.3f} → {a['after_mean']:.3f}</td><td><b>{magnitude}</b></td>"
+            f"<td>{record}</td></tr>"
+        )
+    return f"""
+    <table>
+        <tr><th>检测时间</th><th>模型</th><th>指标</th><th>类型</th><th>突变前 → 突变后均值</th><th>幅度</th><th>记录</th></tr>
+        {"".join(rows)}
+    </table>
+    """
+
+
+def render_alerts_section():
+    """首页的最近告警，没有告警时不显示"""
+    alerts = load_changepoint_alerts(limit=ALERTS_ON_INDEX)
+    if not alerts:
+        return ""
+    return f"""
+    <h2>性能突变告警 (最近 {len(alerts)} 条)</h2>
+    {render_alerts_table(alerts)}
+    <p><a href="/alerts">查看全部告警</a></p>
+    """
+
+
+def render_trend_chart():
+    """
+    趋势图：按图表的实际像素宽度请求 /timeseries（服务端已降采样），在 canvas 上绘制各模型的折线。
+    横轴按 UTC 显示，即测试记录中的本地时间。
+    """
+    metric_options = "".join(f'<option value="{m}">{m}</option>' for m in SERIES_METRICS)
+    return f"""
+    <h2>趋势</h2>
+    <div class="flex-row">
+        <div>
+            <label for="trend-metric">指标:</label>
+            <select id="trend-metric" onchange="loadTrend()">{metric_options}</select>
+        </div>
+        <div>
+            <label for="trend-days">最近天数:</label>
+            <input type="number" id="trend-days" value="{TIMESERIES['default_days']}" min="1" max="3650"
+                   onchange="loadTrend()">
+        </div>
+        <div id="trend-info" style="color:#777;"></div>
+    </div>
+    <canvas id="trend-chart" style="width:100%;height:320px;border:1px solid #ccc;"></canvas>
+    <div id="trend-legend"></div>
+    <script>
+    const TREND_COLORS = ["#0275d8", "#d9534f", "#5cb85c", "#f0ad4e", "#9b59b6", "#5bc0de", "#34495e",
+                          "#e67e22", "#16a085", "#c0392b"];
+
+    function loadTrend() {{
+        const canvas = document.getElementById("trend-chart");
+        const metric = document.getElementById("trend-metric").value;
+        const days = document.getElementById("trend-days").value;
+        const width = Math.max(100, Math.round(canvas.clientWidth));
+        fetch(`/timeseries?metric=${{metric}}&days=${{days}}&width=${{width}}`)
+          .then(resp => resp.json())
+          .then(data => drawTrend(canvas, data));
+    }}
+
+    function drawTrend(canvas, data) {{
+        const ratio = window.devicePixelRatio || 1;
+        const w = canvas.clientWidth, h = canvas.clientHeight;
+        canvas.width = w * ratio;
+        canvas.height = h * ratio;
+        const ctx = canvas.getContext("2d");
+        ctx.scale(ratio, ratio);
+        ctx.clearRect(0, 0, w, h);
+        const series = data.series || [];
+        const all = series.flatMap(s => s.points);
+        const total = series.reduce((n, s) => n + s.count, 0);
+        document.getElementById("trend-info").textContent =
+            `${{total}} 个请求，绘制 ${{all.length}} 个点，${{data.took_ms}} ms${{data.cached ? "（缓存）" : ""}}`;
+        if (!all.length) {{
+            ctx.fillStyle = "#999";
+            ctx.fillText("所选范围内没有数据", 10, 20);
+            document.getElementById("trend-legend").innerHTML = "";
+            return;
+        }}
+        const pad = {{left: 50, right: 10, top: 10, bottom: 24}};
+        const xs = all.map(p => p[0]), ys = all.map(p => p[1]);
+        const x0 = Math.min(...xs), x1 = Math.max(...xs) || x0 + 1;
+        const y0 = 0, y1 = Math.max(...ys) * 1.05 || 1;
+        const px = x => pad.left + (x - x0) / ((x1 - x0) || 1) * (w - pad.left - pad.right);
+        const py = y => h - pad.bottom - (y - y0) / (y1 - y0) * (h - pad.top - pad.bottom);
+        ctx.strokeStyle = "#eee";
+        ctx.fillStyle = "#777";
+        ctx.font = "11px sans-serif";
+        for (let i = 0; i <= 4; i++) {{
+            const y = y0 + (y1 - y0) * i / 4;
+            ctx.beginPath(); ctx.moveTo(pad.left, py(y)); ctx.lineTo(w - pad.right, py(y)); ctx.stroke();
+            ctx.fillText(y.toFixed(2), 4, py(y) + 4);
+        }}
+        for (let i = 0; i <= 4; i++) {{
+            const x = x0 + (x1 - x0) * i / 4;
+            const label = new Date(x).toISOString().slice(5, 16).replace("T", " ");
+            ctx.fillText(label, Math.min(px(x), w - 70), h - 6);
+        }}
+        const legend = [];
+        series.forEach((s, i) => {{
+            const color = TREND_COLORS[i % TREND_COLORS.length];
+            ctx.strokeStyle = color;
+            ctx.lineWidth = 1.5;
+            ctx.beginPath();
+            s.points.forEach((p, j) => j ? ctx.lineTo(px(p[0]), py(p[1])) : ctx.moveTo(px(p[0]), py(p[1])));
+            ctx.stroke();
+            const item = document.createElement("span");
+            item.style.color = color;
+            item.style.marginRight = "16px";
+            item.textContent = `■ ${{s.model_name}} (${{s.count}})`;
+            legend.push(item);
+        }});
+        document.getElementById("trend-legend").replaceChildren(...legend);
+    }}
+
+    window.addEventListener("load", loadTrend);
+    </script>
+    """
+
+
+def render_profile_links(run_id):
+    """本次运行的性能分析文件链接，没有开启分析时返回空字符串"""
+    files = profiling.run_profile_files(run_id)
+    if not files:
+        return ""
+    links = " | ".join(f'<a href="/profiles/{name}">{name}</a>' for name in files)
+    return f"<p>性能分析: {links}（.prof 可用 snakeviz 或 pstats 打开）</p>"
 
 
 # ========== 路由区域 ==========
 @app.route("/start_test")
 def start_test_route():
-    """手动启动测试的接口，支持自定义超时"""
+    """手动启动测试的接口，支持自定义超时、运行标签和执行模式，可与其他测试同时进行"""
     timeout = int(request.args.get("timeout", 300))  # 默认 5 分钟
-    logger.info(f"开始一轮测试（后台线程），超时时间: {timeout}秒")
+    label = request.args.get("label", "manual")
+    mode = request.args.get("mode")
+    cooldown = request.args.get("cooldown", type=float)
+    profile = request.args.get("profile") == "1"
+    if profile and not PROFILING["enabled"]:
+        return "性能分析未开启，请在 config.py 中设置 PROFILING['enabled'] = True", 400
+    tags = [t for t in request.args.get("tags", "").split(",") if t]
+    groups = [g for g in request.args.get("group", "").split(",") if g]
+    model_keys = registry.resolve_models(tags=tags, groups=groups)
+    if model_keys == []:
+        return "没有与 tags / group 匹配的已启用端点", 400
+    logger.info(f"开始一轮测试（后台线程），超时时间: {timeout}秒，标签: {label}，模式: {mode or '默认'}"
+                + ("，开启性能分析" if profile else ""))
+
+    # 并发槽位保证同一时间不会有超过 MAX_CONCURRENT_RUNS 个测试（包括定时任务）
+    try:
+        state = run_in_slot(timeout, model_keys, label=label, mode=mode, cooldown=cooldown, profile=profile)
+    except ValueError as e:
+        return f"参数错误: {e}", 400
+    if state is None:
+        return "已达到同时测试数量上限，请稍候再试。"
 
-    global test_progress
-    with test_progress["lock"]:
-        if test_progress["status"] == "running":
-            return "已有测试正在进行，请稍候再试。"
-        test_progress["status"] = "running"
-        test_progress["current_round"] = 0
-        test_progress["total_rounds"] = 3
-        test_progress["finished_models"] = []
-        test_progress["unfinished_models"] = []
+    return f"测试已后台启动！运行ID: {state.run_id}"
 
-    thread = threading.Thread(target=background_test_runner, args=(timeout,))
-    thread.start()
 
-    return "测试已后台启动！"
+@app.route("/endpoints")
+def endpoints_route():
+    """列出全部端点（models_config.py 与端点注册表）及其分组、标签和启用状态，可按 tags / group 筛选"""
+    registry.reload()
+    tags = set(t for t in request.args.get("tags", "").split(",") if t)
+    groups = set(g for g in request.args.get("group", "").split(",") if g)
+    rows = [row for row in registry.snapshot()
+            if (not tags or tags & set(row["tags"])) and (not groups or row["group"] in groups)]
+    return jsonify({"count": len(rows), "enabled": sum(1 for row in rows if row["enabled"]), "endpoints": rows})
 
 
 @app.route("/update_prompt")
@@ -64,29 +368,290 @@ def update_prompt_route():
     """更新自定义提示词"""
     prompt = request.args.get("prompt", "")
     if prompt:
-        set_custom_prompt(prompt)
+        test_runner.set_custom_prompt(prompt)
         logger.info(f"更新提示词为: {prompt}")
     return "提示词已更新！"
 
 
 @app.route("/test_progress")
 def test_progress_route():
-    """查看当前测试进度"""
-    global test_progress
-    with test_progress["lock"]:
-        return jsonify({
-            "status": test_progress["status"],
-            "current_round": test_progress["current_round"],
-            "total_rounds": test_progress["total_rounds"],
-            "finished_models": test_progress["finished_models"],
-            "unfinished_models": test_progress["unfinished_models"],
-        })
+    """
+    查看所有进行中测试的进度。
+    顶层字段取最早开始的进行中测试，runs 中列出全部进行中的测试。
+    """
+    runs = [state.to_dict() for state in list_runs(active_only=True)]
+    first = runs[0] if runs else None
+    return jsonify({
+        "status": "running" if runs else "idle",
+        "run_id": first["run_id"] if first else None,
+        "current_round": first["current_round"] if first else 0,
+        "total_rounds": first["total_rounds"] if first else 3,
+        "finished_models": first["finished_models"] if first else [],
+        "unfinished_models": first["unfinished_models"] if first else [],
+        "runs": runs,
+        "circuit_breakers": breaker_snapshot(),
+    })
+
+
+@app.route("/test_progress/<run_id>")
+def run_progress_route(run_id):
+    """查看指定运行的进度"""
+    state = get_run(run_id)
+    if state is None:
+        return jsonify({"error": f"run {run_id} not found"}), 404
+    data = state.to_dict()
+    data["circuit_breakers"] = breaker_snapshot()
+    return jsonify(data)
+
+
+@app.route("/test_progress/<run_id>/trace.json")
+def run_trace_route(run_id):
+    """导出进行中（或最近结束）运行的 Chrome trace JSON"""
+    state = get_run(run_id)
+    if state is None:
+        return jsonify({"error": f"run {run_id} not found"}), 404
+    return jsonify(to_chrome_trace(state.trace.to_dict()))
+
+
+@app.route("/collect", methods=["POST"])
+def collect_route():
+    """
+    接收 worker.py 上报的测试结果并按探测点保存。
+    请求体：{"vantage": "...", "run_id": "...", "results": [...]}，请求头 X-Collector-Token 需与 COLLECTOR["token"] 一致；
+    未配置 token 时拒绝上报，除非 COLLECTOR["allow_unauthenticated"] 为 True。重复上报的同一条结果只保存一次。
+    """
+    if not COLLECTOR.get("token"):
+        if not COLLECTOR.get("allow_unauthenticated"):
+            return jsonify({"error": "collector token is not configured"}), 403
+    elif request.headers.get("X-Collector-Token") != COLLECTOR["token"]:
+        return jsonify({"error": "invalid collector token"}), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "request body must be a JSON object"}), 400
+    vantage = str(data.get("vantage") or "").strip()
+    run_id = str(data.get("run_id") or "").strip()
+    results = data.get("results")
+    if not vantage or not run_id or not isinstance(results, list):
+        return jsonify({"error": "vantage, run_id and results are required"}), 400
+    if not all(isinstance(r, dict) and r.get("model_key") for r in results):
+        return jsonify({"error": "each result must be an object with model_key"}), 400
+    for r in results:
+        r["vantage"] = vantage
+    stored = save_probe_results(None, run_id, results)
+    logger.info(f"收到探测点 {vantage} 运行 {run_id} 的 {len(results)} 条结果，新增 {stored} 条")
+    return jsonify({"received": len(results), "stored": stored})
+
+
+@app.route("/vantage")
+def vantage_page():
+    """
+    按探测点对比各模型：行为模型，列为探测点，单元格为平均 tokens/s、成功率与平均首个回答 token 时间。
+    参数 hours 为统计的时间范围（默认 24 小时），format=json 时返回 JSON。
+    """
+    hours = request.args.get("hours", 24, type=float)
+    since = (datetime.datetime.now() - datetime.timedelta(hours=hours)).isoformat()
+    rows = load_vantage_summary(since)
+    for row in rows:
+        row["provider"] = provider_of(row["model_key"])
+        row["success_rate"] = row["ok_count"] / row["requests"] if row["requests"] else None
+    if request.args.get("format") == "json":
+        return jsonify({"since": since, "rows": rows})
+
+    vantages = sorted({row["vantage"] for row in rows})
+    models = {}
+    for row in rows:
+        models.setdefault(row["model_key"], {"model_name": row["model_name"], "provider": row["provider"]})
+        models[row["model_key"]][row["vantage"]] = row
+
+    def cell(row):
+        if row is None:
+            return "<td>-</td>"
+        tps = f"{row['avg_tokens_per_second']:.2f}" if row["avg_tokens_per_second"] is not None else "-"
+        tta = f"{row['avg_time_to_answer']:.2f}s" if row["avg_time_to_answer"] is not None else "-"
+        return (f"<td><b>{tps}</b> tokens/s<br>成功 {row['ok_count']}/{row['requests']}"
+                f"<br>首个回答 {tta}</td>")
+
+    # 探测点、模型名与服务商都来自 /collect 上报的数据，需要转义
+    header = "".join(f"<th>{escape(v)}</th>" for v in vantages)
+    body = "".join(
+        f"<tr><td>{escape(str(info['model_name']))}<br><small>{escape(str(info['provider']))}</small></td>"
+        + "".join(cell(info.get(v)) for v in vantages) + "</tr>"
+        for info in models.values()
+    )
+    return f"""
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="utf-8">
+    <title>按探测点对比</title>
+    <style>
+    body {{ font-family: "Helvetica Neue", Arial, sans-serif; margin: 20px; color: #333; }}
+    table {{ border: 1px solid #ccc; border-collapse: collapse; margin: 16px 0; width: 100%; }}
+    th, td {{ border: 1px solid #ccc; padding: 8px; text-align: center; }}
+    th {{ background-color: #f7f7f7; font-weight: bold; }}
+    a {{ color: #337ab7; text-decoration: none; }}
+    </style>
+</head>
+<body>
+    <h1>按探测点对比（最近 {hours:g} 小时）</h1>
+    <table>
+        <tr><th>模型</th>{header}</tr>
+        {body}
+    </table>
+    <p><a href="/history">查看历史记录</a> | <a href="/">返回最新测试结果</a></p>
+</body>
+</html>
+"""
+
+
+@app.route("/timeseries")
+@cached_page(timeseries_etag, LISTING_CACHE_CONTROL)
+def timeseries_route():
+    """
+    趋势图数据：metric 为指标（默认 tokens_per_second），days 为最近天数，或用 start / end 指定时间范围，
+    width 为图表像素宽度（每个模型最多返回 width 个降采样后的点），models 为逗号分隔的模型 key，
+    vantage 为探测点（默认本地）。
+    """
+    try:
+        data = timeseries.load_series(
+            metric=request.args.get("metric", "tokens_per_second"),
+            start=request.args.get("start") or None,
+            end=request.args.get("end") or None,
+            days=request.args.get("days", type=float),
+            width=request.args.get("width", 800, type=int),
+            model_keys=[m for m in request.args.get("models", "").split(",") if m] or None,
+            vantage=request.args.get("vantage") or None,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(data)
+
+
+@app.route("/alerts")
+def alerts_page():
+    """
+    性能突变告警（见 changepoint.py）。参数 hours 为时间范围（默认全部），model 只看某个模型，
+    regressions=1 只看指标变差的告警，limit 为最多条数（默认 100）；format=json 时返回 JSON，
+    其中 series 为各 (模型, 指标) 序列当前的基线与 CUSUM 状态。
+    """
+    hours = request.args.get("hours", type=float)
+    since = (datetime.datetime.now() - datetime.timedelta(hours=hours)).isoformat() if hours else None
+    alerts = load_changepoint_alerts(
+        since=since,
+        model_key=request.args.get("model") or None,
+        regressions_only=request.args.get("regressions") == "1",
+        limit=request.args.get("limit", 100, type=int),
+    )
+    if request.args.get("format") == "json":
+        return jsonify({"since": since, "alerts": alerts, "series": load_changepoint_states()})
+    return f"""
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="utf-8">
+    <title>性能突变告警</title>
+    <style>
+    body {{ font-family: "Helvetica Neue", Arial, sans-serif; margin: 20px; color: #333; }}
+    table {{ border: 1px solid #ccc; border-collapse: collapse; margin: 16px 0; width: 100%; }}
+    th, td {{ border: 1px solid #ccc; padding: 8px; text-align: center; }}
+    th {{ background-color: #f7f7f7; font-weight: bold; }}
+    a {{ color: #337ab7; text-decoration: none; }}
+    </style>
+</head>
+<body>
+    <h1>性能突变告警{f"（最近 {hours:g} 小时）" if hours else ""}</h1>
+    <p>每次测试后按各模型的平均值更新 CUSUM 统计量，超过阈值即记录一次突变；标红的为指标变差（回退）。</p>
+    {render_alerts_table(alerts)}
+    <p><a href="/history">查看历史记录</a> | <a href="/">返回最新测试结果</a></p>
+</body>
+</html>
+"""
+
+
+@app.route("/probe/<int:probe_id>/<field>")
+@cached_page(probe_text_etag, RESULT_CACHE_CONTROL)
+def probe_text_route(probe_id, field):
+    """按需加载单次请求的完整响应（raw）、回答内容（content）或推理内容（reasoning），详情页表格中的链接指向这里"""
+    if field not in PROBE_TEXT_FIELDS:
+        return "unknown field", 404
+    found, text = load_probe_text(probe_id, field)
+    if not found:
+        return f"probe {probe_id} not found", 404
+    return Response(text or "", mimetype="text/plain")
+
+
+@app.route("/profiles/<path:name>")
+def profile_file_route(name):
+    """下载性能分析结果（.txt 报告或 .prof 文件）"""
+    if not name.endswith((".txt", ".prof")):
+        return "not found", 404
+    return send_from_directory(os.path.abspath(PROFILING["dir"]), name,
+                               mimetype="text/plain" if name.endswith(".txt") else "application/octet-stream")
+
+
+@app.route("/search")
+def search_route():
+    """
+    全文搜索已保存的请求明细（回答内容、推理内容、结束原因、错误信息），按相关度排序。
+    参数：q 为 FTS5 查询，column 可选 content / reasoning / finish_reason / error，limit 默认 50。
+    """
+    query = request.args.get("q", "").strip()
+    column = request.args.get("column") or None
+    limit = min(request.args.get("limit", 50, type=int), 500)
+    if not query:
+        return jsonify({"error": "missing query parameter q"}), 400
+    start = time.perf_counter()
+    try:
+        hits = search_probe_results(query, column, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except sqlite3.OperationalError as e:
+        if not db_utils.search_available:
+            return jsonify({"error": "full-text search is not available in this SQLite build"}), 501
+        return jsonify({"error": f"invalid query: {e}"}), 400
+    for hit in hits:
+        hit["result_url"] = f"/result/{hit['record_id']}" if hit["record_id"] is not None else None
+    return jsonify({
+        "query": query,
+        "column": column,
+        "count": len(hits),
+        "took_ms": round((time.perf_counter() - start) * 1000, 3),
+        "hits": hits,
+    })
+
+
+@app.route("/export/probes.<fmt>")
+def export_probes_route(fmt):
+    """
+    流式导出请求明细，fmt 为 csv 或 ndjson。
+    参数：start / end 为 ISO 时间（按请求时间过滤，start 含、end 不含），models 为逗号分隔的模型 key，
+    include_raw=1 时包含完整响应内容。数据逐行生成，不会一次性加载到内存。
+    """
+    from export import iter_export_rows, export_columns, iter_csv, iter_ndjson
+
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": f"unsupported format: {fmt}"}), 404
+    start = request.args.get("start") or None
+    end = request.args.get("end") or None
+    models = [m.strip() for m in request.args.get("models", "").split(",") if m.strip()] or None
+    include_raw = request.args.get("include_raw") in ("1", "true", "yes")
+
+    columns = export_columns(include_raw)
+    rows = iter_export_rows(start, end, models, include_raw)
+    chunks = iter_csv(rows, columns) if fmt == "csv" else iter_ndjson(rows, columns)
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=probes.{fmt}"},
+    )
 
 
 @app.route("/")
+@cached_page(index_etag, LISTING_CACHE_CONTROL)
 def index_page():
     """首页：展示最新一条测试结果"""
-    global custom_prompt
+    custom_prompt = test_runner.custom_prompt
     row = load_latest_test_result()
 
     # 通用的基础样式
@@ -189,6 +754,7 @@ def index_page():
             <div id="progress-bar" class="progress-bar">0%</div>
         </div>
         <div id="progress-text" style="margin-top: 8px; color: #555;">无测试进行</div>
+        <div id="live-leaderboard"></div>
     </div>
     """
 
@@ -243,6 +809,32 @@ def index_page():
                   }});
             }}
 
+            function openCircuits(breakers) {{
+                return Object.keys(breakers || {{}}).filter(k => breakers[k].state !== "closed");
+            }}
+
+            function fmt(value) {{
+                return (value === null || value === undefined) ? "Error" : value.toFixed(2);
+            }}
+
+            function renderLeaderboard(runs) {{
+                const container = document.getElementById("live-leaderboard");
+                if (!container) return;
+                container.innerHTML = runs.map(run => `
+                    <h3>实时排名 [${{run.run_id}} ${{run.label}}]</h3>
+                    <table>
+                        <tr><th>排名</th><th>Model Name</th><th>Avg Tokens/s</th><th>Median Tokens/s</th>
+                            <th>Avg Time to Answer (s)</th><th>Outlier Count</th><th>Samples</th></tr>
+                        ${{run.leaderboard.map((row, i) => `
+                        <tr><td>${{i + 1}}</td><td>${{row.model_name}}</td><td>${{fmt(row.mean_tps)}}</td>
+                            <td>${{fmt(row.median_tps)}}</td><td>${{fmt(row.mean_time_to_answer)}}</td>
+                            <td>${{row.outlier_count}}</td><td>${{row.samples}}</td></tr>`).join("")}}
+                    </table>
+                `).join("");
+            }}
+
+            let sawRunning = false;
+
             setInterval(() => {{
                 fetch("/test_progress").then(res => res.json()).then(data => {{
                     const progressBar = document.getElementById("progress-bar");
@@ -250,12 +842,31 @@ def index_page():
                     if (!progressBar || !progressText) return;
 
                     if (data.status === "idle") {{
-                        progressBar.style.width = "0%";
-                        progressBar.textContent = "0%";
-                        progressText.textContent = "无测试进行";
-                    }} else if (data.status === "running") {{
-                        const totalModels = data.finished_models.length + data.unfinished_models.length;
-                        const finished = data.finished_models.length;
+                        if (sawRunning) {{
+                            sawRunning = false;
+                            progressBar.style.width = "100%";
+                            progressBar.textContent = "100%";
+                            progressText.textContent = "全部轮次测试完成";
+                            setTimeout(() => window.location.reload(), 2000);
+                        }} else {{
+                            progressBar.style.width = "0%";
+                            progressBar.textContent = "0%";
+                            progressText.textContent = "无测试进行";
+                        }}
+                    }} else {{
+                        sawRunning = true;
+                        let totalModels = 0;
+                        let finished = 0;
+                        data.runs.forEach(run => {{
+                            if (run.mode === "interleaved") {{
+                                const names = Object.keys(run.model_rounds);
+                                names.forEach(name => {{ finished += run.model_rounds[name]; }});
+                                totalModels += names.length * run.total_rounds;
+                            }} else {{
+                                finished += run.finished_models.length;
+                                totalModels += run.finished_models.length + run.unfinished_models.length;
+                            }}
+                        }});
                         let percent = 0;
                         if (totalModels > 0) {{
                             percent = Math.round((finished / totalModels) * 100);
@@ -263,16 +874,12 @@ def index_page():
                         progressBar.style.width = percent + "%";
                         progressBar.textContent = percent + "%";
 
-                        progressText.innerHTML = `
-                            当前第 ${{data.current_round}} / ${{data.total_rounds}} 轮 <br/>
-                            已完成模型: ${{data.finished_models.join(", ")}} <br/>
-                            未完成模型: ${{data.unfinished_models.join(", ")}}
-                        `;
-                    }} else if (data.status === "finished") {{
-                        progressBar.style.width = "100%";
-                        progressBar.textContent = "100%";
-                        progressText.textContent = "全部轮次测试完成";
-                        setTimeout(() => window.location.reload(), 2000);
+                        progressText.innerHTML = data.runs.map(run => `
+                            [${{run.run_id}} ${{run.label}}] ${{run.status === "warmup" ? "预热中" : `当前第 ${{run.current_round}} / ${{run.total_rounds}} 轮`}} <br/>
+                            已完成模型: ${{run.finished_models.join(", ")}} <br/>
+                            未完成模型: ${{run.unfinished_models.join(", ")}}
+                        `).join("<br/>") + `<br/>熔断中: ${{openCircuits(data.circuit_breakers).join(", ") || "无"}}`;
+                        renderLeaderboard(data.runs);
                     }}
                 }});
             }}, 2000);
@@ -289,6 +896,9 @@ def index_page():
     r2 = row["round2_html"]
     r3 = row["round3_html"]
     smry = row["summary_html"]
+    warmup_section = render_warmup_section(row["warmup_html"])
+    alerts_section = render_alerts_section()
+    trend_chart = render_trend_chart()
 
     html = f"""
 <!DOCTYPE html>
@@ -319,6 +929,10 @@ def index_page():
 
     {progress_section}
 
+    {alerts_section}
+
+    {trend_chart}
+
     <div class="toggle-buttons" style="margin-top:20px;">
         <button onclick="toggleColumn('col-response')">Toggle Response JSON</button>
         <button onclick="toggleColumn('col-content')">Toggle Content</button>
@@ -326,6 +940,7 @@ def index_page():
         <button onclick="toggleColumn('col-time')">Toggle Time</button>
     </div>
 
+    {warmup_section}
     <h2>Round 1 测试结果</h2>
     {r1}
     <h2>Round 2 测试结果</h2>
@@ -379,6 +994,32 @@ document.addEventListener("DOMContentLoaded", function() {{
     }});
 }});
 
+function openCircuits(breakers) {{
+    return Object.keys(breakers || {{}}).filter(k => breakers[k].state !== "closed");
+}}
+
+function fmt(value) {{
+    return (value === null || value === undefined) ? "Error" : value.toFixed(2);
+}}
+
+function renderLeaderboard(runs) {{
+    const container = document.getElementById("live-leaderboard");
+    if (!container) return;
+    container.innerHTML = runs.map(run => `
+        <h3>实时排名 [${{run.run_id}} ${{run.label}}]</h3>
+        <table>
+            <tr><th>排名</th><th>Model Name</th><th>Avg Tokens/s</th><th>Median Tokens/s</th>
+                <th>Avg Time to Answer (s)</th><th>Outlier Count</th><th>Samples</th></tr>
+            ${{run.leaderboard.map((row, i) => `
+            <tr><td>${{i + 1}}</td><td>${{row.model_name}}</td><td>${{fmt(row.mean_tps)}}</td>
+                <td>${{fmt(row.median_tps)}}</td><td>${{fmt(row.mean_time_to_answer)}}</td>
+                <td>${{row.outlier_count}}</td><td>${{row.samples}}</td></tr>`).join("")}}
+        </table>
+    `).join("");
+}}
+
+let sawRunning = false;
+
 setInterval(() => {{
     fetch("/test_progress").then(res => res.json()).then(data => {{
         const progressBar = document.getElementById("progress-bar");
@@ -386,12 +1027,31 @@ setInterval(() => {{
         if (!progressBar || !progressText) return;
 
         if (data.status === "idle") {{
-            progressBar.style.width = "0%";
-            progressBar.textContent = "0%";
-            progressText.textContent = "无测试进行";
-        }} else if (data.status === "running") {{
-            const totalModels = data.finished_models.length + data.unfinished_models.length;
-            const finished = data.finished_models.length;
+            if (sawRunning) {{
+                sawRunning = false;
+                progressBar.style.width = "100%";
+                progressBar.textContent = "100%";
+                progressText.textContent = "全部轮次测试完成";
+                setTimeout(() => window.location.reload(), 2000);
+            }} else {{
+                progressBar.style.width = "0%";
+                progressBar.textContent = "0%";
+                progressText.textContent = "无测试进行";
+            }}
+        }} else {{
+            sawRunning = true;
+            let totalModels = 0;
+            let finished = 0;
+            data.runs.forEach(run => {{
+                if (run.mode === "interleaved") {{
+                    const names = Object.keys(run.model_rounds);
+                    names.forEach(name => {{ finished += run.model_rounds[name]; }});
+                    totalModels += names.length * run.total_rounds;
+                }} else {{
+                    finished += run.finished_models.length;
+                    totalModels += run.finished_models.length + run.unfinished_models.length;
+                }}
+            }});
             let percent = 0;
             if (totalModels > 0) {{
                 percent = Math.round((finished / totalModels) * 100);
@@ -399,16 +1059,12 @@ setInterval(() => {{
             progressBar.style.width = percent + "%";
             progressBar.textContent = percent + "%";
 
-            progressText.innerHTML = `
-                当前第 ${{data.current_round}} / ${{data.total_rounds}} 轮 <br/>
-                已完成模型: ${{data.finished_models.join(", ")}} <br/>
-                未完成模型: ${{data.unfinished_models.join(", ")}}
-            `;
-        }} else if (data.status === "finished") {{
-            progressBar.style.width = "100%";
-            progressBar.textContent = "100%";
-            progressText.textContent = "全部轮次测试完成";
-            setTimeout(() => window.location.reload(), 2000);
+            progressText.innerHTML = data.runs.map(run => `
+                [${{run.run_id}} ${{run.label}}] ${{run.status === "warmup" ? "预热中" : `当前第 ${{run.current_round}} / ${{run.total_rounds}} 轮`}} <br/>
+                已完成模型: ${{run.finished_models.join(", ")}} <br/>
+                未完成模型: ${{run.unfinished_models.join(", ")}}
+            `).join("<br/>") + `<br/>熔断中: ${{openCircuits(data.circuit_breakers).join(", ") || "无"}}`;
+            renderLeaderboard(data.runs);
         }}
     }});
 }}, 2000);
@@ -420,6 +1076,7 @@ setInterval(() => {{
 
 
 @app.route("/history")
+@cached_page(history_etag, LISTING_CACHE_CONTROL)
 def history_page():
     """展示所有历史记录的列表"""
     rows = load_all_test_results()
@@ -452,6 +1109,15 @@ def history_page():
     a:hover {
         text-decoration: underline;
     }
+    .flex-row {
+        display: flex;
+        flex-wrap: wrap;
+        align-items: center;
+    }
+    .flex-row > div {
+        margin-right: 20px;
+        margin-bottom: 10px;
+    }
     button {
         background-color: #5cb85c;
         color: white;
@@ -478,6 +1144,7 @@ def history_page():
 </head>
 <body>
     <h1>测试历史记录</h1>
+    {render_trend_chart()}
     <table>
         <tr>
             <th>ID</th>
@@ -506,6 +1173,7 @@ def history_page():
 
 
 @app.route("/result/<int:record_id>")
+@cached_page(result_etag, RESULT_CACHE_CONTROL)
 def result_detail(record_id):
     """展示某一条特定记录的详情"""
     row = load_test_result_by_id(record_id)
@@ -523,7 +1191,8 @@ def result_detail(record_id):
 </body>
 </html>
 """
-    _id, test_start_time, test_end_time, r1, r2, r3, smry = row
+    _id, test_start_time, test_end_time, r1, r2, r3, smry, warmup_html, run_id = row
+    warmup_section = render_warmup_section(warmup_html)
     base_styles = """
     <style>
     body {
@@ -594,6 +1263,7 @@ def result_detail(record_id):
         <button onclick="toggleColumn('col-time')">Toggle Time</button>
     </div>
 
+    {warmup_section}
     <h2>Round 1 测试结果</h2>
     {r1}
     <h2>Round 2 测试结果</h2>
@@ -603,6 +1273,8 @@ def result_detail(record_id):
     <h2>最终汇总 (剔除离群和出错后)</h2>
     {smry}
     <hr>
+    <p><a href="/result/{record_id}/timeline">查看请求时间线</a></p>
+    {render_profile_links(run_id)}
     <p><a href="/history">返回历史记录</a></p>
     <p><a href="/">返回最新测试结果</a></p>
 <script>
@@ -638,10 +1310,54 @@ document.addEventListener("DOMContentLoaded", function() {{
     return html
 
 
+
+@app.route("/result/<int:record_id>/timeline")
+@cached_page(result_etag, RESULT_CACHE_CONTROL)
+def result_timeline(record_id):
+    """展示某条记录的请求时间线（甘特图）"""
+    trace = load_run_trace(record_id)
+    if trace is None:
+        return f"记录 {record_id} 没有请求时间线（不存在或为旧版本记录）", 404
+    return f"""
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="utf-8">
+    <title>请求时间线 - 记录 {record_id}</title>
+    <style>
+    body {{ font-family: "Helvetica Neue", Arial, sans-serif; margin: 20px; color: #333; }}
+    table {{ border: 1px solid #ccc; border-collapse: collapse; margin: 16px 0; width: 100%; }}
+    th, td {{ border: 1px solid #ccc; padding: 6px; text-align: center; height: 24px; }}
+    th {{ background-color: #f7f7f7; font-weight: bold; }}
+    a {{ color: #337ab7; text-decoration: none; }}
+    </style>
+</head>
+<body>
+    <h1>请求时间线 - 记录 {record_id}</h1>
+    <p>运行开始时间: {trace["started_at"]}</p>
+    {render_timeline(trace)}
+    <p><a href="/result/{record_id}/trace.json" download="trace_{record_id}.json">下载 Chrome trace JSON</a>
+       （可在 chrome://tracing 或 https://ui.perfetto.dev 中打开）</p>
+    <p><a href="/result/{record_id}">返回测试详情</a></p>
+</body>
+</html>
+"""
+
+
+@app.route("/result/<int:record_id>/trace.json")
+@cached_page(result_etag, RESULT_CACHE_CONTROL)
+def result_trace(record_id):
+    """导出某条记录的请求时间线（Chrome trace 事件格式）"""
+    trace = load_run_trace(record_id)
+    if trace is None:
+        return jsonify({"error": f"record {record_id} has no trace"}), 404
+    return jsonify(to_chrome_trace(trace))
+
+
 if __name__ == "__main__":
-    init_db()
+    # 数据库在首次读写时自动初始化（见 db_utils._open_connection）
     # 可按需决定是否启动时先跑一次测试
-    # scheduled_job()
+    # test_runner.scheduled_job()
 
     # 启动Flask并自动打开默认浏览器
     webbrowser.open("http://127.0.0.1:5000")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+数据库并发基准：若干写线程不断保存完整的测试记录（大段 HTML + 请求明细），
+同时若干读线程模拟历史页和结果页的访问，统计读延迟和写吞吐。
+每个版本在独立的子进程和全新的临时数据库中运行。
+
+用法：
+    python benchmarks/db_concurrency_bench.py                      # 只测当前工作区
+    python benchmarks/db_concurrency_bench.py --baseline <git 版本>  # 同时测指定 git 版本作对比
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else float("nan")
+
+
+def fake_results(model_count, rounds):
+    """生成一次运行的请求明细，raw_response 约 8KB"""
+    results = []
+    for round_number in range(1, rounds + 1):
+        for i in range(model_count):
+            results.append({
+                "test_round": round_number,
+                "model_key": f"model-{i}",
+                "model_name": f"Model {i}",
+                "completion_tokens": 800,
+                "time_taken": 20.0,
+                "tokens_per_second": 40.0,
+                "input_timestamp": "2025-01-01T00:00:00",
+                "output_timestamp": "2025-01-01T00:00:20",
+                "raw_response": json.dumps({"content": "x" * 8000}),
+            })
+    return results
+
+
+def worker(duration, writers, readers, models):
+    """在当前进程中运行基准（由子进程调用），结果以 JSON 打印到标准输出"""
+    import db_utils
+
+    db_utils.save_test_result("t0", "t1", "", "", "", "")  # 建表并预热
+    html = "<table>" + "<tr><td>cell</td></tr>" * 2000 + "</table>"  # 约 50KB
+    stop = threading.Event()
+    write_latency, read_latency = [], []
+    lock = threading.Lock()
+
+    def write_loop():
+        results = fake_results(models, 3)
+        while not stop.is_set():
+            start = time.perf_counter()
+            record_id = db_utils.save_test_result("t0", "t1", html, html, html, html)
+            db_utils.save_probe_results(record_id, "bench", results)
+            with lock:
+                write_latency.append(time.perf_counter() - start)
+
+    def read_loop():
+        while not stop.is_set():
+            start = time.perf_counter()
+            rows = db_utils.load_all_test_results()
+            db_utils.load_test_result_by_id(random.choice(rows)[0])
+            with lock:
+                read_latency.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=write_loop) for _ in range(writers)]
+    threads += [threading.Thread(target=read_loop) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    print(json.dumps({
+        "writes_per_second": len(write_latency) / duration,
+        "reads_per_second": len(read_latency) / duration,
+        "read_p50_ms": percentile(read_latency, 0.5) * 1000,
+        "read_p99_ms": percentile(read_latency, 0.99) * 1000,
+        "read_max_ms": percentile(read_latency, 1.0) * 1000,
+        "write_p50_ms": percentile(write_latency, 0.5) * 1000,
+    }))
+
+
+def run_version(name, src, args):
+    with tempfile.TemporaryDirectory() as workdir:
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", src,
+               "--duration", str(args.duration), "--writers", str(args.writers),
+               "--readers", str(args.readers), "--models", str(args.models)]
+        proc = subprocess.run(cmd, cwd=workdir, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"{name}: 运行失败\n{proc.stderr}")
+        return
+    stats = json.loads(proc.stdout.strip().splitlines()[-1])
+    print(f"{name:<12} writes/s {stats['writes_per_second']:6.1f}  reads/s {stats['reads_per_second']:7.1f}  "
+          f"read p50 {stats['read_p50_ms']:6.2f} ms  p99 {stats['read_p99_ms']:7.2f} ms  "
+          f"max {stats['read_max_ms']:7.2f} ms  write p50 {stats['write_p50_ms']:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库并发读写基准")
+    parser.add_argument("--baseline", help="作为对比的 git 版本（提交、分支或标签）")
+    parser.add_argument("--duration", type=float, default=5.0, help="每个版本运行的秒数，默认 5")
+    parser.add_argument("--writers", type=int, default=2, help="写线程数，默认 2")
+    parser.add_argument("--readers", type=int, default=4, help="读线程数，默认 4")
+    parser.add_argument("--models", type=int, default=10, help="每次运行的模型数，默认 10")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, args.worker)
+        worker(args.duration, args.writers, args.readers, args.models)
+        return
+
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as src:
+            archive = subprocess.run(["git", "-C", ROOT, "archive", args.baseline],
+                                     check=True, capture_output=True).stdout
+            subprocess.run(["tar", "-x", "-C", src], input=archive, check=True)
+            run_version(args.baseline, src, args)
+    run_version("working tree", ROOT, args)
+
+
+if __name__ == "__main__":
+    main()
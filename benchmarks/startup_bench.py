@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+Web 服务启动基准：测量从启动进程到首页返回第一个响应的时间（time-to-first-response），
+以及此时进程的常驻内存（RSS）。
+每次在全新的临时目录中启动（空数据库、无日志文件），并阻止自动打开浏览器。
+
+用法：
+    python benchmarks/startup_bench.py                       # 只测当前工作区
+    python benchmarks/startup_bench.py --baseline 9e60f40     # 同时测指定 git 版本作对比
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import statistics
+import urllib.request
+import urllib.error
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程启动脚本：按 python app.py 的方式运行，但改用指定端口并跳过打开浏览器
+BOOTSTRAP = """
+import sys, runpy, webbrowser, flask
+sys.path.insert(0, {src!r})
+webbrowser.open = lambda *args, **kwargs: True
+_run = flask.Flask.run
+flask.Flask.run = lambda self, host=None, port=None, **kwargs: _run(self, host=host, port={port}, **kwargs)
+runpy.run_path({app!r}, run_name="__main__")
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    """读取 /proc/<pid>/status 中的 VmRSS（MB），不可用时返回 None"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def measure_once(src, timeout=60):
+    """启动一次服务，返回 (首个响应耗时秒数, HTTP 状态码, RSS MB)"""
+    port = free_port()
+    script = BOOTSTRAP.format(src=src, port=port, app=os.path.join(src, "app.py"))
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-c", script], cwd=workdir,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"服务进程提前退出，返回码 {proc.returncode}")
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError("等待首个响应超时")
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as resp:
+                        status = resp.status
+                    break
+                except urllib.error.HTTPError as e:
+                    status = e.code
+                    break
+                except OSError:
+                    time.sleep(0.005)
+            elapsed = time.perf_counter() - start
+            return elapsed, status, rss_mb(proc.pid)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def export_ref(ref, dest):
+    """把指定 git 版本的源码导出到 dest 目录"""
+    archive = subprocess.run(["git", "-C", ROOT, "archive", ref], check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", dest], input=archive, check=True)
+
+
+def bench(name, src, repeat):
+    times, rss, statuses = [], [], set()
+    for _ in range(repeat):
+        elapsed, status, mem = measure_once(src)
+        times.append(elapsed)
+        statuses.add(status)
+        if mem is not None:
+            rss.append(mem)
+    rss_text = f"{statistics.median(rss):7.1f} MB" if rss else "    n/a"
+    print(f"{name:<12} time-to-first-response median {statistics.median(times) * 1000:7.1f} ms "
+          f"(min {min(times) * 1000:.1f} ms)  RSS {rss_text}  HTTP {sorted(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Web 服务启动时间与内存基准")
+    parser.add_argument("--baseline", help="作为对比的 git 版本（提交、分支或标签）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个版本重复启动的次数，默认 5")
+    args = parser.parse_args()
+
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as src:
+            export_ref(args.baseline, src)
+            bench(f"{args.baseline}", src, args.repeat)
+    bench("working tree", ROOT, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
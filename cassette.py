@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+服务商 HTTP 交互的录制与回放。
+- record：照常请求服务商，同时把每次请求/响应（状态码、响应头、流式分片及每个分片相对请求开始的时间）
+  追加写入 cassette 文件（gzip 压缩的 JSON Lines，不保存 Authorization 等请求头）。
+- replay：不访问网络，按录制时的顺序与时间（可按 replay_speed 加速）返回同样的字节，
+  整个测试可以离线复现，用于调试统计与渲染流程。
+- live：直接请求（默认）。
+
+回放时按 (url, 请求中的 model, 是否流式) 匹配，同一组合按录制顺序依次返回。
+"""
+
+import io
+import os
+import gzip
+import json
+import time
+import base64
+import threading
+from collections import defaultdict, deque
+
+from config import HTTP_CASSETTE
+from utils import logger
+
+MODES = ("live", "record", "replay")
+
+_settings = dict(HTTP_CASSETTE)
+_write_lock = threading.Lock()
+_replay_lock = threading.Lock()
+_replay_queues = None
+
+
+class CassetteMiss(Exception):
+    """回放时 cassette 中没有（或已用完）与请求匹配的录制"""
+
+
+def configure(mode=None, path=None, replay_speed=None):
+    """切换录制/回放模式（例如命令行参数），未指定的项保持 HTTP_CASSETTE 中的配置"""
+    global _replay_queues
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"unknown cassette mode: {mode}")
+        _settings["mode"] = mode
+    if path is not None:
+        _settings["path"] = path
+    if replay_speed is not None:
+        _settings["replay_speed"] = replay_speed
+    with _replay_lock:
+        _replay_queues = None
+
+
+def _match_key(url, payload):
+    payload = payload or {}
+    return url, payload.get("model"), bool(payload.get("stream"))
+
+
+def _encode_chunk(chunk):
+    """分片尽量按 UTF-8 文本保存；多字节字符被切开等无法解码的分片用 base64"""
+    try:
+        return {"t": chunk.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"b": base64.b64encode(chunk).decode("ascii")}
+
+
+def _decode_chunk(item):
+    return item["t"].encode("utf-8") if "t" in item else base64.b64decode(item["b"])
+
+
+def _append_exchange(exchange):
+    """每次交互追加为一个 gzip 成员，进程中途退出也不会损坏已写入的内容"""
+    line = json.dumps(exchange, ensure_ascii=False) + "\n"
+    directory = os.path.dirname(_settings["path"])
+    with _write_lock:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with gzip.open(_settings["path"], "ab") as f:
+            f.write(line.encode("utf-8"))
+
+
+class _RecordingRaw:
+    """包装 urllib3 的原始响应，在被读取时记录每个分片及其时间"""
+
+    def __init__(self, raw, exchange, request_start):
+        self._raw = raw
+        self._exchange = exchange
+        self._request_start = request_start
+        self._saved = False
+
+    def stream(self, amt=None, decode_content=None):
+        try:
+            for chunk in self._raw.stream(amt, decode_content=True):
+                offset = time.perf_counter() - self._request_start
+                self._exchange["chunks"].append(dict(_encode_chunk(chunk), at=round(offset, 6)))
+                yield chunk
+        finally:
+            self._save()
+
+    def close(self):
+        self._save()
+        self._raw.close()
+
+    def _save(self):
+        if not self._saved:
+            self._saved = True
+            _append_exchange(self._exchange)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class _ReplayRaw(io.RawIOBase):
+    """按录制的时间依次返回分片，供 requests.Response 的 iter_content / iter_lines 读取"""
+
+    def __init__(self, chunks, request_start, speed):
+        super().__init__()
+        self._chunks = chunks
+        self._request_start = request_start
+        self._speed = speed
+
+    def stream(self, amt=None, decode_content=None):
+        for item in self._chunks:
+            if self._speed > 0:
+                delay = self._request_start + item["at"] / self._speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield _decode_chunk(item)
+
+    def read(self, amt=None):
+        return b"".join(self.stream())
+
+    def release_conn(self):
+        pass
+
+
+def _load_replay_queues():
+    global _replay_queues
+    with _replay_lock:
+        if _replay_queues is None:
+            queues = defaultdict(deque)
+            with gzip.open(_settings["path"], "rt", encoding="utf-8") as f:
+                for line in f:
+                    exchange = json.loads(line)
+                    queues[_match_key(exchange["url"], exchange["request"])].append(exchange)
+            _replay_queues = queues
+            logger.info(f"已加载 cassette {_settings['path']}，共 {sum(len(q) for q in queues.values())} 次交互")
+        return _replay_queues
+
+
+def load():
+    """
+    导入并返回 requests 模块。首次导入约需 0.1 秒，test_runner 在开始计时之前调用，
+    避免导入时间计入进程中第一个请求的耗时与首 token 时间；Web 服务启动时仍不加载 requests。
+    """
+    import requests
+    return requests
+
+
+def _replay(url, payload):
+    requests = load()
+    from requests.structures import CaseInsensitiveDict
+
+    queues = _load_replay_queues()
+    with _replay_lock:
+        queue = queues.get(_match_key(url, payload))
+        if not queue:
+            raise CassetteMiss(f"no recorded exchange for {url} model={(payload or {}).get('model')}")
+        exchange = queue.popleft()
+
+    speed = _settings.get("replay_speed", 1.0)
+    request_start = time.perf_counter()
+    if speed > 0:
+        time.sleep(exchange["headers_at"] / speed)
+    if "error" in exchange:
+        error_class = getattr(requests.exceptions, exchange["error"]["type"], requests.RequestException)
+        raise error_class(exchange["error"]["message"])
+    response = requests.Response()
+    response.status_code = exchange["status"]
+    response.reason = exchange.get("reason")
+    response.url = url
+    response.encoding = exchange.get("encoding")
+    response.headers = CaseInsensitiveDict(exchange["headers"])
+    response.raw = _ReplayRaw(exchange["chunks"], request_start, speed)
+    return response
+
+
+def _record(url, payload, headers, timeout, stream, kwargs):
+    """kwargs 中带有请求体（json 或 data），payload 为其 dict 形式，用于写入 cassette"""
+    requests = load()
+
+    request_start = time.perf_counter()
+    try:
+        response = requests.post(url, headers=headers, timeout=timeout, stream=True, **kwargs)
+    except requests.RequestException as e:
+        # 连接失败、超时等也录制下来，回放时在同样的时间点抛出同类异常
+        _append_exchange({
+            "url": url,
+            "request": payload,
+            "recorded_at": time.time(),
+            "error": {"type": type(e).__name__, "message": str(e)},
+            "headers_at": round(time.perf_counter() - request_start, 6),
+        })
+        raise
+    # 分片已由 urllib3 解压，回放时不再带 Content-Encoding
+    response_headers = {k: v for k, v in response.headers.items()
+                        if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")}
+    exchange = {
+        "url": url,
+        "request": payload,
+        "recorded_at": time.time(),
+        "status": response.status_code,
+        "reason": response.reason,
+        "encoding": response.encoding,
+        "headers": response_headers,
+        "headers_at": round(time.perf_counter() - request_start, 6),
+        "chunks": [],
+    }
+    response.raw = _RecordingRaw(response.raw, exchange, request_start)
+    # 非流式请求与 requests 一致立即读取完整响应体；错误响应（包括 429）体积很小，也立即读取，
+    # 保证调用方未读取响应体（例如 raise_for_status 直接抛出）时同样能被录制
+    if not stream or response.status_code >= 400:
+        response.content
+    return response
+
+
+def _payload_of(body, data):
+    """请求体的 dict 形式：优先 json 参数，否则解析预先序列化的 data（见 adapters.py）"""
+    if body is not None or data is None:
+        return body
+    return json.loads(data)
+
+
+def post(url, json=None, data=None, headers=None, timeout=None, stream=False, **kwargs):
+    """与 requests.post 相同的调用方式，根据当前模式直接请求、录制或回放；请求体可以是 json 或序列化好的 data"""
+    mode = _settings.get("mode", "live")
+    if mode == "replay":
+        response = _replay(url, _payload_of(json, data))
+        if not stream:
+            response.content
+        return response
+    if mode == "record":
+        kwargs["json" if data is None else "data"] = json if data is None else data
+        return _record(url, _payload_of(json, data), headers, timeout, stream, kwargs)
+    return load().post(url, json=json, data=data, headers=headers, timeout=timeout, stream=stream, **kwargs)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+跨运行的性能突变检测：每保存一次测试记录，用各模型本次运行的平均值（汇总表中剔除离群后的值）
+更新 (模型, 指标) 序列的双边 CUSUM 统计量，超过阈值时记录一条告警。
+
+每条序列只保存固定大小的状态（见 db_utils 的 changepoint_state 表）：
+- 基线：前 baseline_runs 次运行用 Welford 算法估计均值与方差，之后基线固定；
+- S+ / S-：标准化偏差 z = (x - 均值) / 标准差 的累积和，每次减去 drift_k，低于 0 时归零；
+- 累积长度：S+ / S- 自上次归零以来累积的运行数，用于估计突变后的均值。
+S+ 或 S- 超过 threshold_h 时判定发生突变，记录突变前后的均值与相对幅度，
+然后用之后的 baseline_runs 次运行重新估计基线，同一次突变只告警一次。
+"""
+
+import math
+import datetime
+
+from config import CHANGE_DETECTION
+
+
+def new_state():
+    return {"n": 0, "mean": 0.0, "m2": 0.0, "s_pos": 0.0, "s_neg": 0.0, "run_pos": 0, "run_neg": 0}
+
+
+def baseline_sigma(state):
+    """基线标准差，不低于 min_relative_sigma × |均值|，避免方差接近 0 时微小波动也触发告警"""
+    variance = state["m2"] / (state["n"] - 1) if state["n"] > 1 else 0.0
+    return max(math.sqrt(variance), CHANGE_DETECTION["min_relative_sigma"] * abs(state["mean"]), 1e-9)
+
+
+def step(state, value):
+    """
+    用一次运行的观测值更新序列状态（原地修改），检测到突变时返回
+    (方向 "up" / "down", 突变前均值, 估计的突变后均值, CUSUM 统计量, 标准差)，否则返回 None。
+    """
+    if state["n"] < CHANGE_DETECTION["baseline_runs"]:
+        state["n"] += 1
+        delta = value - state["mean"]
+        state["mean"] += delta / state["n"]
+        state["m2"] += delta * (value - state["mean"])
+        return None
+
+    k = CHANGE_DETECTION["drift_k"]
+    sigma = baseline_sigma(state)
+    z = (value - state["mean"]) / sigma
+    state["s_pos"] = max(0.0, state["s_pos"] + z - k)
+    state["s_neg"] = max(0.0, state["s_neg"] - z - k)
+    state["run_pos"] = state["run_pos"] + 1 if state["s_pos"] > 0 else 0
+    state["run_neg"] = state["run_neg"] + 1 if state["s_neg"] > 0 else 0
+
+    if state["s_pos"] > CHANGE_DETECTION["threshold_h"]:
+        direction, statistic, length = "up", state["s_pos"], state["run_pos"]
+    elif state["s_neg"] > CHANGE_DETECTION["threshold_h"]:
+        direction, statistic, length = "down", state["s_neg"], state["run_neg"]
+    else:
+        return None
+
+    # 突变后均值的估计：基线 ± σ(k + S/N)，N 为 S 自上次归零以来累积的运行数
+    shift = sigma * (k + statistic / length)
+    before = state["mean"]
+    after = before + shift if direction == "up" else before - shift
+    state.update(new_state())
+    return direction, before, after, statistic, sigma
+
+
+def observations(summary_rows):
+    """从汇总表数据行（Leaderboard.summary_rows）中取出各模型被监测指标的平均值"""
+    for row in summary_rows:
+        for metric in CHANGE_DETECTION["metrics"]:
+            value = row.get(metric)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+                yield row["model_key"], row.get("model_name"), metric, float(value)
+
+
+def process_run(state_by_series, summary_rows, run_id, record_id=None):
+    """
+    按一次运行的汇总结果更新各序列状态（state_by_series 为 {(模型, 指标): 状态}，缺少的序列会新建），
+    返回本次产生的告警列表。
+    """
+    detected_at = datetime.datetime.now().isoformat()
+    alerts = []
+    for model_key, model_name, metric, value in observations(summary_rows):
+        state = state_by_series.setdefault((model_key, metric), new_state())
+        change = step(state, value)
+        state["last_value"] = value
+        state["last_run_id"] = run_id
+        state["updated_at"] = detected_at
+        if change is None:
+            continue
+        direction, before, after, statistic, sigma = change
+        alerts.append({
+            "model_key": model_key,
+            "model_name": model_name,
+            "metric": metric,
+            "direction": direction,
+            # 指标变差（如 tokens/s 下降、首 token 时间上升）时为回退
+            "regression": direction == CHANGE_DETECTION["metrics"][metric],
+            "detected_at": detected_at,
+            "run_id": run_id,
+            "record_id": record_id,
+            "before_mean": before,
+            "after_mean": after,
+            "observed": value,
+            "magnitude": (after - before) / abs(before) if before else None,
+            "statistic": statistic,
+            "sigma": sigma,
+        })
+    return alerts
+
+
+def record_run(summary_rows, run_id, record_id=None):
+    """
+    测试记录保存后调用：在写线程的同一个事务中读取、更新并保存相关序列的状态和告警，
+    并发完成的多次运行按顺序依次更新。返回本次产生的告警列表；未启用时返回空列表。
+    """
+    if not CHANGE_DETECTION.get("enabled", True) or not summary_rows:
+        return []
+    import db_utils
+    from utils import logger
+
+    alerts = db_utils.update_changepoints(
+        {row["model_key"] for row in summary_rows},
+        lambda states: process_run(states, summary_rows, run_id, record_id),
+    )
+    for alert in alerts:
+        logger.warning(
+            f"检测到性能突变: {alert['model_name']} {alert['metric']} {alert['direction']} "
+            f"{alert['before_mean']:.3f} -> {alert['after_mean']:.3f}"
+            + (f" ({alert['magnitude']:+.1%})" if alert["magnitude"] is not None else "")
+        )
+    return alerts
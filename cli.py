@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+无界面的命令行入口：直接运行测试引擎，将结果以 JSON Lines 流式输出，
+并根据 SLO 是否被违反返回退出码，适用于 cron 与 CI。
+不启动 Flask / APScheduler；pandas、imgkit 只在使用 --html / --image 时才会加载。
+
+用法示例：
+    python cli.py --models deepseek-reasoner,deepseek-r1-ali --slo-min-tps 20 --output results.jsonl
+"""
+
+import sys
+import json
+import argparse
+import datetime
+import threading
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_SLO_BREACH = 2
+
+
+def _split_list(value):
+    """逗号分隔的参数转换为列表"""
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="DeepSeek Api Test 命令行测试")
+    parser.add_argument("--models", help="逗号分隔的模型 key，默认测试 MODELS_TO_TEST 中的全部模型")
+    parser.add_argument("--tags", help="未指定 --models 时，只测试带有这些标签（逗号分隔，任一即可）的注册表端点")
+    parser.add_argument("--groups", help="未指定 --models 时，只测试这些分组（逗号分隔）的注册表端点")
+    parser.add_argument("--timeout", type=int, default=300, help="单次请求超时（秒），默认 300")
+    parser.add_argument("--rounds", type=int, default=3, help="测试轮数，默认 3")
+    parser.add_argument("--mode", choices=["sequential", "interleaved"], default=None,
+                        help="执行模式，默认使用 DEFAULT_RUN_MODE")
+    parser.add_argument("--cooldown", type=float, default=None, help="交错模式下每轮之间的冷却时间（秒）")
+    parser.add_argument("--prompt", help="本次测试使用的提示词")
+    parser.add_argument("--label", default="cli", help="运行标签，默认 cli")
+    parser.add_argument("--output", default="-", help="JSON Lines 输出文件，默认为标准输出")
+    parser.add_argument("--include-raw", action="store_true", help="在输出中包含完整的响应内容 raw_response")
+    parser.add_argument("--save-db", action="store_true", help="将结果保存到 results.db")
+    parser.add_argument("--html", metavar="FILE", help="生成 HTML 报告（需要 pandas）")
+    parser.add_argument("--image", action="store_true", help="导出结果图片到 output 目录（需要 pandas 与 imgkit）")
+    parser.add_argument("--record", metavar="CASSETTE", help="录制本次测试的全部 HTTP 交互到 cassette 文件")
+    parser.add_argument("--replay", metavar="CASSETTE", help="不访问网络，从 cassette 文件回放 HTTP 交互")
+    parser.add_argument("--replay-speed", type=float, default=None, help="回放速度倍数，默认 1（原速），0 表示不等待")
+    parser.add_argument("--profile", action="store_true",
+                        help="用 cProfile 分析本次运行，结果保存到 PROFILING['dir']/run_<run_id>.prof / .txt")
+    parser.add_argument("--trace", metavar="FILE", help="把请求时间线写入 Chrome trace JSON 文件")
+    parser.add_argument("--slo-min-tps", type=float, help="SLO：平均 tokens/s 不低于该值")
+    parser.add_argument("--slo-max-ttfa", type=float, help="SLO：平均首个回答 token 时间（秒）不高于该值")
+    parser.add_argument("--slo-max-error-rate", type=float, help="SLO：错误率（0~1）不高于该值")
+    return parser.parse_args(argv)
+
+
+def check_slos(args, summary_rows, error_rates):
+    """根据汇总结果检查 SLO，返回违反项列表"""
+    breaches = []
+    summary_by_key = {row["model_key"]: row for row in summary_rows}
+    for model_key, error_rate in error_rates.items():
+        row = summary_by_key.get(model_key)
+        if args.slo_max_error_rate is not None and error_rate > args.slo_max_error_rate:
+            breaches.append({"model_key": model_key, "slo": "max_error_rate",
+                             "threshold": args.slo_max_error_rate, "value": error_rate})
+        if args.slo_min_tps is not None:
+            tps = row["tokens_per_second"] if row else None
+            if tps is None or tps < args.slo_min_tps:
+                breaches.append({"model_key": model_key, "slo": "min_tps",
+                                 "threshold": args.slo_min_tps, "value": tps})
+        if args.slo_max_ttfa is not None:
+            ttfa = row["time_to_answer"] if row else None
+            if ttfa is None or ttfa > args.slo_max_ttfa:
+                breaches.append({"model_key": model_key, "slo": "max_ttfa",
+                                 "threshold": args.slo_max_ttfa, "value": ttfa})
+    return breaches
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    import test_runner
+    import profiling
+    import registry
+    from models_config import MODELS_CONFIG, MODELS_TO_TEST
+    from config import DEFAULT_RUN_MODE, INTERLEAVE_COOLDOWN_SECONDS
+    from run_state import RunState
+    from utils import logger
+
+    model_keys = registry.resolve_models(_split_list(args.models), _split_list(args.tags), _split_list(args.groups))
+    if model_keys is None:
+        registry.reload()
+        model_keys = list(MODELS_TO_TEST)
+    if not model_keys:
+        print("没有与 --tags / --groups 匹配的已启用端点", file=sys.stderr)
+        return EXIT_ERROR
+    unknown = [k for k in model_keys if k not in MODELS_CONFIG]
+    if unknown:
+        print(f"未知的模型: {', '.join(unknown)}", file=sys.stderr)
+        return EXIT_ERROR
+    if args.prompt:
+        test_runner.set_custom_prompt(args.prompt)
+    if args.record and args.replay:
+        print("--record 与 --replay 不能同时使用", file=sys.stderr)
+        return EXIT_ERROR
+    if args.record or args.replay:
+        import cassette
+        cassette.configure("record" if args.record else "replay", args.record or args.replay, args.replay_speed)
+
+    state = RunState(
+        label=args.label,
+        total_rounds=args.rounds,
+        mode=args.mode or DEFAULT_RUN_MODE,
+        cooldown=INTERLEAVE_COOLDOWN_SECONDS if args.cooldown is None else args.cooldown
+    )
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    out_lock = threading.Lock()
+
+    def emit(record):
+        line = json.dumps(record, ensure_ascii=False)
+        with out_lock:
+            out.write(line + "\n")
+            out.flush()
+
+    def on_result(result):
+        record = {"type": "probe", "run_id": state.run_id}
+        record.update({k: v for k, v in result.items() if args.include_raw or k != "raw_response"})
+        emit(record)
+
+    state.add_result_listener(on_result)
+
+    round_html_list, summary_html, warmup_html = [], None, None
+    try:
+        start_ts = datetime.datetime.now().isoformat()
+        state.set_status("running")
+        if args.profile:
+            state.profiler = profiling.Profiler()
+        with profiling.section(state.profiler):
+            # 需要 HTML 或图片时走完整流程（会加载 pandas），否则只运行测试引擎
+            if args.html or args.image:
+                df_rounds, df_summary, round_html_list, summary_html, df_warmup, warmup_html = \
+                    test_runner.run_all_tests_and_generate_html(args.timeout, model_keys, state)
+                warmup_results = [] if df_warmup is None else df_warmup.to_dict("records")
+                all_round_results = [df.to_dict("records") for df in df_rounds]
+            else:
+                warmup_results, all_round_results = test_runner.run_all_tests(args.timeout, model_keys, state)
+        end_ts = datetime.datetime.now().isoformat()
+        if state.profiler is not None:
+            paths = state.profiler.save(profiling.run_profile_name(state.run_id))
+            emit({"type": "profile", "run_id": state.run_id, "files": list(paths or [])})
+
+        with state.lock:
+            summary_rows = state.leaderboard.summary_rows()
+        measured = [r for results in all_round_results for r in results]
+        error_rates = {}
+        for key in model_keys:
+            rows = [r for r in measured if r["model_key"] == key]
+            errors = [r for r in rows if not isinstance(r["tokens_per_second"], (int, float))]
+            error_rates[key] = len(errors) / len(rows) if rows else 1.0
+
+        emit({"type": "summary", "run_id": state.run_id, "start_time": start_ts, "end_time": end_ts,
+              "models": summary_rows, "error_rates": error_rates})
+
+        if args.html:
+            with open(args.html, "w", encoding="utf-8") as f:
+                sections = [f"<h2>Round {i}</h2>{html}" for i, html in enumerate(round_html_list, start=1)]
+                f.write(f"<html><head><meta charset=\"utf-8\"></head><body>{''.join(sections)}"
+                        f"<h2>Summary</h2>{summary_html}</body></html>")
+        if args.image:
+            from utils import export_tables_to_image
+            export_tables_to_image(df_rounds, df_summary)
+        if args.trace:
+            from run_trace import to_chrome_trace
+            with open(args.trace, "w", encoding="utf-8") as f:
+                json.dump(to_chrome_trace(state.trace.to_dict()), f, ensure_ascii=False)
+        if args.save_db:
+            from db_utils import save_test_result, save_probe_results
+            from config import COLLECTOR
+            import changepoint
+            round1_html, round2_html, round3_html = (list(round_html_list) + [None] * 3)[:3]
+            record_id = save_test_result(start_ts, end_ts, round1_html, round2_html, round3_html, summary_html,
+                                         warmup_html=warmup_html, run_id=state.run_id,
+                                         trace_json=json.dumps(state.trace.to_dict(), ensure_ascii=False))
+            save_probe_results(record_id, state.run_id, warmup_results + measured, vantage=COLLECTOR["local_vantage"])
+            for alert in changepoint.record_run(summary_rows, state.run_id, record_id):
+                emit({"type": "changepoint", **alert})
+
+        breaches = check_slos(args, summary_rows, error_rates)
+        emit({"type": "slo", "run_id": state.run_id, "passed": not breaches, "breaches": breaches})
+        state.set_status("finished")
+        return EXIT_SLO_BREACH if breaches else EXIT_OK
+    except Exception as e:
+        state.set_status("failed")
+        logger.exception(f"命令行测试异常: {e}")
+        return EXIT_ERROR
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,3 +10,147 @@ Author: Gwaanl
 
 class Config:
     SCHEDULER_API_ENABLED = True
+
+# 定时测试分组：每组可单独设置模型列表、间隔、随机抖动和重叠策略
+# - models: 模型 key 列表，None 表示 MODELS_TO_TEST 中的全部模型
+# - tags / endpoint_groups: 未设置 models 时，按端点注册表中的标签 / 分组筛选（见 registry.py）
+# - overlap_policy: "skip" 上一次未结束（或已达并发上限）则跳过本次；
+#                   "queue" 排队等待，每组最多积压一次
+SCHEDULE_GROUPS = {
+    "all": {
+        "enabled": True,
+        "models": None,
+        "interval_minutes": 60,
+        "jitter_seconds": 60,
+        "overlap_policy": "skip",
+        "timeout": 300,
+        "mode": "sequential",
+    },
+}
+
+# scheduled_job() 默认执行的分组
+DEFAULT_SCHEDULE_GROUP = "all"
+
+# 每个模型在正式测试前发送的预热请求数（可在 MODELS_CONFIG 中用 "warmup_requests" 单独配置）
+# 预热请求用于建立连接、预热缓存，结果单独记录，不计入汇总统计
+WARMUP_REQUESTS = 1
+
+# 默认执行模式：sequential 逐轮执行；interleaved 各模型完成上一轮后冷却
+# INTERLEAVE_COOLDOWN_SECONDS 秒即开始下一轮，总耗时只取决于最慢模型自身
+DEFAULT_RUN_MODE = "sequential"
+INTERLEAVE_COOLDOWN_SECONDS = 5
+
+# 同时进行的测试（定时与手动）数量上限，每个测试有独立的进度状态
+MAX_CONCURRENT_RUNS = 3
+
+# 排行榜每个模型参与离群判定与均值计算的最近有效样本数上限（即轮次数，通常远小于该值），
+# 使每条结果的更新开销有固定上限；超过后按最近的样本统计
+LEADERBOARD_MAX_SAMPLES = 1000
+
+# 数据保留策略：超过 raw_days 天的测试记录先压缩归档到 archive_dir（gzip 的 JSON Lines），
+# 其正式请求按 (日期, 模型, 探测点) 累加到 probe_rollups，然后删除原始记录并增量回收空间。
+# 后台任务每 interval_hours 小时运行一次，每次最多处理 max_records_per_run 条记录，
+# 每条记录单独提交，不会长时间占用数据库写入，进行中的测试照常保存结果。
+RETENTION = {
+    "enabled": True,
+    "raw_days": 30,
+    "archive_dir": "archive",
+    "interval_hours": 24,
+    "max_records_per_run": 500,
+    "max_remote_probes_per_run": 20000,
+    "vacuum_pages_per_step": 1000,
+}
+
+# 服务商 HTTP 交互的录制与回放（见 cassette.py）：
+# - mode: "live" 直接请求；"record" 请求的同时录制到 path；"replay" 不访问网络，从 path 回放
+# - replay_speed: 回放速度倍数，1 为原速，2 为两倍速，0 表示不等待立即返回
+HTTP_CASSETTE = {
+    "mode": "live",
+    "path": "cassettes/session.jsonl.gz",
+    "replay_speed": 1.0,
+}
+
+# 分布式探测：worker.py 在其他主机或本机的其他进程中运行测试，把结果推送到本服务的 /collect，
+# 结果按探测点（vantage）标记保存。
+# - token: worker 需在请求头 X-Collector-Token 中携带相同的值；为 None 时 /collect 拒绝所有上报
+# - allow_unauthenticated: 为 True 时未配置 token 也接受上报（仅限可信网络）
+# - local_vantage: 本服务自身发起的测试所记录的探测点名称
+COLLECTOR = {
+    "token": None,
+    "allow_unauthenticated": False,
+    "local_vantage": "local",
+}
+
+# 性能分析（见 profiling.py），默认关闭，关闭时没有任何额外开销。
+# - enabled: 为 True 时可通过 /start_test?profile=1 分析单次运行，或在页面 URL 加 profile=1 分析单个请求
+# - dir: 分析结果目录，运行的结果为 run_<run_id>.prof / .txt，页面请求的结果在 requests/ 子目录
+# - sort / limit: 文本报告的排序方式（pstats 的 sort_stats 参数）与显示的函数数量
+PROFILING = {
+    "enabled": False,
+    "dir": "profiles",
+    "sort": "cumulative",
+    "limit": 60,
+}
+
+# 端点注册表（见 registry.py）：path 为 YAML / JSON 文件，None 表示只使用 models_config.py；
+# 服务每 reload_seconds 秒检查一次文件，每次测试开始前也会检查，修改后无需重启
+ENDPOINT_REGISTRY = {
+    "path": "endpoints.yaml",
+    "reload_seconds": 30,
+}
+
+# 跨运行的性能突变检测（见 changepoint.py）：每次保存测试记录后，用各模型本次的平均值更新 CUSUM 统计量，
+# 检测到突变时记录告警，可在 /alerts 与首页查看。
+# - metrics: 被监测的指标及其"变差"的方向（down 表示下降为回退，up 表示上升为回退）
+# - baseline_runs: 用前几次运行估计基线均值与标准差
+# - drift_k / threshold_h: CUSUM 的容许偏移与告警阈值（均以基线标准差为单位），阈值越大越不容易误报
+# - min_relative_sigma: 标准差下限（相对基线均值），避免结果非常稳定时的微小波动触发告警
+CHANGE_DETECTION = {
+    "enabled": True,
+    "metrics": {
+        "tokens_per_second": "down",
+        "time_to_first_token": "up",
+        "time_to_answer": "up",
+    },
+    "baseline_runs": 10,
+    "drift_k": 0.5,
+    "threshold_h": 5.0,
+    "min_relative_sigma": 0.05,
+}
+
+# 趋势图（见 timeseries.py）：服务端按图表宽度降采样后返回，首页与历史页的图表通过 /timeseries 获取数据。
+# - default_days: 未指定时间范围时显示最近几天
+# - max_width: 每条序列最多返回的点数（图表宽度上限，单位像素）
+# - cache_size / cache_seconds: 结果缓存的条目数与有效期；有新的请求明细或归档后缓存立即失效
+TIMESERIES = {
+    "default_days": 30,
+    "max_width": 2000,
+    "cache_size": 64,
+    "cache_seconds": 300,
+}
+
+# 路由与对冲模拟（见 routing_sim.py）：用实测的延迟与出错分布评估各路由策略。
+# - requests: 每个策略模拟的请求数
+# - metric: 作为延迟的指标（流式请求通常看首 token 时间）
+# - window_hours: 时间窗口长度，每个窗口从该窗口内的样本中抽样，least_latency 按上一个窗口的表现选择
+# - min_window_samples: 窗口内样本少于该值的服务商改用整个时间范围的样本
+# - max_error_rate: least_latency / 对冲选择服务商时，排除上一个窗口错误率高于该值的服务商
+# - hedge_delays_ms: 默认评估的对冲延迟
+SIMULATION = {
+    "requests": 1000000,
+    "metric": "time_to_first_token",
+    "window_hours": 24,
+    "min_window_samples": 5,
+    "max_error_rate": 0.5,
+    "hedge_delays_ms": [500, 1000, 2000],
+    "seed": 0,
+}
+
+# 单轮测试中同时进行的请求数上限；端点较多时按该上限分批发出，一个请求结束后才启动下一个。
+# 首批请求在 stagger_window_seconds 秒内均匀错开启动（相邻间隔不超过 stagger_seconds），避免同时发出；
+# 之后的请求在有请求结束时立即启动，错开启动的总耗时不随端点数量增长
+PROBE_CONCURRENCY = {
+    "max_in_flight": 32,
+    "stagger_seconds": 0.5,
+    "stagger_window_seconds": 5.0,
+}
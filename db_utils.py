@@ -6,15 +6,111 @@ Version: 0.2.0
 Author: Gwaanl
 
 数据库相关的初始化与读写函数
+首次读写数据库时自动执行 init_db，启动时无需提前建表。
+数据库使用 WAL 模式：读操作复用每个线程自己的连接，写操作统一交给单个写线程，
+写线程把队列中积压的写入合并到同一个事务中提交，页面读取不会被测试结果的写入阻塞。
 """
 
+import json
+import queue
 import sqlite3
+import threading
+from concurrent.futures import Future
+
+from utils import logger
 
 DB_PATH = "results.db"
 
+# 每个连接打开时设置的 PRAGMA（journal_mode=WAL 是持久的，在 init_db 中设置一次）
+CONNECTION_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",     # WAL 下只在检查点时 fsync，断电最多丢失最近的事务
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",      # 约 16MB 页缓存
+    "PRAGMA mmap_size=134217728",    # 128MB 内存映射读取
+]
+
+# 写线程每个事务最多合并的写操作数
+WRITE_BATCH_SIZE = 64
+
+# 空闲读连接池的上限：Web 服务每个请求可能在新线程中处理，请求结束时把连接放回池中供后续请求复用
+READ_POOL_SIZE = 8
+
+# 全文索引 probe_search 的列：回答内容、推理内容、结束原因（如 length 表示被截断）、错误信息
+# rowid 与 probe_results.id 一致，由 probe_results 上的触发器在插入/删除时同步
+SEARCH_COLUMNS = ["content", "reasoning", "finish_reason", "error"]
+
+_SEARCH_VALUES = """
+    CASE WHEN json_valid({row}.raw_response) THEN json_extract({row}.raw_response, '$.choices[0].message.content') END,
+    CASE WHEN json_valid({row}.raw_response) THEN json_extract({row}.raw_response, '$.choices[0].message.reasoning_content') END,
+    CASE WHEN json_valid({row}.raw_response) THEN json_extract({row}.raw_response, '$.choices[0].finish_reason') END,
+    CASE WHEN {row}.status != 'ok' THEN {row}.raw_response END
+"""
+
+# 当前 SQLite 是否支持 FTS5，在 init_db 中检测
+search_available = False
+
+_db_ready = False
+_db_init_lock = threading.Lock()
+
+# 后续版本为 test_results 新增的列，旧数据库在 init_db 时自动补齐
+TEST_RESULTS_EXTRA_COLUMNS = {
+    "run_id": "TEXT",
+    "warmup_html": "TEXT",
+    "trace_json": "TEXT",
+}
+
+# 后续版本为 probe_results 新增的列
+# vantage 为发起请求的探测点（本机或 worker.py 的 --vantage），旧数据为 NULL，视为本机
+PROBE_RESULTS_EXTRA_COLUMNS = {
+    "vantage": "TEXT",
+}
+
+# 单次请求明细中的数值列，非数值（如 "Error"、"Timeout"）存为 NULL
+PROBE_NUMERIC_COLUMNS = [
+    "completion_tokens",
+    "time_taken",
+    "tokens_per_second",
+    "reasoning_tokens",
+    "content_tokens",
+    "time_to_first_token",
+    "time_to_answer",
+    "reasoning_time",
+    "content_time",
+    "content_tokens_per_second",
+    "retries",
+    "throttle_time",
+]
+
+PROBE_COLUMNS = [
+    "record_id",
+    "run_id",
+    "test_round",
+    "is_warmup",
+    "model_key",
+    "model_name",
+    "status",
+] + PROBE_NUMERIC_COLUMNS + [
+    "circuit_state",
+    "input_timestamp",
+    "output_timestamp",
+    "raw_response",
+    "vantage",
+]
+
+def _ensure_columns(conn, table, columns):
+    """为旧数据库补齐缺失的列"""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, col_type in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+
 def init_db():
-    """初始化数据库，创建测试结果表（保留所有记录）"""
+    """初始化数据库，创建测试结果表及单次请求明细表（保留所有记录）"""
     with sqlite3.connect(DB_PATH) as conn:
+        # 只对新建的数据库生效（需在建表前设置）；旧数据库需执行一次 VACUUM 才会切换，见 retention.py
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
         c = conn.cursor()
         c.execute("""
         CREATE TABLE IF NOT EXISTS test_results (
@@ -27,28 +123,368 @@ def init_db():
             summary_html TEXT
         )
         """)
+        _ensure_columns(conn, "test_results", TEST_RESULTS_EXTRA_COLUMNS)
+        numeric_defs = ",\n            ".join(f"{col} REAL" for col in PROBE_NUMERIC_COLUMNS)
+        c.execute(f"""
+        CREATE TABLE IF NOT EXISTS probe_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            record_id INTEGER,
+            run_id TEXT,
+            test_round INTEGER,
+            is_warmup INTEGER NOT NULL DEFAULT 0,
+            model_key TEXT,
+            model_name TEXT,
+            status TEXT,
+            {numeric_defs},
+            circuit_state TEXT,
+            input_timestamp TEXT,
+            output_timestamp TEXT,
+            raw_response TEXT
+        )
+        """)
+        _ensure_columns(conn, "probe_results", PROBE_RESULTS_EXTRA_COLUMNS)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_probe_results_record ON probe_results (record_id)")
+        # worker 上报的结果没有 record_id，重试上报时按请求标识去重
+        c.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_probe_results_remote
+        ON probe_results (run_id, model_key, test_round, is_warmup, input_timestamp) WHERE record_id IS NULL
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_probe_results_model_time ON probe_results (model_key, input_timestamp)")
+        # 旧版本的日汇总没有 vantage 列，主键不同，需要重建表
+        rollup_columns = {row[1] for row in conn.execute("PRAGMA table_info(probe_rollups)")}
+        if rollup_columns and "vantage" not in rollup_columns:
+            c.execute("ALTER TABLE probe_rollups RENAME TO probe_rollups_legacy")
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS probe_rollups (
+            day TEXT NOT NULL,
+            model_key TEXT NOT NULL,
+            vantage TEXT NOT NULL,
+            model_name TEXT,
+            requests INTEGER NOT NULL DEFAULT 0,
+            ok_count INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            timeout_count INTEGER NOT NULL DEFAULT 0,
+            circuit_open_count INTEGER NOT NULL DEFAULT 0,
+            tps_sum REAL NOT NULL DEFAULT 0,
+            tps_min REAL,
+            tps_max REAL,
+            time_taken_sum REAL NOT NULL DEFAULT 0,
+            time_to_answer_sum REAL NOT NULL DEFAULT 0,
+            time_to_answer_count INTEGER NOT NULL DEFAULT 0,
+            completion_tokens_sum REAL NOT NULL DEFAULT 0,
+            retries_sum REAL NOT NULL DEFAULT 0,
+            throttle_time_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, model_key, vantage)
+        )
+        """)
+        if rollup_columns and "vantage" not in rollup_columns:
+            _migrate_legacy_rollups(conn)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS changepoint_state (
+            model_key TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL,
+            s_pos REAL NOT NULL,
+            s_neg REAL NOT NULL,
+            run_pos INTEGER NOT NULL,
+            run_neg INTEGER NOT NULL,
+            last_value REAL,
+            last_run_id TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (model_key, metric)
+        )
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS changepoint_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model_key TEXT NOT NULL,
+            model_name TEXT,
+            metric TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            regression INTEGER NOT NULL,
+            detected_at TEXT NOT NULL,
+            run_id TEXT,
+            record_id INTEGER,
+            before_mean REAL,
+            after_mean REAL,
+            observed REAL,
+            magnitude REAL,
+            statistic REAL,
+            sigma REAL
+        )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_changepoint_alerts_time ON changepoint_alerts (detected_at)")
+        _init_search(conn)
         conn.commit()
+    global _db_ready
+    _db_ready = True
 
-def save_test_result(start_time, end_time, round1_html, round2_html, round3_html, summary_html):
-    """保存测试结果到数据库（不删除旧记录）。"""
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-        c.execute("""
+def _migrate_legacy_rollups(conn):
+    """
+    把旧版本的日汇总复制到新表后删除旧表。旧表无法区分探测点，全部记为本地探测点，
+    其中可能混有当时已归档的 worker 上报结果
+    """
+    from config import COLLECTOR
+
+    names = [row[1] for row in conn.execute("PRAGMA table_info(probe_rollups_legacy)")]
+    columns = ", ".join(names)
+    conn.execute(f"INSERT INTO probe_rollups (vantage, {columns}) SELECT ?, {columns} FROM probe_rollups_legacy",
+                 (COLLECTOR["local_vantage"],))
+    conn.execute("DROP TABLE probe_rollups_legacy")
+    logger.info("probe_rollups 已升级为按 (日期, 模型, 探测点) 汇总")
+
+def _init_search(conn):
+    """创建全文索引及同步触发器；新建索引时为已有数据补建索引。SQLite 不支持 FTS5 时跳过"""
+    global search_available
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'probe_search'"
+    ).fetchone() is not None
+    # trigram 分词支持中文及任意子串匹配（SQLite 3.34+），不支持时退回默认分词
+    for tokenize in ("trigram", "unicode61"):
+        try:
+            conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS probe_search
+            USING fts5({', '.join(SEARCH_COLUMNS)}, tokenize = '{tokenize}')
+            """)
+            break
+        except sqlite3.OperationalError as e:
+            error = e
+    else:
+        logger.warning(f"SQLite 不支持 FTS5，全文搜索不可用: {error}")
+        search_available = False
+        return
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS probe_results_search_insert AFTER INSERT ON probe_results BEGIN
+        INSERT INTO probe_search (rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {_SEARCH_VALUES.format(row="new")});
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS probe_results_search_delete AFTER DELETE ON probe_results BEGIN
+        DELETE FROM probe_search WHERE rowid = old.id;
+    END
+    """)
+    if not exists:
+        conn.execute(f"""
+        INSERT INTO probe_search (rowid, {', '.join(SEARCH_COLUMNS)})
+        SELECT id, {_SEARCH_VALUES.format(row="probe_results")} FROM probe_results
+        """)
+    search_available = True
+
+def _open_connection():
+    """打开数据库连接并设置 PRAGMA，首次调用时先完成建表"""
+    if not _db_ready:
+        with _db_init_lock:
+            if not _db_ready:
+                init_db()
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+_local = threading.local()
+_idle_reads = []
+_idle_lock = threading.Lock()
+
+def _read_connection():
+    """当前线程复用的只读连接，优先取空闲池中的连接（DB_PATH 变化时重新打开）"""
+    cached = getattr(_local, "conn", None)
+    if cached is not None and cached[0] == DB_PATH:
+        return cached[1]
+    if cached is not None:
+        cached[1].close()
+    conn = None
+    with _idle_lock:
+        while _idle_reads and conn is None:
+            path, idle = _idle_reads.pop()
+            if path == DB_PATH:
+                conn = idle
+            else:
+                idle.close()
+    if conn is None:
+        conn = _open_connection()
+    _local.conn = (DB_PATH, conn)
+    return conn
+
+def release_read_connection():
+    """把当前线程的读连接放回空闲池，池满时关闭；由 Web 服务在每个请求结束时调用"""
+    cached = getattr(_local, "conn", None)
+    if cached is None:
+        return
+    _local.conn = None
+    with _idle_lock:
+        if cached[0] == DB_PATH and len(_idle_reads) < READ_POOL_SIZE:
+            _idle_reads.append(cached)
+            return
+    cached[1].close()
+
+
+class DBWriter:
+    """
+    单个写线程，串行执行所有写操作。
+    每次取出队列中已积压的写操作（最多 WRITE_BATCH_SIZE 个）放进同一个事务，
+    每个操作用 SAVEPOINT 隔开，某个操作失败只回滚它自己，其余照常提交。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, op):
+        """提交写操作 op(conn)，返回 Future，结果为 op 的返回值"""
+        future = Future()
+        self.queue.put((op, future))
+        return future
+
+    def _loop(self):
+        conn = _open_connection()
+        conn.isolation_level = None  # 手动管理事务
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._run_batch(conn, batch)
+
+    def _run_batch(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, future in batch:
+                conn.execute("SAVEPOINT op")
+                try:
+                    outcomes.append((future, op(conn), None))
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.exception(f"数据库批量写入失败: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(future, None, e) for _, future in batch]
+        for future, value, error in outcomes:
+            if error is None:
+                future.set_result(value)
+            else:
+                future.set_exception(error)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _write(op):
+    """把写操作交给写线程，阻塞到所在事务提交后返回 op 的结果"""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.db_path != DB_PATH:
+            _writer = DBWriter(DB_PATH)
+        writer = _writer
+    return writer.submit(op).result()
+
+def save_test_result(start_time, end_time, round1_html, round2_html, round3_html, summary_html,
+                     warmup_html=None, run_id=None, trace_json=None):
+    """保存测试结果到数据库（不删除旧记录），返回新记录的 id。trace_json 为本次运行的请求时间线（见 run_trace）。"""
+    def op(conn):
+        c = conn.execute("""
         INSERT INTO test_results 
-        (test_start_time, test_end_time, round1_html, round2_html, round3_html, summary_html)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """, (start_time, end_time, round1_html, round2_html, round3_html, summary_html))
-        conn.commit()
+        (test_start_time, test_end_time, round1_html, round2_html, round3_html, summary_html, warmup_html, run_id,
+         trace_json)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (start_time, end_time, round1_html, round2_html, round3_html, summary_html, warmup_html, run_id,
+              trace_json))
+        return c.lastrowid
+    return _write(op)
+
+def _probe_status(result):
+    """根据结果中的 completion_tokens 判断请求状态"""
+    tokens = result.get("completion_tokens")
+    if isinstance(tokens, (int, float)) and not isinstance(tokens, bool):
+        return "ok"
+    if tokens == "Timeout":
+        return "timeout"
+    if tokens == "Circuit Open":
+        return "circuit_open"
+    return "error"
+
+def _probe_row(record_id, run_id, result, vantage=None):
+    row = {
+        "record_id": record_id,
+        "run_id": run_id,
+        "test_round": result.get("test_round"),
+        "is_warmup": 1 if result.get("is_warmup") else 0,
+        "model_key": result.get("model_key"),
+        "model_name": result.get("model_name"),
+        "status": _probe_status(result),
+        "circuit_state": result.get("circuit_state"),
+        "input_timestamp": result.get("input_timestamp"),
+        "output_timestamp": result.get("output_timestamp"),
+        "raw_response": result.get("raw_response"),
+        "vantage": result.get("vantage") or vantage,
+    }
+    for col in PROBE_NUMERIC_COLUMNS:
+        value = result.get(col)
+        row[col] = value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    return tuple(row[col] for col in PROBE_COLUMNS)
+
+def save_probe_results(record_id, run_id, results, vantage=None):
+    """
+    保存单次请求明细（包括带 is_warmup 标记的预热请求），返回实际写入的行数。
+    vantage 为结果中未带 vantage 时使用的探测点；重复上报的 worker 结果会被忽略。
+    """
+    placeholders = ", ".join("?" for _ in PROBE_COLUMNS)
+    rows = [_probe_row(record_id, run_id, r, vantage) for r in results]
+    return _write(lambda conn: conn.executemany(
+        f"INSERT OR IGNORE INTO probe_results ({', '.join(PROBE_COLUMNS)}) VALUES ({placeholders})", rows
+    ).rowcount)
+
+def save_probe_result(run_id, result, vantage=None):
+    """
+    结果到达时立即保存一条请求明细（尚无所属记录，record_id 为空），返回新行的 id。
+    测试记录保存后由 attach_probe_results 关联。
+    """
+    placeholders = ", ".join("?" for _ in PROBE_COLUMNS)
+    row = _probe_row(None, run_id, result, vantage)
+    return _write(lambda conn: conn.execute(
+        f"INSERT INTO probe_results ({', '.join(PROBE_COLUMNS)}) VALUES ({placeholders})", row
+    ).lastrowid)
+
+def attach_probe_results(record_id, run_id):
+    """把某次运行中逐条保存的请求明细关联到测试记录，返回关联的行数"""
+    return _write(lambda conn: conn.execute(
+        "UPDATE probe_results SET record_id = ? WHERE run_id = ? AND record_id IS NULL", (record_id, run_id)
+    ).rowcount)
+
+# load_probe_text 可读取的字段：完整响应、回答内容、推理内容
+PROBE_TEXT_FIELDS = {
+    "raw": "raw_response",
+    "content": "CASE WHEN json_valid(raw_response) THEN json_extract(raw_response, '$.choices[0].message.content') END",
+    "reasoning": ("CASE WHEN json_valid(raw_response) "
+                  "THEN json_extract(raw_response, '$.choices[0].message.reasoning_content') END"),
+}
+
+def load_probe_text(probe_id, field="raw"):
+    """按需读取一条请求明细的大段文本，返回 (是否存在, 文本)"""
+    c = _read_connection().cursor()
+    c.execute(f"SELECT {PROBE_TEXT_FIELDS[field]} FROM probe_results WHERE id = ?", (probe_id,))
+    row = c.fetchone()
+    return (False, None) if row is None else (True, row[0])
 
 def load_latest_test_result():
     """读取最新的一条测试记录"""
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-        c.execute("""
-        SELECT id, test_start_time, test_end_time, round1_html, round2_html, round3_html, summary_html
-        FROM test_results ORDER BY id DESC LIMIT 1
-        """)
-        row = c.fetchone()
+    c = _read_connection().cursor()
+    c.execute("""
+    SELECT id, test_start_time, test_end_time, round1_html, round2_html, round3_html, summary_html, warmup_html
+    FROM test_results ORDER BY id DESC LIMIT 1
+    """)
+    row = c.fetchone()
     if row is None:
         return None
     return {
@@ -59,25 +495,411 @@ def load_latest_test_result():
         "round2_html": row[4],
         "round3_html": row[5],
         "summary_html": row[6],
+        "warmup_html": row[7],
     }
 
 def load_all_test_results():
     """读取所有测试记录（按 id 倒序）"""
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-        c.execute("""
-        SELECT id, test_start_time, test_end_time FROM test_results ORDER BY id DESC
-        """)
-        rows = c.fetchall()
+    c = _read_connection().cursor()
+    c.execute("""
+    SELECT id, test_start_time, test_end_time FROM test_results ORDER BY id DESC
+    """)
+    rows = c.fetchall()
     return rows
 
+def load_records_version():
+    """返回 (记录数, 最大记录 id)，用于判断历史列表和首页是否有变化"""
+    c = _read_connection().cursor()
+    c.execute("SELECT count(*), coalesce(max(id), 0) FROM test_results")
+    return c.fetchone()
+
+def record_exists(record_id):
+    c = _read_connection().cursor()
+    c.execute("SELECT 1 FROM test_results WHERE id = ?", (record_id,))
+    return c.fetchone() is not None
+
 def load_test_result_by_id(record_id):
     """根据记录ID读取一条测试记录"""
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-        c.execute("""
-        SELECT id, test_start_time, test_end_time, round1_html, round2_html, round3_html, summary_html
-        FROM test_results WHERE id = ?
-        """, (record_id,))
-        row = c.fetchone()
+    c = _read_connection().cursor()
+    c.execute("""
+    SELECT id, test_start_time, test_end_time, round1_html, round2_html, round3_html, summary_html, warmup_html,
+           run_id
+    FROM test_results WHERE id = ?
+    """, (record_id,))
+    row = c.fetchone()
     return row
+
+def load_run_trace(record_id):
+    """读取测试记录的请求时间线（dict），旧记录没有时间线时返回 None"""
+    c = _read_connection().cursor()
+    c.execute("SELECT trace_json FROM test_results WHERE id = ?", (record_id,))
+    row = c.fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+def search_probe_results(query, column=None, limit=50):
+    """
+    在回答内容、推理内容、结束原因和错误信息中全文搜索，按 bm25 相关度排序。
+    query 使用 FTS5 查询语法（trigram 分词下每个词至少 3 个字符）；column 限定只搜索某一列。
+    返回命中的请求列表，每项包含所属记录、运行、模型、轮次以及带 <mark> 高亮的片段。
+    """
+    if column is not None:
+        if column not in SEARCH_COLUMNS:
+            raise ValueError(f"unknown search column: {column}")
+        query = f"{column} : ({query})"
+    c = _read_connection().cursor()
+    c.execute("""
+    SELECT p.id, p.record_id, p.run_id, p.model_key, p.model_name, p.test_round, p.is_warmup, p.status,
+           p.input_timestamp, snippet(probe_search, -1, '<mark>', '</mark>', '…', 16), bm25(probe_search)
+    FROM probe_search JOIN probe_results p ON p.id = probe_search.rowid
+    WHERE probe_search MATCH ?
+    ORDER BY bm25(probe_search) LIMIT ?
+    """, (query, limit))
+    keys = ["probe_id", "record_id", "run_id", "model_key", "model_name", "test_round", "is_warmup", "status",
+            "input_timestamp", "snippet", "score"]
+    return [dict(zip(keys, row)) for row in c.fetchall()]
+
+def load_records_before(cutoff, limit):
+    """读取开始时间早于 cutoff（ISO 格式字符串）的测试记录 id，按时间从早到晚"""
+    c = _read_connection().cursor()
+    c.execute("""
+    SELECT id FROM test_results WHERE test_start_time < ? ORDER BY id LIMIT ?
+    """, (cutoff, limit))
+    return [row[0] for row in c.fetchall()]
+
+def iter_record_rows(record_id):
+    """依次返回一条测试记录及其全部请求明细（均为 dict），用于归档"""
+    c = _read_connection().cursor()
+    c.execute("SELECT * FROM test_results WHERE id = ?", (record_id,))
+    names = [d[0] for d in c.description]
+    row = c.fetchone()
+    if row is None:
+        return
+    yield "test_result", dict(zip(names, row))
+    c.execute("SELECT * FROM probe_results WHERE record_id = ? ORDER BY id", (record_id,))
+    names = [d[0] for d in c.description]
+    for row in c:
+        yield "probe", dict(zip(names, row))
+
+def _rollup_probes(conn, where, params):
+    """
+    把满足 where 条件的正式请求（不含预热）按 (日期, 模型, 探测点) 累加到 probe_rollups，
+    本服务自身的请求（vantage 为空）记为 COLLECTOR["local_vantage"]
+    """
+    from config import COLLECTOR
+
+    conn.execute(f"""
+    INSERT INTO probe_rollups (day, model_key, vantage, model_name, requests, ok_count, error_count, timeout_count,
+        circuit_open_count, tps_sum, tps_min, tps_max, time_taken_sum, time_to_answer_sum,
+        time_to_answer_count, completion_tokens_sum, retries_sum, throttle_time_sum)
+    SELECT substr(input_timestamp, 1, 10), model_key, coalesce(vantage, ?), max(model_name), count(*),
+        sum(status = 'ok'), sum(status = 'error'), sum(status = 'timeout'), sum(status = 'circuit_open'),
+        total(tokens_per_second), min(tokens_per_second), max(tokens_per_second), total(time_taken),
+        total(time_to_answer), count(time_to_answer), total(completion_tokens), total(retries),
+        total(throttle_time)
+    FROM probe_results WHERE ({where}) AND is_warmup = 0
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, model_key, vantage) DO UPDATE SET
+        model_name = excluded.model_name,
+        requests = requests + excluded.requests,
+        ok_count = ok_count + excluded.ok_count,
+        error_count = error_count + excluded.error_count,
+        timeout_count = timeout_count + excluded.timeout_count,
+        circuit_open_count = circuit_open_count + excluded.circuit_open_count,
+        tps_sum = tps_sum + excluded.tps_sum,
+        tps_min = min(coalesce(tps_min, excluded.tps_min), coalesce(excluded.tps_min, tps_min)),
+        tps_max = max(coalesce(tps_max, excluded.tps_max), coalesce(excluded.tps_max, tps_max)),
+        time_taken_sum = time_taken_sum + excluded.time_taken_sum,
+        time_to_answer_sum = time_to_answer_sum + excluded.time_to_answer_sum,
+        time_to_answer_count = time_to_answer_count + excluded.time_to_answer_count,
+        completion_tokens_sum = completion_tokens_sum + excluded.completion_tokens_sum,
+        retries_sum = retries_sum + excluded.retries_sum,
+        throttle_time_sum = throttle_time_sum + excluded.throttle_time_sum
+    """, (COLLECTOR["local_vantage"], *params))
+
+def purge_record(record_id):
+    """
+    把一条测试记录的正式请求（不含预热）按 (日期, 模型, 探测点) 累加到 probe_rollups，
+    然后删除该记录及其请求明细。汇总与删除在同一个事务中完成。
+    """
+    def op(conn):
+        _rollup_probes(conn, "record_id = ?", (record_id,))
+        deleted = conn.execute("DELETE FROM probe_results WHERE record_id = ?", (record_id,)).rowcount
+        conn.execute("DELETE FROM test_results WHERE id = ?", (record_id,))
+        return deleted
+    return _write(op)
+
+def load_remote_probe_ids_before(cutoff, limit):
+    """读取请求时间早于 cutoff 的 worker 上报结果（没有 record_id）的 id"""
+    c = _read_connection().cursor()
+    c.execute("""
+    SELECT id FROM probe_results WHERE record_id IS NULL AND input_timestamp < ? ORDER BY id LIMIT ?
+    """, (cutoff, limit))
+    return [row[0] for row in c.fetchall()]
+
+def iter_probe_rows(probe_ids):
+    """依次返回指定 id 的请求明细（dict），用于归档"""
+    c = _read_connection().cursor()
+    for i in range(0, len(probe_ids), 500):
+        chunk = probe_ids[i:i + 500]
+        c.execute(f"SELECT * FROM probe_results WHERE id IN ({', '.join('?' for _ in chunk)}) ORDER BY id", chunk)
+        names = [d[0] for d in c.description]
+        for row in c.fetchall():
+            yield dict(zip(names, row))
+
+def purge_probes(probe_ids):
+    """汇总并删除指定 id 的请求明细，返回删除的行数"""
+    def op(conn):
+        deleted = 0
+        for i in range(0, len(probe_ids), 500):
+            chunk = probe_ids[i:i + 500]
+            where = f"id IN ({', '.join('?' for _ in chunk)})"
+            _rollup_probes(conn, where, chunk)
+            deleted += conn.execute(f"DELETE FROM probe_results WHERE {where}", chunk).rowcount
+        return deleted
+    return _write(op)
+
+def incremental_vacuum(max_pages):
+    """归还最多 max_pages 个空闲页给文件系统（需要 auto_vacuum=INCREMENTAL），返回剩余空闲页数"""
+    def op(conn):
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return None
+        # 每次执行只推进一步（释放一页），逐页执行以免一次性长时间占用写锁
+        for _ in range(max_pages):
+            conn.execute("PRAGMA incremental_vacuum")
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return _write(op)
+
+def load_probe_rollups(start_day=None, end_day=None):
+    """读取按 (日期, 模型, 探测点) 汇总的历史统计，日期为 YYYY-MM-DD，含两端"""
+    c = _read_connection().cursor()
+    c.execute("""
+    SELECT day, model_key, vantage, model_name, requests, ok_count, error_count, timeout_count, circuit_open_count,
+           tps_sum / nullif(ok_count, 0), tps_min, tps_max, time_taken_sum / nullif(requests, 0),
+           time_to_answer_sum / nullif(time_to_answer_count, 0), completion_tokens_sum, retries_sum, throttle_time_sum
+    FROM probe_rollups
+    WHERE day >= coalesce(?, day) AND day <= coalesce(?, day)
+    ORDER BY day, model_key, vantage
+    """, (start_day, end_day))
+    keys = ["day", "model_key", "vantage", "model_name", "requests", "ok_count", "error_count", "timeout_count",
+            "circuit_open_count", "avg_tokens_per_second", "min_tokens_per_second", "max_tokens_per_second",
+            "avg_time_taken", "avg_time_to_answer", "completion_tokens", "retries", "throttle_time"]
+    return [dict(zip(keys, row)) for row in c.fetchall()]
+
+# 趋势图可用的指标，以及 probe_rollups 中对应的日均值表达式（None 表示汇总表中没有该指标）
+SERIES_METRICS = {
+    "tokens_per_second": "tps_sum / nullif(ok_count, 0)",
+    "time_to_first_token": None,
+    "time_to_answer": "time_to_answer_sum / nullif(time_to_answer_count, 0)",
+    "time_taken": "time_taken_sum / nullif(requests, 0)",
+}
+
+# ISO 时间（按原样视为 UTC）换算为毫秒，与页面上按 UTC 显示配合，即显示记录时的本地时间
+_EPOCH_MS = "(julianday({}) - 2440587.5) * 86400000.0"
+
+def iter_series_points(metric, start=None, end=None, model_keys=None, vantage=None, batch_size=5000):
+    """
+    逐批读取正式请求的 (模型, 时间毫秒, 指标值)，按模型、时间排序，走 (model_key, input_timestamp) 索引。
+    start（含）/ end（不含）为 ISO 时间，vantage 为空时不限探测点。
+    """
+    from config import COLLECTOR
+
+    where = ["is_warmup = 0", f"{metric} IS NOT NULL",
+             "input_timestamp >= coalesce(?, '')", "input_timestamp < coalesce(?, '9999')"]
+    params = [start, end]
+    if model_keys:
+        where.append(f"model_key IN ({', '.join('?' for _ in model_keys)})")
+        params.extend(model_keys)
+    if vantage:
+        where.append("coalesce(vantage, ?) = ?")
+        params.extend([COLLECTOR["local_vantage"], vantage])
+    c = _read_connection().cursor()
+    c.execute(f"""
+    SELECT model_key, {_EPOCH_MS.format('input_timestamp')}, {metric} FROM probe_results
+    WHERE {' AND '.join(where)}
+    ORDER BY model_key, input_timestamp
+    """, params)
+    while True:
+        rows = c.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+def load_series_rollups(metric, start_day=None, end_day=None, model_keys=None, vantage=None):
+    """
+    读取已归档日期的日均值 [(模型, 当天中午的时间毫秒, 日均值)]，日期为 YYYY-MM-DD，含两端。
+    原始请求已被保留任务删除的日期只剩这些汇总点；指标没有日汇总时返回空列表。
+    vantage 为空时合并所有探测点的汇总行（各行日均值分别返回）。
+    """
+    expr = SERIES_METRICS[metric]
+    if expr is None:
+        return []
+    params = [start_day, end_day]
+    model_filter = ""
+    if model_keys:
+        model_filter = f"AND model_key IN ({', '.join('?' for _ in model_keys)})"
+        params.extend(model_keys)
+    if vantage:
+        model_filter += " AND vantage = ?"
+        params.append(vantage)
+    c = _read_connection().cursor()
+    c.execute(f"""
+    SELECT model_key, {_EPOCH_MS.format('day')} + 43200000.0, {expr} FROM probe_rollups
+    WHERE day >= coalesce(?, day) AND day <= coalesce(?, day) {model_filter} AND {expr} IS NOT NULL
+    ORDER BY model_key, day
+    """, params)
+    return c.fetchall()
+
+def iter_latency_samples(metric, start=None, end=None, model_keys=None, vantage=None, batch_size=5000):
+    """
+    逐批读取正式请求的 (模型, 时间毫秒, 是否成功, 指标值, 总耗时)，按时间排序，供路由模拟使用。
+    失败的请求没有指标值，用总耗时作为失败前等待的时间。参数含义同 iter_series_points。
+    """
+    from config import COLLECTOR
+
+    where = ["is_warmup = 0", "input_timestamp >= coalesce(?, '')", "input_timestamp < coalesce(?, '9999')"]
+    params = [start, end]
+    if model_keys:
+        where.append(f"model_key IN ({', '.join('?' for _ in model_keys)})")
+        params.extend(model_keys)
+    if vantage:
+        where.append("coalesce(vantage, ?) = ?")
+        params.extend([COLLECTOR["local_vantage"], vantage])
+    c = _read_connection().cursor()
+    c.execute(f"""
+    SELECT model_key, {_EPOCH_MS.format('input_timestamp')}, status = 'ok', {metric}, time_taken FROM probe_results
+    WHERE {' AND '.join(where)}
+    ORDER BY input_timestamp
+    """, params)
+    while True:
+        rows = c.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+def load_probes_version():
+    """(最大请求明细 id, 日汇总的请求总数)，新增请求或归档后都会变化，用于趋势图缓存"""
+    c = _read_connection().cursor()
+    c.execute("""
+    SELECT (SELECT coalesce(max(id), 0) FROM probe_results), (SELECT coalesce(sum(requests), 0) FROM probe_rollups)
+    """)
+    return c.fetchone()
+
+def _probe_filter(start=None, end=None, model_keys=None):
+    """按请求时间与模型过滤请求明细的 WHERE 子句及参数（没有条件时子句为空字符串）"""
+    where, params = [], []
+    if start:
+        where.append("input_timestamp >= ?")
+        params.append(start)
+    if end:
+        where.append("input_timestamp < ?")
+        params.append(end)
+    if model_keys:
+        where.append(f"model_key IN ({', '.join('?' for _ in model_keys)})")
+        params.extend(model_keys)
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+def iter_probe_results(start=None, end=None, model_keys=None, include_raw=False, batch_size=1000,
+                       order_by_day=False):
+    """
+    按 id 顺序逐行返回请求明细（dict），每次从数据库取 batch_size 行，内存占用与总行数无关。
+    start / end 为 ISO 格式时间（按 input_timestamp 过滤，start 含、end 不含）；include_raw 为 False 时不读取 raw_response。
+    order_by_day 为 True 时改为按 (日期, 模型, id) 排序，同一日期、同一模型的行相邻（分区导出使用）。
+    """
+    columns = ["id"] + [c for c in PROBE_COLUMNS if include_raw or c != "raw_response"]
+    where, params = _probe_filter(start, end, model_keys)
+    order = "substr(input_timestamp, 1, 10), model_key, id" if order_by_day else "id"
+    c = _read_connection().cursor()
+    c.execute(f"SELECT {', '.join(columns)} FROM probe_results{where} ORDER BY {order}", params)
+    while True:
+        rows = c.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            yield dict(zip(columns, row))
+
+def load_probe_days_models(start=None, end=None, model_keys=None):
+    """请求明细中出现的全部 (日期, 模型) 组合，参数同 iter_probe_results；用于预估分区导出的分区数"""
+    where, params = _probe_filter(start, end, model_keys)
+    c = _read_connection().cursor()
+    c.execute(f"SELECT DISTINCT substr(input_timestamp, 1, 10), model_key FROM probe_results{where}", params)
+    return c.fetchall()
+
+CHANGEPOINT_STATE_FIELDS = ["n", "mean", "m2", "s_pos", "s_neg", "run_pos", "run_neg",
+                            "last_value", "last_run_id", "updated_at"]
+CHANGEPOINT_ALERT_FIELDS = ["model_key", "model_name", "metric", "direction", "regression", "detected_at", "run_id",
+                            "record_id", "before_mean", "after_mean", "observed", "magnitude", "statistic", "sigma"]
+
+def update_changepoints(model_keys, update):
+    """
+    在写线程的一个事务中更新突变检测状态（见 changepoint.py）：读取 model_keys 各序列的状态
+    {(模型, 指标): 状态}，交给 update 原地修改并返回告警列表，再写回状态与告警。返回告警列表。
+    """
+    keys = sorted(model_keys)
+
+    def op(conn):
+        states = {}
+        placeholders = ", ".join("?" for _ in keys)
+        for row in conn.execute(f"""
+        SELECT model_key, metric, {', '.join(CHANGEPOINT_STATE_FIELDS)}
+        FROM changepoint_state WHERE model_key IN ({placeholders})
+        """, keys):
+            states[(row[0], row[1])] = dict(zip(CHANGEPOINT_STATE_FIELDS, row[2:]))
+        alerts = update(states)
+        conn.executemany(f"""
+        INSERT OR REPLACE INTO changepoint_state (model_key, metric, {', '.join(CHANGEPOINT_STATE_FIELDS)})
+        VALUES ({', '.join('?' for _ in range(len(CHANGEPOINT_STATE_FIELDS) + 2))})
+        """, [(model_key, metric, *(state.get(f) for f in CHANGEPOINT_STATE_FIELDS))
+              for (model_key, metric), state in states.items()])
+        conn.executemany(f"""
+        INSERT INTO changepoint_alerts ({', '.join(CHANGEPOINT_ALERT_FIELDS)})
+        VALUES ({', '.join('?' for _ in CHANGEPOINT_ALERT_FIELDS)})
+        """, [tuple(alert[f] for f in CHANGEPOINT_ALERT_FIELDS) for alert in alerts])
+        return alerts
+    return _write(op)
+
+def load_changepoint_alerts(since=None, model_key=None, regressions_only=False, limit=100):
+    """读取突变告警（按 id 倒序）；since 为 ISO 时间，regressions_only 时只返回指标变差的告警"""
+    c = _read_connection().cursor()
+    c.execute(f"""
+    SELECT id, {', '.join(CHANGEPOINT_ALERT_FIELDS)} FROM changepoint_alerts
+    WHERE detected_at >= coalesce(?, '') AND (? IS NULL OR model_key = ?) AND (? = 0 OR regression = 1)
+    ORDER BY id DESC LIMIT ?
+    """, (since, model_key, model_key, 1 if regressions_only else 0, limit))
+    rows = [dict(zip(["id"] + CHANGEPOINT_ALERT_FIELDS, row)) for row in c.fetchall()]
+    for row in rows:
+        row["regression"] = bool(row["regression"])
+    return rows
+
+def load_alerts_version():
+    """最新一条告警的 id，用于判断首页的告警列表是否有变化"""
+    c = _read_connection().cursor()
+    c.execute("SELECT coalesce(max(id), 0) FROM changepoint_alerts")
+    return c.fetchone()[0]
+
+def load_changepoint_states():
+    """读取全部序列的当前状态，用于查看各序列的基线与累积量"""
+    c = _read_connection().cursor()
+    c.execute(f"SELECT model_key, metric, {', '.join(CHANGEPOINT_STATE_FIELDS)} FROM changepoint_state "
+              "ORDER BY model_key, metric")
+    return [dict(zip(["model_key", "metric"] + CHANGEPOINT_STATE_FIELDS, row)) for row in c.fetchall()]
+
+def load_vantage_summary(since=None):
+    """
+    按 (探测点, 模型) 汇总正式请求：请求数、成功数、平均/最小/最大 tokens/s、平均首个回答 token 时间。
+    since 为 ISO 时间，只统计此后的请求；旧数据没有 vantage 时视为 local_vantage。
+    """
+    from config import COLLECTOR
+
+    c = _read_connection().cursor()
+    c.execute("""
+    SELECT coalesce(vantage, ?), model_key, max(model_name), count(*), sum(status = 'ok'),
+           avg(tokens_per_second), min(tokens_per_second), max(tokens_per_second), avg(time_to_answer),
+           max(input_timestamp)
+    FROM probe_results
+    WHERE is_warmup = 0 AND input_timestamp >= coalesce(?, '')
+    GROUP BY 1, 2
+    ORDER BY 2, 1
+    """, (COLLECTOR["local_vantage"], since))
+    keys = ["vantage", "model_key", "model_name", "requests", "ok_count", "avg_tokens_per_second",
+            "min_tokens_per_second", "max_tokens_per_second", "avg_time_to_answer", "last_seen"]
+    return [dict(zip(keys, row)) for row in c.fetchall()]
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+请求明细的批量导出：按日期与服务商分区的 Parquet 数据集，以及逐行生成的 CSV / NDJSON。
+所有导出都按批从数据库读取，内存占用与导出的总行数无关。
+Parquet 导出需要 pyarrow（可选依赖，只在导出时导入）。
+
+命令行用法：
+    python export.py parquet export/probes --start 2025-01-01 --end 2025-02-01
+"""
+
+import io
+import csv
+import json
+
+import db_utils
+from rate_limiter import provider_of
+
+# 导出的列：请求明细的全部列，加上服务商与日期（分区键）
+EXPORT_COLUMNS = ["id"] + db_utils.PROBE_COLUMNS + ["provider", "date"]
+
+# Parquet 每个 RecordBatch 的行数
+PARQUET_BATCH_ROWS = 50000
+
+# 同时打开的 Parquet 文件数上限；数据按日期排序写入，超出时关闭的是已写完的分区
+PARQUET_MAX_OPEN_FILES = 512
+
+
+def iter_export_rows(start=None, end=None, model_keys=None, include_raw=False, order_by_day=False):
+    """逐行返回带 provider 与 date 列的请求明细；order_by_day 时按日期、模型排序"""
+    for row in db_utils.iter_probe_results(start, end, model_keys, include_raw, order_by_day=order_by_day):
+        row["provider"] = provider_of(row["model_key"])
+        row["date"] = (row["input_timestamp"] or "")[:10] or None
+        yield row
+
+
+def export_columns(include_raw=False):
+    return [c for c in EXPORT_COLUMNS if include_raw or c != "raw_response"]
+
+
+def iter_csv(rows, columns):
+    """把行迭代器转换为 CSV 文本片段（首行为表头），每行生成一次"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([row.get(c) for c in columns])
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows, columns):
+    """把行迭代器转换为 NDJSON 文本片段，每行一个 JSON 对象"""
+    for row in rows:
+        yield json.dumps({c: row.get(c) for c in columns}, ensure_ascii=False) + "\n"
+
+
+def _parquet_schema(pa, include_raw):
+    types = {
+        "id": pa.int64(),
+        "record_id": pa.int64(),
+        "test_round": pa.int64(),
+        "is_warmup": pa.int8(),
+    }
+    for col in db_utils.PROBE_NUMERIC_COLUMNS:
+        types[col] = pa.float64()
+    return pa.schema([(c, types.get(c, pa.string())) for c in export_columns(include_raw)])
+
+
+def export_parquet(out_dir, start=None, end=None, model_keys=None, include_raw=False):
+    """
+    导出为按 date / provider 分区（hive 风格目录：date=YYYY-MM-DD/provider=xxx）的 Parquet 数据集。
+    数据按日期排序、PARQUET_BATCH_ROWS 行一批流式写入，返回导出的行数。
+    一批数据可能跨越很多分区（服务商多、单日数据少时），max_partitions 按实际的分区数设置。
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError as e:
+        raise ImportError("Parquet 导出需要 pyarrow，请先执行 pip install pyarrow") from e
+
+    schema = _parquet_schema(pa, include_raw)
+    columns = schema.names
+    exported = 0
+    partitions = {(day, provider_of(model_key))
+                  for day, model_key in db_utils.load_probe_days_models(start, end, model_keys)}
+
+    def batches():
+        nonlocal exported
+        chunk = {c: [] for c in columns}
+        size = 0
+        for row in iter_export_rows(start, end, model_keys, include_raw, order_by_day=True):
+            for c in columns:
+                chunk[c].append(row.get(c))
+            size += 1
+            if size >= PARQUET_BATCH_ROWS:
+                exported += size
+                yield pa.RecordBatch.from_pydict(chunk, schema=schema)
+                chunk = {c: [] for c in columns}
+                size = 0
+        if size:
+            exported += size
+            yield pa.RecordBatch.from_pydict(chunk, schema=schema)
+
+    ds.write_dataset(
+        batches(),
+        out_dir,
+        schema=schema,
+        format="parquet",
+        partitioning=["date", "provider"],
+        partitioning_flavor="hive",
+        existing_data_behavior="overwrite_or_ignore",
+        max_partitions=max(len(partitions), 1024),
+        max_open_files=PARQUET_MAX_OPEN_FILES,
+    )
+    return exported
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="导出请求明细")
+    parser.add_argument("format", choices=["parquet", "csv", "ndjson"])
+    parser.add_argument("output", help="parquet 为输出目录，csv / ndjson 为输出文件（- 表示标准输出）")
+    parser.add_argument("--start", help="开始时间（含），ISO 格式")
+    parser.add_argument("--end", help="结束时间（不含），ISO 格式")
+    parser.add_argument("--models", help="逗号分隔的模型 key")
+    parser.add_argument("--include-raw", action="store_true", help="包含完整的响应内容 raw_response")
+    args = parser.parse_args()
+    models = [m.strip() for m in args.models.split(",") if m.strip()] if args.models else None
+
+    if args.format == "parquet":
+        count = export_parquet(args.output, args.start, args.end, models, args.include_raw)
+        print(f"已导出 {count} 行到 {args.output}")
+    else:
+        import sys
+        columns = export_columns(args.include_raw)
+        rows = iter_export_rows(args.start, args.end, models, args.include_raw)
+        chunks = iter_csv(rows, columns) if args.format == "csv" else iter_ndjson(rows, columns)
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
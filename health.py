@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+按服务商的健康状态跟踪与熔断器
+"""
+
+import time
+import threading
+
+from models_config import CIRCUIT_BREAKER
+from rate_limiter import provider_of
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    单个服务商的熔断器。
+    - closed：正常发送完整请求。
+    - open：连续失败/超时达到 failure_threshold 次后进入；后续请求先发送短超时的探测请求，
+      探测失败则直接跳过完整请求，不再等待完整的超时时间。
+    - half_open：探测成功后进入，放行一次完整请求；成功则回到 closed，失败则重新 open。
+    """
+
+    def __init__(self, provider, failure_threshold):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def record_success(self):
+        with self.lock:
+            self.state = STATE_CLOSED
+            self.consecutive_failures = 0
+            self.total_successes += 1
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != STATE_OPEN:
+                    self.opened_at = time.time()
+                self.state = STATE_OPEN
+
+    def record_probe_success(self):
+        """探测请求成功，放行一次完整请求"""
+        with self.lock:
+            if self.state == STATE_OPEN:
+                self.state = STATE_HALF_OPEN
+
+    def current_state(self):
+        with self.lock:
+            return self.state
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "total_failures": self.total_failures,
+                "total_successes": self.total_successes,
+                "opened_at": self.opened_at,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model_key):
+    """获取（或创建）模型所属服务商的熔断器"""
+    provider = provider_of(model_key)
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(provider, CIRCUIT_BREAKER["failure_threshold"])
+            _breakers[provider] = breaker
+        return breaker
+
+
+def breaker_snapshot():
+    """所有服务商熔断器的当前状态，用于 /test_progress 展示"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.provider: b.snapshot() for b in breakers}
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+页面响应的压缩与缓存：按 Accept-Encoding 进行 brotli / gzip 压缩，
+以及基于 ETag 的条件请求（命中时直接返回 304，不再渲染页面）。
+brotli 为可选依赖，未安装时只使用 gzip。
+"""
+
+import gzip
+import functools
+
+from flask import request, make_response
+
+# 需要压缩的响应类型，以及压缩的最小长度（字节）
+COMPRESSIBLE_MIMETYPES = (
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/csv",
+    "application/json",
+    "application/javascript",
+)
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_brotli = None
+
+
+def _load_brotli():
+    """首次压缩时尝试导入 brotli，未安装返回 None"""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli or None
+
+
+def choose_encoding():
+    """根据请求的 Accept-Encoding 选择压缩方式：优先 br，其次 gzip，都不接受时返回 None"""
+    accepted = request.accept_encodings
+    if accepted["br"] and _load_brotli() is not None:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response):
+    """after_request 钩子：压缩可压缩的完整响应；流式响应（如导出接口）保持原样逐行发送"""
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+    if encoding == "br":
+        data = _load_brotli().compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    # 强 ETag 对应确定的字节内容，不同编码使用不同的 ETag
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def matching_etag(etag):
+    """返回请求的 If-None-Match 中与该 ETag（任一编码版本）匹配的那个，没有匹配时返回 None"""
+    if_none_match = request.if_none_match
+    for tag in (etag, f"{etag}-br", f"{etag}-gzip"):
+        if if_none_match.contains(tag):
+            return tag
+    return None
+
+
+def cached_page(etag_for, cache_control):
+    """
+    页面缓存装饰器。etag_for 接收与视图相同的参数，返回页面内容的 ETag（None 表示不缓存）。
+    请求的 If-None-Match 命中时直接返回 304，否则渲染页面并附上 ETag 和 Cache-Control。
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = etag_for(*args, **kwargs)
+            if etag is None:
+                return view(*args, **kwargs)
+            matched = matching_etag(etag)
+            if matched is not None:
+                response = make_response("", 304)
+                response.set_etag(matched)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+            response.headers["Cache-Control"] = cache_control
+            response.vary.add("Accept-Encoding")
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+基于 APScheduler 的定时测试调度层：分组间隔、随机抖动、重叠策略与并发上限
+"""
+
+import threading
+
+from config import SCHEDULE_GROUPS, MAX_CONCURRENT_RUNS, DEFAULT_RUN_MODE, INTERLEAVE_COOLDOWN_SECONDS
+from test_runner import background_test_runner
+from run_state import RunState, register_run
+from profiling import Profiler
+import registry
+from utils import logger
+
+# 所有测试（定时与手动）共用的并发槽位
+run_slots = threading.BoundedSemaphore(MAX_CONCURRENT_RUNS)
+
+
+class GroupState:
+    """单个分组的运行状态：active 表示正在运行或正在等待槽位，pending 表示已排队的补跑"""
+
+    def __init__(self):
+        self.active = False
+        self.pending = False
+        self.lock = threading.Lock()
+
+
+_group_states = {name: GroupState() for name in SCHEDULE_GROUPS}
+
+
+def run_in_slot(timeout=300, model_keys=None, label="", mode=None, cooldown=None, profile=False):
+    """
+    尝试占用一个并发槽位并在后台线程中执行一次完整测试。
+    成功时返回本次运行的 RunState；槽位已满时返回 None，不会启动线程。
+    profile 为 True 时对本次运行做性能分析（见 profiling.py）。
+    """
+    state = RunState(
+        label=label,
+        mode=mode or DEFAULT_RUN_MODE,
+        cooldown=INTERLEAVE_COOLDOWN_SECONDS if cooldown is None else cooldown
+    )
+    if profile:
+        state.profiler = Profiler()
+    if not run_slots.acquire(blocking=False):
+        return None
+    register_run(state)
+
+    def _target():
+        try:
+            background_test_runner(timeout, model_keys, state)
+        finally:
+            run_slots.release()
+
+    threading.Thread(target=_target, daemon=True).start()
+    return state
+
+
+def _run_group(name, slot_held):
+    group = SCHEDULE_GROUPS[name]
+    state = _group_states[name]
+    if not slot_held:
+        run_slots.acquire()  # queue 策略：等待空闲槽位
+    finished = False
+    try:
+        while True:
+            model_keys = registry.resolve_models(group.get("models"), group.get("tags"), group.get("endpoint_groups"))
+            if model_keys == []:
+                logger.info(f"=== 调度分组 {name}: 没有匹配的已启用端点，跳过 ===")
+            else:
+                logger.info(f"=== 调度分组 {name}: 开始执行测试 ===")
+                run = register_run(RunState(
+                    label=f"schedule:{name}",
+                    mode=group.get("mode", DEFAULT_RUN_MODE),
+                    cooldown=group.get("cooldown", INTERLEAVE_COOLDOWN_SECONDS)
+                ))
+                background_test_runner(group.get("timeout", 300), model_keys, run)
+            with state.lock:
+                if not state.pending:
+                    state.active = False
+                    finished = True
+                    break
+                state.pending = False
+            logger.info(f"=== 调度分组 {name}: 执行排队中的补跑 ===")
+    except Exception as e:
+        logger.exception(f"=== 调度分组 {name}: 执行异常: {e} ===")
+    finally:
+        if not finished:
+            # 出错时同样清除运行状态（排队的补跑一并放弃），否则该分组之后的触发会一直被跳过
+            with state.lock:
+                state.active = False
+                state.pending = False
+        run_slots.release()
+
+
+def trigger_group(name):
+    """
+    APScheduler 回调：触发一个分组的测试。
+    上一次同组测试未结束时，根据 overlap_policy 跳过或排队（每组最多积压一次），
+    因此无论测试多慢都不会堆积线程。
+    """
+    group = SCHEDULE_GROUPS[name]
+    state = _group_states[name]
+    policy = group.get("overlap_policy", "skip")
+
+    with state.lock:
+        if state.active:
+            if policy == "queue" and not state.pending:
+                state.pending = True
+                logger.info(f"=== 调度分组 {name}: 上一次测试未结束，已排队 ===")
+            else:
+                logger.info(f"=== 调度分组 {name}: 上一次测试未结束，跳过本次 ===")
+            return
+        slot_held = False
+        if policy != "queue":
+            if not run_slots.acquire(blocking=False):
+                logger.info(f"=== 调度分组 {name}: 已达并发上限 {MAX_CONCURRENT_RUNS}，跳过本次 ===")
+                return
+            slot_held = True
+        state.active = True
+
+    threading.Thread(target=_run_group, args=(name, slot_held), daemon=True).start()
+
+
+def register_scheduled_jobs(scheduler):
+    """按 SCHEDULE_GROUPS 向 APScheduler 注册各分组的周期任务"""
+    for name, group in SCHEDULE_GROUPS.items():
+        if not group.get("enabled", True):
+            continue
+        scheduler.add_job(
+            id=f"probe_{name}",
+            func=trigger_group,
+            args=[name],
+            trigger="interval",
+            minutes=group.get("interval_minutes", 60),
+            jitter=group.get("jitter_seconds", 0),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+        logger.info(f"已注册定时分组 {name}: 每 {group.get('interval_minutes', 60)} 分钟，"
+                    f"抖动 {group.get('jitter_seconds', 0)} 秒，策略 {group.get('overlap_policy', 'skip')}")
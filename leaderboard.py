@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+测试过程中随结果到达增量更新的排行榜（均值、中位数、离群标记与计数）
+"""
+
+import math
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+from config import LEADERBOARD_MAX_SAMPLES
+
+# 剔除离群后取平均的指标，与汇总表的列一一对应
+MEAN_METRICS = [
+    "completion_tokens",
+    "time_taken",
+    "tokens_per_second",
+    "reasoning_tokens",
+    "content_tokens",
+    "time_to_first_token",
+    "time_to_answer",
+    "reasoning_time",
+    "content_time",
+    "content_tokens_per_second",
+]
+
+# 对全部请求（包括出错和离群的请求）求和的指标
+TOTAL_METRICS = ["retries", "throttle_time"]
+
+
+def _to_number(value):
+    """与 pd.to_numeric(errors='coerce') 一致：无法转换的值视为缺失"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if math.isnan(value) else float(value)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+
+def _quantile(sorted_values, q):
+    """线性插值分位数，与 pandas Series.quantile 默认行为一致"""
+    pos = (len(sorted_values) - 1) * q
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class ModelAggregate:
+    """
+    单个模型的运行中聚合。
+    离群判定与 detect_outliers_iqr 相同：缺失视为离群，其余按 1.5 倍 IQR 判定。
+    有效样本按 tokens/s 有序保存，非离群样本总是有序列表中连续的一段，两端的样本即离群样本；
+    各指标维护有效样本的累计和与计数，每次 add 时重新计算分位数边界，
+    并从累计值中扣除两端离群样本得到均值与离群数，读取时（如每次 /test_progress 轮询）不再遍历样本。
+    有效样本最多保留最近的 LEADERBOARD_MAX_SAMPLES 个，超出时移除最早的样本，每次更新的开销有固定上限；
+    缺失样本的计数与 TOTAL_METRICS 的合计始终覆盖全部样本。
+    """
+
+    def __init__(self, model_key, model_name):
+        self.model_key = model_key
+        self.model_name = model_name
+        self.sample_count = 0
+        self.missing_count = 0     # tokens/s 缺失的样本，总是离群
+        self.arrivals = deque()    # 保留的有效样本 (tokens/s, 序号)，按到达顺序
+        self.sorted_keys = []      # 保留的有效样本 (tokens/s, 序号)，有序
+        self.sorted_tps = []       # 与 sorted_keys 一一对应的 tokens/s
+        self.sorted_samples = []   # 与 sorted_keys 一一对应的样本，只保留数值列
+        self.sums = {k: 0.0 for k in MEAN_METRICS}
+        self.counts = {k: 0 for k in MEAN_METRICS}
+        self.totals = {k: 0.0 for k in TOTAL_METRICS}
+        self.lower_bound = None
+        self.upper_bound = None
+        self._means = None
+        self._outliers = 0
+        self._median = None
+
+    def add(self, result):
+        self.sample_count += 1
+        for k in TOTAL_METRICS:
+            self.totals[k] += _to_number(result.get(k)) or 0.0
+        sample = {k: _to_number(result.get(k)) for k in MEAN_METRICS}
+        tps = sample["tokens_per_second"]
+        if tps is None:
+            self.missing_count += 1
+            self._outliers += 1
+            return
+
+        key = (tps, self.sample_count)
+        index = bisect_right(self.sorted_keys, key)
+        self.sorted_keys.insert(index, key)
+        self.sorted_tps.insert(index, tps)
+        self.sorted_samples.insert(index, sample)
+        self.arrivals.append(key)
+        self._accumulate(sample, 1)
+        if len(self.arrivals) > LEADERBOARD_MAX_SAMPLES:
+            index = bisect_left(self.sorted_keys, self.arrivals.popleft())
+            del self.sorted_keys[index], self.sorted_tps[index]
+            self._accumulate(self.sorted_samples.pop(index), -1)
+        self._refresh()
+
+    def _accumulate(self, sample, sign):
+        for k, value in sample.items():
+            if value is not None:
+                self.sums[k] += sign * value
+                self.counts[k] += sign
+
+    def _refresh(self):
+        """重新计算分位数边界以及缓存的中位数、离群数和剔除离群后的均值"""
+        q1 = _quantile(self.sorted_tps, 0.25)
+        q3 = _quantile(self.sorted_tps, 0.75)
+        iqr = q3 - q1
+        self.lower_bound = q1 - 1.5 * iqr
+        self.upper_bound = q3 + 1.5 * iqr
+        self._median = _quantile(self.sorted_tps, 0.5)
+
+        # 非离群样本为 [lo, hi) 区间，区间外的两端通常只有少数几个样本
+        lo = bisect_left(self.sorted_tps, self.lower_bound)
+        hi = bisect_right(self.sorted_tps, self.upper_bound)
+        self._outliers = self.missing_count + lo + len(self.sorted_tps) - hi
+        if lo >= hi:
+            self._means = None
+            return
+        sums, counts = dict(self.sums), dict(self.counts)
+        for sample in self.sorted_samples[:lo] + self.sorted_samples[hi:]:
+            for k, value in sample.items():
+                if value is not None:
+                    sums[k] -= value
+                    counts[k] -= 1
+        self._means = {k: sums[k] / counts[k] if counts[k] else None for k in MEAN_METRICS}
+
+    def outlier_count(self):
+        return self._outliers
+
+    def median_tps(self):
+        return self._median
+
+    def means(self):
+        """剔除离群后的各指标均值；没有非离群样本时返回 None"""
+        return dict(self._means) if self._means is not None else None
+
+
+class Leaderboard:
+    """
+    按模型聚合的排行榜，随每个测试结果到达而更新。
+    不自带锁，调用方需持有所属 RunState 的锁。
+    """
+
+    def __init__(self):
+        self.models = {}
+
+    def add(self, result):
+        key = result["model_key"]
+        agg = self.models.get(key)
+        if agg is None:
+            agg = ModelAggregate(key, result["model_name"])
+            self.models[key] = agg
+        agg.add(result)
+
+    def ranking(self):
+        """实时排名，按剔除离群后的平均 tokens/s 从高到低排列"""
+        rows = []
+        for agg in self.models.values():
+            means = agg.means()
+            rows.append({
+                "model_key": agg.model_key,
+                "model_name": agg.model_name,
+                "mean_tps": means["tokens_per_second"] if means else None,
+                "median_tps": agg.median_tps(),
+                "mean_time_to_answer": means["time_to_answer"] if means else None,
+                "outlier_count": agg.outlier_count(),
+                "samples": agg.sample_count,
+            })
+        rows.sort(key=lambda r: (r["mean_tps"] is None, -(r["mean_tps"] or 0)))
+        return rows
+
+    def summary_rows(self):
+        """
+        最终汇总表的数据行，列名与原先 groupby 汇总的结果一致。
+        与原实现相同，没有任何非离群样本的模型不出现在汇总中。
+        """
+        rows = []
+        for agg in self.models.values():
+            means = agg.means()
+            if means is None:
+                continue
+            row = {"model_key": agg.model_key, "model_name": agg.model_name}
+            row.update(means)
+            row["outlier_count"] = agg.outlier_count()
+            row.update(agg.totals)
+            rows.append(row)
+        return rows
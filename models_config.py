@@ -68,3 +68,26 @@ MODELS_TO_TEST = [
     "deepseek-r1-infini",
     "deepseek-r1-ppinfra"
 ]
+
+# 按服务商限流配置（服务商默认即模型 key，可在 MODELS_CONFIG 中用 "provider" 字段合并）
+# rpm: 每分钟请求数；tpm: 每分钟 token 数；estimated_tokens: 请求发出前预扣的 token 数
+# 未配置的服务商不做限流
+RATE_LIMITS = {
+    "deepseek-reasoner": {"rpm": 30, "tpm": 200000, "estimated_tokens": 2000},
+    "deepseek-r1-sil": {"rpm": 60, "tpm": 300000, "estimated_tokens": 2000},
+}
+
+# 429 重试策略：最多重试次数、退避基数与上限（秒）
+RETRY_POLICY = {
+    "max_retries": 3,
+    "backoff_base": 1.0,
+    "backoff_max": 30.0,
+}
+
+# 熔断器配置：连续失败/超时 failure_threshold 次后熔断，
+# 之后的轮次先发送 probe_timeout 秒超时的探测请求，探测成功才发送完整请求
+CIRCUIT_BREAKER = {
+    "failure_threshold": 2,
+    "probe_timeout": 15,
+    "probe_prompt": "ping",
+}
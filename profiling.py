@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+按需开启的性能分析（cProfile）：
+- 单次运行：/start_test?profile=1 或 cli.py --profile。后台线程与各模型测试线程分别采集，
+  合并后保存为 <dir>/run_<run_id>.prof（可用 snakeviz / pstats 打开）与 .txt（耗时排行），详情页提供链接。
+- 单个页面请求：URL 加上 profile=1，结果保存到 <dir>/requests/，响应头 X-Profile 给出报告地址。
+未开启时不注册任何钩子，测试线程直接运行原函数，没有额外开销。
+"""
+
+import io
+import os
+import time
+import pstats
+import cProfile
+import threading
+import contextlib
+import functools
+
+from config import PROFILING
+from utils import logger
+
+REQUEST_PROFILE_DIR = "requests"
+
+
+class Profiler:
+    """收集多个线程的 cProfile 结果（cProfile 只能采集调用它的线程），保存时合并"""
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def section(self):
+        """采集当前线程中 with 块内的调用"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Python 3.12+ 的 cProfile 基于 sys.monitoring，同一时间只能有一个分析器启用
+            logger.warning(f"无法启用性能分析（{e}），跳过线程 {threading.current_thread().name}")
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def wrap(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.section():
+                return func(*args, **kwargs)
+        return wrapper
+
+    def save(self, name, directory=None):
+        """合并已采集的结果，写入 <name>.prof 与 <name>.txt，返回两个文件路径；没有数据时返回 None"""
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        directory = directory or PROFILING["dir"]
+        os.makedirs(directory, exist_ok=True)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        prof_path = os.path.join(directory, f"{name}.prof")
+        txt_path = os.path.join(directory, f"{name}.txt")
+        stats.dump_stats(prof_path)
+        report = io.StringIO()
+        stats.stream = report
+        stats.sort_stats(PROFILING["sort"]).print_stats(PROFILING["limit"])
+        with open(txt_path, "w", encoding="utf-8") as f:
+            f.write(f"# {len(profiles)} thread profile(s) merged\n")
+            f.write(report.getvalue())
+        return prof_path, txt_path
+
+
+def wrap(profiler, func):
+    """profiler 为 None 时原样返回 func"""
+    return func if profiler is None else profiler.wrap(func)
+
+
+def section(profiler):
+    return contextlib.nullcontext() if profiler is None else profiler.section()
+
+
+def run_profile_name(run_id):
+    return f"run_{run_id}"
+
+
+def run_profile_files(run_id):
+    """返回某次运行已保存的分析文件名列表（相对 PROFILING["dir"]）"""
+    if not run_id:
+        return []
+    name = run_profile_name(run_id)
+    return [f"{name}{ext}" for ext in (".txt", ".prof")
+            if os.path.exists(os.path.join(PROFILING["dir"], f"{name}{ext}"))]
+
+
+def init_app(app):
+    """PROFILING["enabled"] 为 True 时注册按请求分析的钩子：URL 带 profile=1 的请求会被采集"""
+    if not PROFILING.get("enabled"):
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_profile():
+        if request.args.get("profile") == "1":
+            g.request_profile_name = (f"{time.strftime('%Y%m%d_%H%M%S')}_{int(time.time() * 1000) % 1000:03d}_"
+                                      f"{request.endpoint or 'unknown'}")
+            g.request_profiler = Profiler()
+            g.request_profile_section = g.request_profiler.section()
+            g.request_profile_section.__enter__()
+
+    @app.after_request
+    def _add_profile_header(response):
+        if "request_profile_section" in g:
+            response.headers["X-Profile"] = f"/profiles/{REQUEST_PROFILE_DIR}/{g.request_profile_name}.txt"
+        return response
+
+    @app.teardown_request
+    def _save_request_profile(exc):
+        # 视图抛出异常时 after_request 不会执行，teardown_request 总会执行，保证分析器在本线程被关闭
+        section_cm = g.pop("request_profile_section", None)
+        if section_cm is None:
+            return
+        section_cm.__exit__(None, None, None)
+        name = g.pop("request_profile_name")
+        paths = g.pop("request_profiler").save(name, os.path.join(PROFILING["dir"], REQUEST_PROFILE_DIR))
+        if paths:
+            logger.info(f"请求 {request.path} 的性能分析已保存到 {paths[1]}")
+
+    logger.info(f"已启用性能分析，结果保存在 {PROFILING['dir']}")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+按服务商限流的令牌桶，以及 429 重试的退避计算
+"""
+
+import time
+import random
+import datetime
+import threading
+from email.utils import parsedate_to_datetime
+
+from models_config import MODELS_CONFIG, RATE_LIMITS, RETRY_POLICY
+
+
+class TokenBucket:
+    """
+    简单的令牌桶。
+    - rate_per_minute 为每分钟补充的令牌数，桶容量等于 rate_per_minute（允许一分钟的突发量）。
+    - 令牌可以被透支为负数（例如实际消耗的 token 超出预估），之后需要等待补回。
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = float(rate_per_minute) / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """预定 amount 个令牌，返回需要等待的秒数（调用方负责等待）"""
+        self._refill(now)
+        amount = min(float(amount), self.capacity)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def refund(self, amount, now):
+        """归还（或在 amount 为负时追加扣除）令牌"""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ProviderLimiter:
+    """单个服务商的限流器：请求数/分钟 + token 数/分钟，以及 Retry-After 封禁窗口"""
+
+    def __init__(self, provider, rpm=None, tpm=None, estimated_tokens=2000):
+        self.provider = provider
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.estimated_tokens = estimated_tokens
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        阻塞直到允许发出一个请求，返回实际等待的秒数。
+        同时按 estimated_tokens 预扣 token 桶，请求结束后通过 settle() 按实际用量修正。
+        """
+        with self.lock:
+            now = time.monotonic()
+            wait = max(self.blocked_until - now, 0.0)
+            if self.request_bucket is not None:
+                wait = max(wait, self.request_bucket.reserve(1, now))
+            if self.token_bucket is not None:
+                wait = max(wait, self.token_bucket.reserve(self.estimated_tokens, now))
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def settle(self, actual_tokens):
+        """用实际消耗的 token 数修正预扣量"""
+        if self.token_bucket is None or not isinstance(actual_tokens, int):
+            return
+        with self.lock:
+            self.token_bucket.refund(self.estimated_tokens - actual_tokens, time.monotonic())
+
+    def block_for(self, seconds):
+        """收到 429 后，在 seconds 秒内阻止该服务商的所有请求"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def provider_of(model_key):
+    """模型所属的服务商，默认为模型 key 本身，可通过配置项 provider 合并多个模型（已删除的模型视为独立服务商）"""
+    return MODELS_CONFIG.get(model_key, {}).get("provider", model_key)
+
+
+def get_limiter(model_key):
+    """获取（或按 RATE_LIMITS 创建）模型所属服务商的限流器"""
+    provider = provider_of(model_key)
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limits = RATE_LIMITS.get(provider, {})
+            limiter = ProviderLimiter(
+                provider,
+                rpm=limits.get("rpm"),
+                tpm=limits.get("tpm"),
+                estimated_tokens=limits.get("estimated_tokens", 2000)
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（秒数或 HTTP 日期），无法解析时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = datetime.datetime.now(retry_at.tzinfo)
+    return max((retry_at - now).total_seconds(), 0.0)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    计算第 attempt 次重试（从 0 开始）前的等待时间。
+    有 Retry-After 时以其为下限再加少量抖动；否则使用带抖动的指数退避。
+    """
+    base = RETRY_POLICY["backoff_base"]
+    cap = RETRY_POLICY["backoff_max"]
+    if retry_after is not None:
+        return min(retry_after, cap) + random.uniform(0, base)
+    return random.uniform(0.5, 1.0) * min(cap, base * (2 ** attempt))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+端点注册表：在 ENDPOINT_REGISTRY["path"] 指定的 YAML（需要 PyYAML）或 JSON 文件中维护待测端点，
+每个端点可设置标签(tags)、分组(group)与启用开关(enabled)。文件修改后自动重新加载，无需重启服务。
+
+注册表中的端点合并到 models_config.MODELS_CONFIG（原地更新，各模块引用的仍是同一个字典），
+启用的端点追加到 MODELS_TO_TEST；models_config.py 中的静态配置保持不变，同名端点以静态配置为准。
+从文件中删除或停用的端点只标记为停用，不从 MODELS_CONFIG 中删除，进行中的测试不受影响。
+
+文件格式（api_key 支持 ${环境变量}）：
+    endpoints:
+      deepseek-r1-ali-hz:
+        display_name: 阿里DeepSeek-R1（杭州）
+        url: https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions
+        api_key: ${DASHSCOPE_API_KEY}
+        payload_model: deepseek-r1
+        provider: deepseek-r1-ali
+        group: ali
+        tags: [cn, hangzhou]
+        enabled: true
+"""
+
+import os
+import json
+import zlib
+import threading
+
+from config import ENDPOINT_REGISTRY
+from models_config import MODELS_CONFIG, MODELS_TO_TEST
+from utils import logger
+
+# models_config.py 中的静态配置
+_static_keys = set(MODELS_CONFIG)
+_static_to_test = list(MODELS_TO_TEST)
+
+_registry_keys = set()
+_mtime = None
+_reload_lock = threading.Lock()
+
+
+def _expand_env(value):
+    return os.path.expandvars(value) if isinstance(value, str) else value
+
+
+def _read_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError("YAML 格式的端点注册表需要 PyYAML，请先执行 pip install pyyaml，或改用 .json 文件") from e
+            data = yaml.safe_load(f) or {}
+        else:
+            data = json.load(f)
+    endpoints = data.get("endpoints", {}) if isinstance(data, dict) else {}
+    if not isinstance(endpoints, dict):
+        raise ValueError("endpoints must be a mapping of endpoint key to its config")
+    return endpoints
+
+
+def _normalize(key, entry):
+    if not isinstance(entry, dict) or not entry.get("url"):
+        raise ValueError(f"endpoint {key}: url is required")
+    entry = {k: _expand_env(v) for k, v in entry.items()}
+    entry.setdefault("display_name", key)
+    entry.setdefault("api_key", "")
+    tags = entry.get("tags") or []
+    entry["tags"] = [tags] if isinstance(tags, str) else list(tags)
+    entry["enabled"] = bool(entry.get("enabled", True))
+    return entry
+
+
+def reload(force=False):
+    """
+    注册表文件有变化（或 force）时重新加载，返回是否重新加载。
+    文件不存在或未配置时不做任何事；文件内容有误时保留上一次加载的端点。
+    """
+    global _mtime
+    path = ENDPOINT_REGISTRY.get("path")
+    if not path or not os.path.exists(path):
+        return False
+    with _reload_lock:
+        mtime = os.stat(path).st_mtime_ns
+        if mtime == _mtime and not force:
+            return False
+        try:
+            entries = {key: _normalize(key, entry) for key, entry in _read_file(path).items()}
+        except Exception as e:
+            logger.error(f"端点注册表 {path} 加载失败，继续使用上一次的配置: {e}")
+            _mtime = mtime
+            return False
+        _mtime = mtime
+
+        for key in [k for k in entries if k in _static_keys]:
+            logger.warning(f"端点 {key} 与 models_config.py 中的配置重名，已忽略")
+            del entries[key]
+        for key in _registry_keys - set(entries):
+            MODELS_CONFIG[key] = dict(MODELS_CONFIG[key], enabled=False)
+        MODELS_CONFIG.update(entries)
+        _registry_keys.update(entries)
+        MODELS_TO_TEST[:] = _static_to_test + sorted(k for k in entries if entries[k]["enabled"])
+        enabled = sum(1 for e in entries.values() if e["enabled"])
+        logger.info(f"已加载端点注册表 {path}: {len(entries)} 个端点，启用 {enabled} 个")
+        return True
+
+
+def select(tags=None, groups=None):
+    """
+    返回 MODELS_TO_TEST 中满足条件的端点：带有 tags 中任一标签，且分组在 groups 中（为空表示不限）。
+    """
+    tags = set(tags or [])
+    groups = set(groups or [])
+    selected = []
+    for key in MODELS_TO_TEST:
+        config = MODELS_CONFIG.get(key, {})
+        if tags and not tags & set(config.get("tags") or []):
+            continue
+        if groups and config.get("group") not in groups:
+            continue
+        selected.append(key)
+    return selected
+
+
+def resolve_models(models=None, tags=None, groups=None):
+    """明确给出 models 时直接使用；否则按标签/分组筛选；都没有时返回 None（测试 MODELS_TO_TEST 全部端点）"""
+    if models:
+        return list(models)
+    if tags or groups:
+        reload()
+        return select(tags, groups)
+    return None
+
+
+def shard(keys, index, count):
+    """按端点 key 的稳定哈希把端点分为 count 片，返回第 index 片（从 0 开始），供多个 worker 分担"""
+    if count <= 1:
+        return list(keys)
+    return [k for k in keys if zlib.crc32(k.encode("utf-8")) % count == index]
+
+
+def snapshot():
+    """注册表与静态配置中全部端点的概况（不含 api_key）"""
+    enabled_keys = set(MODELS_TO_TEST)
+    return [{
+        "key": key,
+        "display_name": config.get("display_name"),
+        "url": config.get("url"),
+        "provider": config.get("provider", key),
+        "group": config.get("group"),
+        "tags": config.get("tags") or [],
+        "enabled": key in enabled_keys,
+        "source": "registry" if key in _registry_keys else "models_config",
+    } for key, config in MODELS_CONFIG.items()]
+
+
+def register_reload_job(scheduler):
+    """向 APScheduler 注册定时检查注册表文件的任务"""
+    if not ENDPOINT_REGISTRY.get("path"):
+        return
+    reload()
+    scheduler.add_job(
+        id="endpoint_registry_reload",
+        func=reload,
+        trigger="interval",
+        seconds=ENDPOINT_REGISTRY["reload_seconds"],
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+results.db 的数据保留：过期记录压缩归档、汇总到 probe_rollups、删除原始数据并增量回收空间。
+作为 APScheduler 后台任务运行；每条记录的汇总与删除是一次独立的短事务，
+经由 db_utils 的写线程与测试结果的写入交替执行，不会阻塞进行中的测试。
+
+也可以手动执行：
+    python retention.py                 # 立即执行一次
+    python retention.py --convert       # 旧数据库一次性切换到增量回收模式（执行完整 VACUUM，期间会锁库）
+"""
+
+import os
+import gzip
+import json
+import time
+import itertools
+import sqlite3
+import datetime
+import threading
+
+import db_utils
+from config import RETENTION
+from utils import logger
+
+# 同一时间只允许一个保留任务运行
+_retention_lock = threading.Lock()
+
+
+def archive_path(record):
+    """归档文件路径：<archive_dir>/<年-月>/record_<id>.jsonl.gz，按记录的开始时间分目录"""
+    month = (record.get("test_start_time") or "unknown")[:7]
+    return os.path.join(RETENTION["archive_dir"], month, f"record_{record['id']}.jsonl.gz")
+
+
+def _write_archive(path, rows):
+    """把 (类型, dict) 序列写入 gzip 压缩的 JSON Lines 文件；先写临时文件再改名，完整落盘后才返回"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for kind, row in rows:
+            f.write(json.dumps({"type": kind, **row}, ensure_ascii=False) + "\n")
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive_record(record_id):
+    """把一条测试记录及其请求明细归档，返回文件路径；记录不存在时返回 None"""
+    rows = db_utils.iter_record_rows(record_id)
+    first = next(rows, None)
+    if first is None:
+        return None
+    return _write_archive(archive_path(first[1]), itertools.chain([first], rows))
+
+
+def archive_remote_probes(probe_ids):
+    """把 worker 上报的请求明细（没有所属测试记录）归档到 <年-月>/remote_<首个id>_<末个id>.jsonl.gz"""
+    rows = [("probe", row) for row in db_utils.iter_probe_rows(probe_ids)]
+    if not rows:
+        return None
+    month = (rows[0][1].get("input_timestamp") or "unknown")[:7]
+    path = os.path.join(RETENTION["archive_dir"], month, f"remote_{probe_ids[0]}_{probe_ids[-1]}.jsonl.gz")
+    return _write_archive(path, rows)
+
+
+def run_retention():
+    """执行一次保留策略，返回处理统计；已有保留任务在运行时直接返回 None"""
+    if not _retention_lock.acquire(blocking=False):
+        logger.info("保留任务仍在运行，跳过本次")
+        return None
+    try:
+        start = time.time()
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=RETENTION["raw_days"])).isoformat()
+        stats = {"archived_records": 0, "deleted_probes": 0, "free_pages": None}
+        for record_id in db_utils.load_records_before(cutoff, RETENTION["max_records_per_run"]):
+            path = archive_record(record_id)
+            stats["deleted_probes"] += db_utils.purge_record(record_id)
+            stats["archived_records"] += 1
+            logger.debug(f"记录 {record_id} 已归档到 {path}")
+
+        # worker 上报的结果不属于任何测试记录，按请求时间单独归档
+        probe_ids = db_utils.load_remote_probe_ids_before(cutoff, RETENTION["max_remote_probes_per_run"])
+        if probe_ids:
+            path = archive_remote_probes(probe_ids)
+            stats["deleted_probes"] += db_utils.purge_probes(probe_ids)
+            logger.debug(f"{len(probe_ids)} 条 worker 上报结果已归档到 {path}")
+
+        # 分步回收空闲页，每步之间让出写线程
+        while True:
+            free_pages = db_utils.incremental_vacuum(RETENTION["vacuum_pages_per_step"])
+            stats["free_pages"] = free_pages
+            if not free_pages:
+                break
+        if stats["archived_records"] or free_pages is None:
+            logger.info(f"保留任务完成: 归档 {stats['archived_records']} 条记录，删除 {stats['deleted_probes']} 条请求明细，"
+                        f"耗时 {time.time() - start:.1f} 秒"
+                        + ("；数据库未启用增量回收，可运行 python retention.py --convert 切换" if free_pages is None else ""))
+        return stats
+    except Exception as e:
+        logger.exception(f"保留任务异常: {e}")
+        return None
+    finally:
+        _retention_lock.release()
+
+
+def convert_to_incremental_vacuum():
+    """旧数据库切换到 auto_vacuum=INCREMENTAL，需要执行一次完整 VACUUM（期间会锁库，请在空闲时运行）"""
+    db_utils.init_db()
+    with sqlite3.connect(db_utils.DB_PATH) as conn:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def register_retention_job(scheduler):
+    """向 APScheduler 注册后台保留任务"""
+    if not RETENTION.get("enabled", True):
+        return
+    scheduler.add_job(
+        id="retention",
+        func=run_retention,
+        trigger="interval",
+        hours=RETENTION["interval_hours"],
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+    logger.info(f"已注册保留任务: 原始数据保留 {RETENTION['raw_days']} 天，每 {RETENTION['interval_hours']} 小时执行")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--convert" in sys.argv[1:]:
+        print("已切换到增量回收模式" if convert_to_incremental_vacuum() else "切换失败")
+    else:
+        print(run_retention())
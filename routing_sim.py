@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+路由与对冲模拟：用 probe_results 中实测的各服务商延迟与出错分布，模拟大量请求在不同路由策略下的表现，
+给出每种策略的 p50 / p90 / p99 延迟（只统计成功的请求）、错误率以及对冲带来的额外请求比例。
+抽样用 NumPy 向量化完成，百万级请求只需几秒。
+
+历史按 window_hours 划分为时间窗口，请求平均分配到有数据的窗口，每个窗口从该窗口内的实测样本中抽样
+（样本不足 min_window_samples 时用整个时间范围的样本），以保留服务商表现随时间的变化：
+- single:<目标>：全部请求发往同一个服务商
+- weighted:...：按固定权重分配（默认各服务商均分，可用 --weights 指定）
+- least_latency：每个窗口发往上一个窗口中位延迟最低的服务商（第一个窗口没有历史，按均分处理）
+- hedge@<X>ms：按 least_latency 选出主、备两个服务商，主请求 X 毫秒内没有成功返回（或提前出错）时
+  向备用服务商再发一个请求，取先成功返回的结果
+
+用法：
+    python routing_sim.py --days 30 --tags r1
+    python routing_sim.py --models a,b,c --weights a=0.6,b=0.4 --hedge 500,1000 --requests 2000000
+    python routing_sim.py --metric time_taken --by-model --json
+"""
+
+import sys
+import json
+import time
+import argparse
+import datetime
+
+import numpy as np
+
+import db_utils
+import registry
+from config import SIMULATION, COLLECTOR
+from rate_limiter import provider_of
+
+
+class Distribution:
+    """一个服务商在某段时间内的实测延迟（毫秒）：成功请求的延迟与失败请求出错前的耗时"""
+
+    __slots__ = ("ok", "err")
+
+    def __init__(self, ok, err):
+        self.ok = np.asarray(ok, dtype=float)
+        self.err = np.asarray(err, dtype=float)
+
+    @property
+    def count(self):
+        return len(self.ok) + len(self.err)
+
+    @property
+    def error_rate(self):
+        return len(self.err) / self.count if self.count else 1.0
+
+    def p50(self):
+        return float(np.median(self.ok)) if len(self.ok) else float("inf")
+
+    def sample(self, rng, n):
+        """抽样 n 个请求，返回 (延迟数组, 是否成功数组)"""
+        ok = rng.random(n) >= self.error_rate
+        latency = np.empty(n)
+        n_ok = int(ok.sum())
+        if n_ok:
+            latency[ok] = rng.choice(self.ok, n_ok)
+        if n - n_ok:
+            # 失败请求没有记录耗时（旧数据）时视为立即失败
+            latency[~ok] = rng.choice(self.err, n - n_ok) if len(self.err) else 0.0
+        return latency, ok
+
+
+class History:
+    """按时间窗口划分的各服务商实测分布"""
+
+    def __init__(self, targets, pooled, windows):
+        self.targets = targets
+        self.pooled = pooled
+        # 每个窗口为与 targets 对齐的 Distribution 列表，窗口内没有样本的服务商为 None
+        self.windows = windows
+
+    def ranking(self, index):
+        """按上一个窗口的中位延迟从低到高排列的服务商下标；没有上一个窗口时返回 None"""
+        if index == 0:
+            return None
+        previous = self.windows[index - 1]
+        usable = [i for i, d in enumerate(previous)
+                  if d is not None and len(d.ok) and d.error_rate <= SIMULATION["max_error_rate"]]
+        return sorted(usable, key=lambda i: previous[i].p50()) or None
+
+
+def load_history(metric, start=None, end=None, model_keys=None, vantage=None, by_model=False, window_hours=None):
+    """读取实测样本，按服务商（by_model 时按端点）和时间窗口分组，返回 History；没有数据时返回 None"""
+    if metric not in db_utils.SERIES_METRICS:
+        raise ValueError(f"unsupported metric: {metric}")
+    window_ms = (window_hours or SIMULATION["window_hours"]) * 3600 * 1000
+    samples = {}
+    first = None
+    for model_key, at, ok, value, time_taken in db_utils.iter_latency_samples(
+            metric, start, end, model_keys, vantage or COLLECTOR["local_vantage"]):
+        latency = value if ok else time_taken
+        if ok and latency is None:
+            continue
+        if first is None:
+            first = at
+        target = model_key if by_model else provider_of(model_key)
+        window = int((at - first) // window_ms)
+        ok_list, err_list = samples.setdefault(target, {}).setdefault(window, ([], []))
+        if ok:
+            ok_list.append(latency * 1000)
+        elif latency is not None:
+            err_list.append(latency * 1000)
+        else:
+            err_list.append(None)
+    if not samples:
+        return None
+
+    targets = sorted(samples)
+    pooled = []
+    for target in targets:
+        ok = [v for ok_list, _ in samples[target].values() for v in ok_list]
+        err = [v for _, err_list in samples[target].values() for v in err_list]
+        pooled.append(_distribution(ok, err))
+    windows = []
+    for window in sorted({w for by_window in samples.values() for w in by_window}):
+        dists = []
+        for i, target in enumerate(targets):
+            ok, err = samples[target].get(window, ([], []))
+            if not ok and not err:
+                dists.append(None)
+            elif len(ok) + len(err) < SIMULATION["min_window_samples"]:
+                dists.append(pooled[i])
+            else:
+                dists.append(_distribution(ok, err))
+        windows.append(dists)
+    return History(targets, pooled, windows)
+
+
+def _distribution(ok, err):
+    """出错请求缺少耗时的，出错率照常计入，抽样时按立即失败处理"""
+    known = [v for v in err if v is not None]
+    missing = len(err) - len(known)
+    dist = Distribution(ok, known)
+    if missing:
+        dist.err = np.concatenate([dist.err, np.zeros(missing)])
+    return dist
+
+
+def _sample_targets(rng, dists, choice):
+    """choice 为每个请求的服务商下标，分别从对应分布中抽样"""
+    latency = np.empty(len(choice))
+    ok = np.empty(len(choice), dtype=bool)
+    for target in np.unique(choice):
+        mask = choice == target
+        latency[mask], ok[mask] = dists[target].sample(rng, int(mask.sum()))
+    return latency, ok
+
+
+class WeightedPolicy:
+    """按固定权重把请求分配给各服务商；窗口内没有数据的服务商不参与，其余按权重重新归一"""
+
+    def __init__(self, name, weights):
+        self.name = name
+        self.weights = np.asarray(weights, dtype=float)
+
+    def run(self, history, index, n, rng):
+        dists = history.windows[index]
+        weights = np.array([w if d is not None else 0.0 for w, d in zip(self.weights, dists)])
+        if weights.sum() <= 0:
+            return None
+        choice = rng.choice(len(weights), n, p=weights / weights.sum())
+        latency, ok = _sample_targets(rng, dists, choice)
+        return latency, ok, 0
+
+
+class LeastLatencyPolicy:
+    """每个窗口把全部请求发往上一个窗口中位延迟最低、且在本窗口有数据的服务商"""
+
+    name = "least_latency"
+
+    def choose(self, history, index, count):
+        dists = history.windows[index]
+        ranking = [i for i in (history.ranking(index) or []) if dists[i] is not None]
+        return ranking[:count]
+
+    def run(self, history, index, n, rng):
+        chosen = self.choose(history, index, 1)
+        if not chosen:
+            return _equal_split(history).run(history, index, n, rng)
+        latency, ok = history.windows[index][chosen[0]].sample(rng, n)
+        return latency, ok, 0
+
+
+class HedgedPolicy(LeastLatencyPolicy):
+    """
+    主请求发往 least_latency 选出的服务商，delay_ms 内没有成功返回（或提前出错）时向第二名再发一个请求，
+    取先成功返回的一个；两个都失败时请求失败，耗时为较晚的失败时间。
+    """
+
+    def __init__(self, delay_ms):
+        self.delay = float(delay_ms)
+        self.name = f"hedge@{delay_ms:g}ms"
+
+    def run(self, history, index, n, rng):
+        chosen = self.choose(history, index, 2)
+        if len(chosen) < 2:
+            return super().run(history, index, n, rng)
+        primary, backup = (history.windows[index][i] for i in chosen)
+        la, oka = primary.sample(rng, n)
+        lb, okb = backup.sample(rng, n)
+        fire = ~oka | (la > self.delay)
+        hedge_at = np.where(oka, self.delay, np.minimum(self.delay, la))
+        lb_done = hedge_at + lb
+        b_wins = fire & okb
+        ok = oka | b_wins
+        latency = np.where(
+            oka & b_wins, np.minimum(la, lb_done),
+            np.where(oka, la, np.where(b_wins, lb_done, np.maximum(la, lb_done)))
+        )
+        return latency, ok, int(fire.sum())
+
+
+def _equal_split(history):
+    return WeightedPolicy("weighted:equal", [1.0] * len(history.targets))
+
+
+def default_policies(history, weights=None, hedge_delays=None):
+    """每个服务商单独一个策略、固定权重（未指定时均分）、least_latency 以及各个对冲延迟"""
+    policies = []
+    for i, target in enumerate(history.targets):
+        one_hot = [0.0] * len(history.targets)
+        one_hot[i] = 1.0
+        policies.append(WeightedPolicy(f"single:{target}", one_hot))
+    if weights:
+        unknown = set(weights) - set(history.targets)
+        if unknown:
+            raise ValueError(f"weights refer to targets without data: {', '.join(sorted(unknown))}")
+        label = ",".join(f"{t}={w:g}" for t, w in weights.items())
+        policies.append(WeightedPolicy(f"weighted:{label}", [weights.get(t, 0.0) for t in history.targets]))
+    else:
+        policies.append(_equal_split(history))
+    policies.append(LeastLatencyPolicy())
+    for delay in hedge_delays if hedge_delays is not None else SIMULATION["hedge_delays_ms"]:
+        policies.append(HedgedPolicy(delay))
+    return policies
+
+
+def simulate(history, policy, requests, rng):
+    """把 requests 个请求平均分配到各时间窗口，返回该策略的统计结果"""
+    per_window = np.full(len(history.windows), requests // len(history.windows))
+    per_window[:requests % len(history.windows)] += 1
+    latencies, oks, extra = [], [], 0
+    for index, n in enumerate(per_window):
+        if not n:
+            continue
+        outcome = policy.run(history, index, int(n), rng)
+        if outcome is None:
+            continue
+        latency, ok, window_extra = outcome
+        latencies.append(latency)
+        oks.append(ok)
+        extra += window_extra
+    if not latencies:
+        return {"policy": policy.name, "requests": 0}
+    latency = np.concatenate(latencies)
+    ok = np.concatenate(oks)
+    succeeded = latency[ok]
+    p50, p90, p99 = np.percentile(succeeded, [50, 90, 99]) if len(succeeded) else (float("nan"),) * 3
+    return {
+        "policy": policy.name,
+        "requests": int(len(ok)),
+        "p50_ms": round(float(p50), 1),
+        "p90_ms": round(float(p90), 1),
+        "p99_ms": round(float(p99), 1),
+        "mean_ms": round(float(succeeded.mean()), 1) if len(succeeded) else float("nan"),
+        "error_rate": round(1 - float(ok.mean()), 5),
+        "extra_requests": round(extra / len(ok), 4),
+    }
+
+
+def run(metric=None, start=None, end=None, model_keys=None, vantage=None, by_model=False, window_hours=None,
+        requests=None, weights=None, hedge_delays=None, seed=None):
+    """读取历史并评估全部策略，返回 {"targets": 各服务商实测概况, "policies": 各策略结果}；没有数据时返回 None"""
+    metric = metric or SIMULATION["metric"]
+    history = load_history(metric, start, end, model_keys, vantage, by_model, window_hours)
+    if history is None:
+        return None
+    rng = np.random.default_rng(SIMULATION["seed"] if seed is None else seed)
+    requests = requests or SIMULATION["requests"]
+    targets = [{
+        "target": target,
+        "samples": dist.count,
+        "error_rate": round(dist.error_rate, 5),
+        "p50_ms": round(float(np.percentile(dist.ok, 50)), 1) if len(dist.ok) else None,
+        "p99_ms": round(float(np.percentile(dist.ok, 99)), 1) if len(dist.ok) else None,
+    } for target, dist in zip(history.targets, history.pooled)]
+    results = []
+    for policy in default_policies(history, weights, hedge_delays):
+        began = time.perf_counter()
+        result = simulate(history, policy, requests, rng)
+        result["took_ms"] = round((time.perf_counter() - began) * 1000, 1)
+        results.append(result)
+    return {"metric": metric, "windows": len(history.windows), "targets": targets, "policies": results}
+
+
+def _parse_weights(text):
+    weights = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        target, _, value = item.partition("=")
+        weights[target] = float(value)
+    return weights
+
+
+def _split_list(text):
+    return [item.strip() for item in text.split(",") if item.strip()] if text else []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用历史延迟与出错分布模拟路由与对冲策略")
+    parser.add_argument("--days", type=float, default=30, help="使用最近几天的数据（未指定 --start 时）")
+    parser.add_argument("--start", help="开始时间（ISO 格式，含）")
+    parser.add_argument("--end", help="结束时间（ISO 格式，不含）")
+    parser.add_argument("--models", help="逗号分隔的模型 key")
+    parser.add_argument("--tags", help="逗号分隔的端点标签（见端点注册表）")
+    parser.add_argument("--groups", help="逗号分隔的端点分组")
+    parser.add_argument("--metric", default=SIMULATION["metric"], choices=sorted(db_utils.SERIES_METRICS),
+                        help="作为延迟的指标")
+    parser.add_argument("--by-model", action="store_true", help="按端点而不是按服务商模拟")
+    parser.add_argument("--vantage", help="使用哪个探测点的数据，默认为本地")
+    parser.add_argument("--window-hours", type=float, default=SIMULATION["window_hours"], help="时间窗口长度")
+    parser.add_argument("--requests", type=int, default=SIMULATION["requests"], help="每个策略模拟的请求数")
+    parser.add_argument("--weights", help="固定权重，例如 a=0.7,b=0.3")
+    parser.add_argument("--hedge", help="逗号分隔的对冲延迟（毫秒）")
+    parser.add_argument("--seed", type=int, default=SIMULATION["seed"])
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args(argv)
+
+    start = args.start or (datetime.datetime.now() - datetime.timedelta(days=args.days)).isoformat()
+    model_keys = registry.resolve_models(_split_list(args.models), _split_list(args.tags), _split_list(args.groups))
+    try:
+        report = run(
+            metric=args.metric, start=start, end=args.end, model_keys=model_keys, vantage=args.vantage,
+            by_model=args.by_model, window_hours=args.window_hours, requests=args.requests,
+            weights=_parse_weights(args.weights) if args.weights else None,
+            hedge_delays=[float(d) for d in _split_list(args.hedge)] if args.hedge else None,
+            seed=args.seed,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if report is None:
+        print("所选范围内没有请求明细", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"指标: {report['metric']}，时间窗口: {report['windows']} 个")
+    print(f"\n{'target':<32}{'samples':>8}{'errors':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for t in report["targets"]:
+        print(f"{t['target']:<32}{t['samples']:>8}{t['error_rate']:>10.2%}"
+              f"{t['p50_ms'] if t['p50_ms'] is not None else '-':>10}{t['p99_ms'] if t['p99_ms'] is not None else '-':>10}")
+    print(f"\n{'policy':<40}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'errors':>10}{'extra':>10}")
+    for p in report["policies"]:
+        if not p["requests"]:
+            print(f"{p['policy']:<40}{'no data':>10}")
+            continue
+        print(f"{p['policy']:<40}{p['p50_ms']:>10}{p['p90_ms']:>10}{p['p99_ms']:>10}"
+              f"{p['error_rate']:>10.2%}{p['extra_requests']:>10.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
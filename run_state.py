@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+按测试运行(run)隔离的进度状态，以及按 run id 查找的注册表
+"""
+
+import uuid
+import datetime
+import threading
+
+from leaderboard import Leaderboard
+from run_trace import RunTrace
+from utils import logger
+
+# 注册表中最多保留的已结束运行数量，超出后丢弃最早的
+MAX_FINISHED_RUNS_KEPT = 50
+
+# 仍在进行中的状态
+ACTIVE_STATUSES = ("pending", "warmup", "running", "saving")
+
+# 执行模式：sequential 逐轮执行，每轮等待所有模型完成；
+# interleaved 每个模型完成上一轮并冷却后立即开始下一轮
+RUN_MODES = ("sequential", "interleaved")
+
+
+class RunState:
+    """
+    单次测试运行的进度状态。
+    每个运行有自己的锁，多个运行并发时不会争用同一把锁。
+    """
+
+    def __init__(self, label="", total_rounds=3, run_id=None, mode="sequential", cooldown=0):
+        if mode not in RUN_MODES:
+            raise ValueError(f"unknown run mode: {mode}")
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.label = label
+        self.mode = mode
+        self.cooldown = cooldown
+        self.model_rounds = {}
+        self.status = "pending"
+        self.current_round = 0
+        self.total_rounds = total_rounds
+        self.finished_models = []
+        self.unfinished_models = []
+        self.created_at = datetime.datetime.now().isoformat()
+        self.finished_at = None
+        self.leaderboard = Leaderboard()
+        self.trace = RunTrace()
+        self.profiler = None  # 开启性能分析时为 profiling.Profiler
+        self.result_listeners = []
+        self.lock = threading.Lock()
+
+    def start_round(self, round_number, display_names):
+        with self.lock:
+            self.status = "running"
+            self.current_round = round_number
+            self.finished_models = []
+            self.unfinished_models = list(display_names)
+
+    def start_warmup(self, display_names):
+        """预热阶段：轮次记为 0，预热结果不计入统计"""
+        with self.lock:
+            self.status = "warmup"
+            self.current_round = 0
+            self.finished_models = []
+            self.unfinished_models = list(display_names)
+
+    def start_interleaved(self, display_names):
+        """交错模式：所有模型同时开始，各自记录已完成的轮数"""
+        with self.lock:
+            self.status = "running"
+            self.current_round = 1
+            self.model_rounds = {name: 0 for name in display_names}
+            self.finished_models = []
+            self.unfinished_models = list(display_names)
+
+    def mark_model_finished(self, display_name):
+        """
+        将模型从未完成列表移到已完成列表（调用方需持有 self.lock）。
+        交错模式下每完成一轮调用一次，模型完成全部轮次后才算已完成；
+        current_round 取最慢模型正在进行的轮次。
+        """
+        if self.mode == "interleaved" and self.status != "warmup":
+            done = self.model_rounds.get(display_name, 0) + 1
+            self.model_rounds[display_name] = done
+            self.current_round = min(min(self.model_rounds.values()) + 1, self.total_rounds)
+            if done < self.total_rounds:
+                return
+        if display_name in self.unfinished_models:
+            self.unfinished_models.remove(display_name)
+        if display_name not in self.finished_models:
+            self.finished_models.append(display_name)
+
+    def add_result_listener(self, listener):
+        """注册结果回调，每条测试结果（包括预热）记录后在测试线程中调用 listener(result)"""
+        self.result_listeners.append(listener)
+
+    def notify_result(self, result):
+        for listener in self.result_listeners:
+            try:
+                listener(result)
+            except Exception:
+                logger.exception(f"运行 {self.run_id} 的结果回调异常")
+
+    def set_status(self, status):
+        with self.lock:
+            self.status = status
+            if status not in ACTIVE_STATUSES:
+                self.finished_at = datetime.datetime.now().isoformat()
+                self.unfinished_models = []
+                self.finished_models = []
+
+    def is_active(self):
+        with self.lock:
+            return self.status in ACTIVE_STATUSES
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "run_id": self.run_id,
+                "label": self.label,
+                "mode": self.mode,
+                "status": self.status,
+                "current_round": self.current_round,
+                "total_rounds": self.total_rounds,
+                "finished_models": list(self.finished_models),
+                "unfinished_models": list(self.unfinished_models),
+                "model_rounds": dict(self.model_rounds),
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "leaderboard": self.leaderboard.ranking(),
+            }
+
+
+# run_id -> RunState；注册表锁只保护字典本身的增删查，不参与进度更新
+_runs = {}
+_runs_lock = threading.Lock()
+
+
+def register_run(state):
+    with _runs_lock:
+        _runs[state.run_id] = state
+        finished = [s for s in _runs.values() if s.status not in ACTIVE_STATUSES]
+        for old in finished[:max(len(finished) - MAX_FINISHED_RUNS_KEPT, 0)]:
+            del _runs[old.run_id]
+    return state
+
+
+def get_run(run_id):
+    with _runs_lock:
+        return _runs.get(run_id)
+
+
+def list_runs(active_only=False):
+    """按创建顺序返回运行列表"""
+    with _runs_lock:
+        runs = list(_runs.values())
+    if active_only:
+        runs = [s for s in runs if s.is_active()]
+    return runs
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+单次运行内每个请求的时间线：线程启动、限流等待、发出请求、收到响应头、首字节、首个 token、
+流结束、记录结果（等待 state.lock）等时间点，均为相对运行开始的秒数（time.perf_counter）。
+用于查看 0.5 秒错峰、锁争用、限流或线程调度对请求的影响；可转换为 Chrome trace JSON，
+在 chrome://tracing 或 Perfetto 中打开。
+"""
+
+import time
+import threading
+import datetime
+
+# 请求各阶段：(阶段名, 起点, 终点)，缺少任一时间点的阶段不显示
+PHASES = [
+    ("throttle", "start", "request_sent"),
+    ("wait_headers", "request_sent", "headers"),
+    ("wait_first_byte", "headers", "first_byte"),
+    ("wait_first_token", "first_byte", "first_token"),
+    ("streaming", "first_token", "stream_end"),
+    ("record_lock", "record_wait", "recorded"),
+]
+
+# 时间线视图中各阶段的颜色
+PHASE_COLORS = {
+    "throttle": "#f0ad4e",
+    "wait_headers": "#5bc0de",
+    "wait_first_byte": "#337ab7",
+    "wait_first_token": "#9b59b6",
+    "streaming": "#5cb85c",
+    "record_lock": "#d9534f",
+}
+
+
+class RequestSpan:
+    """单个请求的时间点记录，由执行该请求的测试线程写入"""
+
+    def __init__(self, trace, model_key, model_name, round_number, warmup):
+        self._trace = trace
+        self.model_key = model_key
+        self.model_name = model_name
+        self.round = round_number
+        self.warmup = warmup
+        self.thread = threading.current_thread().name
+        self.status = None
+        self.marks = {}
+
+    def mark(self, name, only_first=False):
+        """记录时间点；only_first 为 True 时只保留第一次（如首字节），否则以最后一次为准（如 429 重试后的请求）"""
+        if only_first and name in self.marks:
+            return
+        self.marks[name] = self._trace.offset()
+
+    def finish(self, status):
+        self.status = status
+        self.mark("end", only_first=True)
+
+    def to_dict(self):
+        return {
+            "model_key": self.model_key,
+            "model_name": self.model_name,
+            "round": self.round,
+            "warmup": self.warmup,
+            "thread": self.thread,
+            "status": self.status,
+            "marks": {k: round(v, 6) for k, v in self.marks.items()},
+        }
+
+
+class RunTrace:
+    """一次运行的请求时间线"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.started_at = datetime.datetime.now().isoformat()
+        self.spans = []
+        self.events = []
+        self.lock = threading.Lock()
+
+    def offset(self):
+        return time.perf_counter() - self.origin
+
+    def begin(self, model_key, model_name, round_number, warmup=False):
+        span = RequestSpan(self, model_key, model_name, round_number, warmup)
+        span.mark("start")
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    def instant(self, name, **args):
+        """记录一个瞬时事件（例如调度线程启动某个模型的测试线程）"""
+        event = {"name": name, "at": round(self.offset(), 6),
+                 "thread": threading.current_thread().name, "args": args}
+        with self.lock:
+            self.events.append(event)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "spans": [span.to_dict() for span in self.spans],
+                "events": list(self.events),
+            }
+
+
+def span_phases(span):
+    """返回一个请求（to_dict 的结果）的各阶段 [(阶段名, 开始秒数, 结束秒数)]"""
+    marks = span["marks"]
+    return [(name, marks[a], marks[b]) for name, a, b in PHASES
+            if a in marks and b in marks and marks[b] >= marks[a]]
+
+
+def to_chrome_trace(trace):
+    """
+    把 RunTrace.to_dict() 的结果转换为 Chrome trace 事件格式（时间单位为微秒）。
+    每个测试线程一行，请求整体与各阶段为嵌套的 X 事件，线程启动等为 i 事件。
+    """
+    tids = {}
+
+    def tid(thread):
+        return tids.setdefault(thread, len(tids) + 1)
+
+    events = []
+    for span in sorted(trace["spans"], key=lambda s: s["marks"].get("start", 0)):
+        marks = span["marks"]
+        start = marks.get("start", 0)
+        end = marks.get("end", max(marks.values(), default=start))
+        label = f"{span['model_name']} R{span['round']}" + (" warmup" if span["warmup"] else "")
+        events.append({
+            "name": label, "cat": "request", "ph": "X", "pid": 1, "tid": tid(span["thread"]),
+            "ts": start * 1e6, "dur": (end - start) * 1e6,
+            "args": {"model_key": span["model_key"], "status": span["status"], "marks": marks},
+        })
+        for name, phase_start, phase_end in span_phases(span):
+            events.append({
+                "name": name, "cat": "phase", "ph": "X", "pid": 1, "tid": tid(span["thread"]),
+                "ts": phase_start * 1e6, "dur": (phase_end - phase_start) * 1e6,
+            })
+    for event in trace["events"]:
+        events.append({
+            "name": event["name"], "cat": "scheduler", "ph": "i", "s": "t", "pid": 1,
+            "tid": tid(event["thread"]), "ts": event["at"] * 1e6, "args": event["args"],
+        })
+    for thread, thread_id in tids.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": thread_id, "args": {"name": thread}})
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "otherData": {"started_at": trace["started_at"]}}
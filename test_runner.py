@@ -13,12 +13,22 @@ import json
 import datetime
 import threading
 
-import requests
-import pandas as pd
-
-from db_utils import save_test_result
-from utils import logger, detect_outliers_iqr, make_styled_table_html, export_tables_to_image
-from models_config import MODELS_CONFIG, MODELS_TO_TEST
+import adapters
+import changepoint
+import cassette  # 请求经由 cassette.post 发出，支持录制/回放
+from db_utils import save_test_result, save_probe_result, attach_probe_results
+from utils import logger, make_styled_table_html, export_tables_to_image
+from config import WARMUP_REQUESTS, COLLECTOR, PROBE_CONCURRENCY
+from models_config import MODELS_CONFIG, MODELS_TO_TEST, RETRY_POLICY, CIRCUIT_BREAKER
+from rate_limiter import get_limiter, parse_retry_after, backoff_delay
+from health import get_breaker, STATE_OPEN, STATE_HALF_OPEN
+from run_state import RunState, register_run
+from leaderboard import MEAN_METRICS, TOTAL_METRICS
+import profiling
+import registry
+
+# 结果写入数据库后，内存中只保留不超过该长度的响应文本（如错误信息），更长的回答改为按需从数据库加载
+INLINE_RESPONSE_MAX_CHARS = 500
 
 # 全局提示词，可以通过接口更新
 custom_prompt = f'请用当前时间 {datetime.datetime.now().isoformat()} ，写一首打油诗。'
@@ -28,56 +38,170 @@ def set_custom_prompt(prompt: str):
     custom_prompt = prompt
 
 
-# 全局进度记录
-test_progress = {
-    "status": "idle",
-    "current_round": 0,
-    "total_rounds": 3,
-    "finished_models": [],
-    "unfinished_models": [],
-    "lock": threading.Lock()
-}
+def _parse_stream_line(line):
+    """解析一行 SSE 数据，返回 JSON 字典；非数据行或结束标记返回 None"""
+    if not line:
+        return None
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    line = line.strip()
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if not data or data == "[DONE]":
+        return None
+    return json.loads(data)
+
+def _split_reasoning_metrics(usage, reasoning_chunks, content_chunks, start_time,
+                             first_token_time, first_reasoning_time, first_content_time, end_time):
+    """
+    拆分推理(reasoning)与回答(content)两部分的 token 数和耗时。
+    - reasoning_tokens 优先取 usage.completion_tokens_details.reasoning_tokens；
+      服务商未提供时，按流式分片数量的比例估算。
+    - time_to_answer 为从发出请求到收到第一个回答 token 的时间，即用户感知的等待时间。
+    """
+    completion_tokens = usage.get("completion_tokens", 0) or 0
+    details = usage.get("completion_tokens_details") or {}
+    reasoning_tokens = details.get("reasoning_tokens")
+    if not isinstance(reasoning_tokens, int):
+        total_chunks = reasoning_chunks + content_chunks
+        if total_chunks > 0:
+            reasoning_tokens = round(completion_tokens * reasoning_chunks / total_chunks)
+        else:
+            reasoning_tokens = 0
+    content_tokens = max(completion_tokens - reasoning_tokens, 0)
+
+    time_to_first_token = first_token_time - start_time if first_token_time else None
+    time_to_answer = first_content_time - start_time if first_content_time else None
+    if first_reasoning_time and first_content_time:
+        reasoning_time = first_content_time - first_reasoning_time
+    elif first_reasoning_time:
+        reasoning_time = end_time - first_reasoning_time
+    else:
+        reasoning_time = 0.0
+    content_time = end_time - first_content_time if first_content_time else None
+
+    content_tokens_per_second = None
+    if content_time and content_time > 0 and content_tokens > 0:
+        content_tokens_per_second = content_tokens / content_time
+
+    return {
+        "reasoning_tokens": reasoning_tokens,
+        "content_tokens": content_tokens,
+        "time_to_first_token": time_to_first_token,
+        "time_to_answer": time_to_answer,
+        "reasoning_time": reasoning_time,
+        "content_time": content_time,
+        "content_tokens_per_second": content_tokens_per_second,
+    }
+
+def _estimate_usage(usage, reasoning_chunks, content_chunks):
+    """
+    服务商没有返回 usage（未支持 stream_options.include_usage）时，按流式分片数估算 completion_tokens
+    （通常每个分片对应一个 token），并在 usage 中标记 estimated，与按比例估算 reasoning_tokens 的做法一致。
+    """
+    if isinstance(usage.get("completion_tokens"), int):
+        return usage
+    usage = dict(usage, completion_tokens=reasoning_chunks + content_chunks, estimated=True)
+    if usage.get("total_tokens") is None:
+        usage["total_tokens"] = (usage.get("prompt_tokens") or 0) + usage["completion_tokens"]
+    return usage
+
+# 推理/回答拆分指标，出错或超时时统一填 "Error"
+SPLIT_METRIC_KEYS = [
+    "reasoning_tokens",
+    "content_tokens",
+    "time_to_first_token",
+    "time_to_answer",
+    "reasoning_time",
+    "content_time",
+    "content_tokens_per_second",
+]
+
+def _mark_model_finished(state, model_key, display_name, unfinished):
+    """将模型标记为本轮已完成（调用方需持有 state.lock）"""
+    if unfinished is not None and model_key in unfinished:
+        unfinished.remove(model_key)
+    state.mark_model_finished(display_name)
+
+def _record_result(state, results, result, unfinished, warmup=False, span=None):
+    """
+    记录一条测试结果：追加到本轮结果、更新实时排行榜，并标记模型已完成。
+    预热结果带 is_warmup 标记，不计入排行榜。span 为该请求的时间线，记录等待 state.lock 的时间。
+    """
+    result["is_warmup"] = warmup
+    if span is not None:
+        span.mark("record_wait")
+    with state.lock:
+        if span is not None:
+            span.mark("recorded")
+            tokens = result.get("completion_tokens")
+            span.finish("ok" if isinstance(tokens, int) else str(tokens))
+        results.append(result)
+        if not warmup:
+            state.leaderboard.add(result)
+        _mark_model_finished(state, result["model_key"], result["model_name"], unfinished)
+    state.notify_result(result)
+
+def store_results_listener(state, vantage=None):
+    """
+    返回结果回调：每条结果到达时立即写入 probe_results，并把 probe_id 记入结果；
+    随后内存中只保留数值列与短文本，较长的 raw_response 置为 None，页面通过 /probe/<id> 按需加载。
+    运行占用的内存因此不随响应长度和请求数量增长。需在其他需要完整结果的回调之后注册。
+    """
+    def listener(result):
+        result["probe_id"] = save_probe_result(state.run_id, result, vantage)
+        raw = result.get("raw_response")
+        if isinstance(raw, str) and len(raw) > INLINE_RESPONSE_MAX_CHARS:
+            result["raw_response"] = None
+    return listener
+
+def _half_open_probe(model_key, config):
+    """熔断状态下发送的短超时探测请求，返回 (是否成功, 耗时, 错误信息)"""
+    _adapter, probe = adapters.prepare(model_key, config, CIRCUIT_BREAKER["probe_prompt"], probe=True)
+    start = time.time()
+    try:
+        response = cassette.post(probe.url, data=probe.body, headers=probe.headers, proxies={},
+                                 timeout=CIRCUIT_BREAKER["probe_timeout"])
+        response.raise_for_status()
+        return True, time.time() - start, None
+    except Exception as e:
+        return False, time.time() - start, f"{type(e).__name__}: {str(e)}"
 
-def test_model(model_key, results, round_number, timeout=300, unfinished=None):
-    """对单个模型执行测试"""
+def test_model(model_key, results, round_number, timeout=300, unfinished=None, state=None, warmup=False):
+    """
+    对单个模型执行测试。
+    使用流式请求，以便分别统计推理(reasoning_content)和回答(content)两个阶段；
+    流式分片会被重新拼装为与非流式一致的响应 JSON，保存在 raw_response 中。
+    state 为所属运行的 RunState，为空时使用一个临时状态；warmup 为 True 时结果不计入统计。
+    """
+    if state is None:
+        state = RunState()
     config = MODELS_CONFIG[model_key]
     display_name = config["display_name"]
-    url = config["url"]
-    api_key = config["api_key"]
-    model_for_payload = config.get("payload_model", model_key)
 
     logger.info(f"[Round {round_number}] Start testing: {model_key} ({display_name})")
-
+    span = state.trace.begin(model_key, display_name, round_number, warmup)
+
+    # 请求体按 (模型, 提示词) 缓存为字节，不再每次构造和编码
+    adapter, prepared = adapters.prepare(model_key, config, custom_prompt)
+    # 在开始计时之前导入 requests，进程中的第一个请求不承担导入耗时
+    cassette.load()
+
+    limiter = get_limiter(model_key)
+    breaker = get_breaker(model_key)
+    circuit_state = breaker.current_state()
+    retries = 0
+    throttle_time = 0.0
     input_timestamp_str = datetime.datetime.now().isoformat()
     start_time = time.time()
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "model": model_for_payload,
-        "messages": [
-            {
-                "role": "user",
-                "content": custom_prompt
-            }
-        ],
-        "stream": False,
-        "response_format": {"type": "text"}
-    }
+    timed_out = threading.Event()
 
     def timeout_handler():
+        timed_out.set()
+        breaker.record_failure()
         logger.info(f"[Round {round_number}] {display_name} timed out.")
-        with test_progress["lock"]:
-            if unfinished is not None and model_key in unfinished:
-                unfinished.remove(model_key)
-                if display_name in test_progress["unfinished_models"]:
-                    test_progress["unfinished_models"].remove(display_name)
-                if display_name not in test_progress["finished_models"]:
-                    test_progress["finished_models"].append(display_name)
-        results.append({
+        result = {
             "test_round": round_number,
             "model_key": model_key,
             "model_name": display_name,
@@ -86,29 +210,160 @@ def test_model(model_key, results, round_number, timeout=300, unfinished=None):
             "tokens_per_second": "Error",
             "raw_response": "Request Timed Out",
             "input_timestamp": input_timestamp_str,
-            "output_timestamp": datetime.datetime.now().isoformat()
-        })
+            "output_timestamp": datetime.datetime.now().isoformat(),
+            "retries": retries,
+            "throttle_time": throttle_time,
+            "circuit_state": circuit_state
+        }
+        result.update({k: "Error" for k in SPLIT_METRIC_KEYS})
+        _record_result(state, results, result, unfinished, warmup, span)
         logger.info(f"[Round {round_number}] Finished: {model_key} ({display_name}) - Timed Out")
 
+    # 熔断状态下先发送短超时探测，探测失败则跳过完整请求，避免白白等待完整的超时时间
+    if circuit_state == STATE_OPEN:
+        throttle_time += limiter.acquire()
+        input_timestamp_str = datetime.datetime.now().isoformat()
+        span.mark("request_sent")
+        probe_ok, probe_time, probe_error = _half_open_probe(model_key, config)
+        span.mark("headers")
+        if not probe_ok:
+            breaker.record_failure()
+            logger.info(f"[Round {round_number}] {display_name} circuit open, probe failed: {probe_error}")
+            result = {
+                "test_round": round_number,
+                "model_key": model_key,
+                "model_name": display_name,
+                "completion_tokens": "Circuit Open",
+                "time_taken": probe_time,
+                "tokens_per_second": "Error",
+                "raw_response": f"Circuit open, half-open probe failed: {probe_error}",
+                "input_timestamp": input_timestamp_str,
+                "output_timestamp": datetime.datetime.now().isoformat(),
+                "retries": retries,
+                "throttle_time": throttle_time,
+                "circuit_state": circuit_state
+            }
+            result.update({k: "Error" for k in SPLIT_METRIC_KEYS})
+            _record_result(state, results, result, unfinished, warmup, span)
+            return
+        breaker.record_probe_success()
+        circuit_state = STATE_HALF_OPEN
+        logger.info(f"[Round {round_number}] {display_name} probe OK, circuit half-open")
+
     timeout_timer = threading.Timer(timeout, timeout_handler)
-    timeout_timer.start()
 
     completion_tokens = None
     tokens_per_second = None
     raw_response_text = None
     output_timestamp_str = None
+    split_metrics = None
 
     try:
-        response = requests.post(url, json=payload, headers=headers, proxies={}, timeout=timeout)
+        # 限流等待与 429 重试等待计入 throttle_time，不计入测量的耗时
+        while True:
+            throttle_time += limiter.acquire()
+            input_timestamp_str = datetime.datetime.now().isoformat()
+            start_time = time.time()
+            timeout_timer = threading.Timer(timeout, timeout_handler)
+            timeout_timer.start()
+            span.mark("request_sent")
+            response = cassette.post(prepared.url, data=prepared.body, headers=prepared.headers, proxies={},
+                                     timeout=timeout, stream=True)
+            span.mark("headers")
+            if response.status_code != 429 or retries >= RETRY_POLICY["max_retries"]:
+                break
+            timeout_timer.cancel()
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            response.close()
+            delay = backoff_delay(retries, retry_after)
+            limiter.block_for(delay)
+            retries += 1
+            logger.info(f"[Round {round_number}] {display_name} got 429, retry {retries} after {delay:.2f}s")
         response.raise_for_status()
-        response_json = response.json()
-        completion_tokens = response_json.get('usage', {}).get('completion_tokens', 0)
-        raw_response_text = response.text
+
+        content_parts = []
+        reasoning_parts = []
+        reasoning_chunks = 0
+        content_chunks = 0
+        first_token_time = None
+        first_reasoning_time = None
+        first_content_time = None
+        usage = {}
+        finish_reason = None
+        response_id = None
+        response_model = None
+
+        for line in response.iter_lines():
+            span.mark("first_byte", only_first=True)
+            if timed_out.is_set():
+                break
+            chunk = adapter.parse_chunk(_parse_stream_line(line))
+            if chunk is None:
+                continue
+            now = time.time()
+            response_id = chunk.get("id", response_id)
+            response_model = chunk.get("model", response_model)
+            if chunk.get("usage"):
+                usage = adapter.normalize_usage(chunk["usage"])
+            for choice in chunk.get("choices") or []:
+                delta = choice.get("delta") or {}
+                reasoning_piece = delta.get("reasoning_content")
+                content_piece = delta.get("content")
+                if reasoning_piece:
+                    reasoning_parts.append(reasoning_piece)
+                    reasoning_chunks += 1
+                    if first_reasoning_time is None:
+                        first_reasoning_time = now
+                if content_piece:
+                    content_parts.append(content_piece)
+                    content_chunks += 1
+                    if first_content_time is None:
+                        first_content_time = now
+                if (reasoning_piece or content_piece) and first_token_time is None:
+                    first_token_time = now
+                    span.mark("first_token")
+                if choice.get("finish_reason"):
+                    finish_reason = choice["finish_reason"]
+        span.mark("stream_end")
+        response.close()
+
+        if timed_out.is_set():
+            timeout_timer.cancel()
+            return
+
+        usage = _estimate_usage(usage, reasoning_chunks, content_chunks)
+        if usage.get("estimated"):
+            logger.info(f"[Round {round_number}] {display_name} returned no usage, "
+                        f"completion_tokens estimated from {usage['completion_tokens']} stream chunks")
+        completion_tokens = usage['completion_tokens']
+        limiter.settle(usage.get('total_tokens'))
+        raw_response_text = json.dumps({
+            "id": response_id,
+            "model": response_model,
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": "".join(content_parts),
+                    "reasoning_content": "".join(reasoning_parts)
+                },
+                "finish_reason": finish_reason
+            }],
+            "usage": usage
+        }, ensure_ascii=False)
         output_timestamp_str = datetime.datetime.now().isoformat()
+        split_metrics = _split_reasoning_metrics(
+            usage, reasoning_chunks, content_chunks, start_time,
+            first_token_time, first_reasoning_time, first_content_time, time.time()
+        )
 
-        logger.info(f"[Round {round_number}] {display_name} response OK, completion_tokens={completion_tokens}")
+        logger.info(f"[Round {round_number}] {display_name} response OK, completion_tokens={completion_tokens}, "
+                    f"reasoning_tokens={split_metrics['reasoning_tokens']}")
+        breaker.record_success()
     except Exception as e:
         logger.exception(f"[Round {round_number}] {display_name} request error: {e}")
+        if not timed_out.is_set():
+            breaker.record_failure()
         completion_tokens = None
         raw_response_text = f"{type(e).__name__}: {str(e)}"
         output_timestamp_str = datetime.datetime.now().isoformat()
@@ -116,7 +371,8 @@ def test_model(model_key, results, round_number, timeout=300, unfinished=None):
     end_time = time.time()
     time_taken_val = end_time - start_time
 
-    if isinstance(completion_tokens, int) and time_taken_val > 0 and completion_tokens > 0:
+    # 请求成功时始终给出 tokens/s（空回答为 0），只有出错或超时才记为 Error
+    if isinstance(completion_tokens, int) and time_taken_val > 0:
         tokens_per_second = completion_tokens / time_taken_val
 
     result = {
@@ -128,77 +384,181 @@ def test_model(model_key, results, round_number, timeout=300, unfinished=None):
         "tokens_per_second": tokens_per_second if tokens_per_second is not None else "Error",
         "raw_response": raw_response_text,
         "input_timestamp": input_timestamp_str,
-        "output_timestamp": output_timestamp_str
+        "output_timestamp": output_timestamp_str,
+        "retries": retries,
+        "throttle_time": throttle_time,
+        "circuit_state": circuit_state
     }
-
-    with test_progress["lock"]:
-        results.append(result)
-        if unfinished is not None and model_key in unfinished:
-            unfinished.remove(model_key)
-        if display_name in test_progress["unfinished_models"]:
-            test_progress["unfinished_models"].remove(display_name)
-        if display_name not in test_progress["finished_models"]:
-            test_progress["finished_models"].append(display_name)
+    for k in SPLIT_METRIC_KEYS:
+        value = split_metrics.get(k) if split_metrics else None
+        result[k] = value if value is not None else "Error"
 
     timeout_timer.cancel()
+    if timed_out.is_set():
+        # 超时回调已经记录了该模型，避免重复记录
+        return
 
-def run_single_test(model_keys, round_number, timeout=300):
-    """执行单轮测试"""
-    logger.info(f"======== Start Round {round_number} ========")
-    threads = []
-    results = []
+    _record_result(state, results, result, unfinished, warmup, span)
 
-    with test_progress["lock"]:
-        test_progress["current_round"] = round_number
-        test_progress["finished_models"] = []
-        test_progress["unfinished_models"] = [MODELS_CONFIG[k]["display_name"] for k in model_keys]
-        test_progress["status"] = "running"
+def _run_staggered(jobs, state):
+    """
+    启动并等待一组测试线程。jobs 为 (线程名, 目标函数, 参数, spawn 事件参数) 列表。
+    同时运行的线程不超过 max_in_flight 个，端点较多时分批执行，前面的请求结束后才启动后面的，
+    线程数与内存不随端点数量增长。首批线程在 stagger_window_seconds 内均匀错开启动
+    （间隔不超过 stagger_seconds），之后的线程由请求结束的时间自然错开，不再额外等待。
+    """
+    max_in_flight = PROBE_CONCURRENCY["max_in_flight"]
+    slots = threading.BoundedSemaphore(max_in_flight)
+    first_batch = min(max_in_flight, len(jobs))
+    interval = min(PROBE_CONCURRENCY["stagger_seconds"],
+                   PROBE_CONCURRENCY["stagger_window_seconds"] / max(first_batch, 1))
+
+    def run(target, args):
+        try:
+            target(*args)
+        finally:
+            slots.release()
 
-    unfinished = set(model_keys)
-    for key in model_keys:
-        thread = threading.Thread(target=test_model, args=(key, results, round_number, timeout, unfinished))
+    threads = []
+    for i, (name, target, args, event) in enumerate(jobs):
+        if 0 < i < first_batch and interval > 0:
+            time.sleep(interval)  # 避免首批请求同时发出
+        slots.acquire()
+        thread = threading.Thread(target=run, args=(profiling.wrap(state.profiler, target), args), name=name)
         threads.append(thread)
+        state.trace.instant("spawn", **event)
         thread.start()
-        logger.info(f"[Round {round_number}] Started {key}. Unfinished models: {', '.join(unfinished)}")
-        time.sleep(0.5)  # 避免所有请求同时发出
+        logger.debug(f"Started {name} ({i + 1}/{len(jobs)})")
 
     for thread in threads:
         thread.join()
 
+def run_single_test(model_keys, round_number, timeout=300, state=None):
+    """执行单轮测试"""
+    if state is None:
+        state = RunState()
+    logger.info(f"======== Start Round {round_number} ========")
+    results = []
+
+    state.start_round(round_number, [MODELS_CONFIG[k]["display_name"] for k in model_keys])
+
+    unfinished = set(model_keys)
+    _run_staggered([
+        (f"R{round_number}-{key}", test_model, (key, results, round_number, timeout, unfinished, state),
+         {"model_key": key, "round": round_number})
+        for key in model_keys
+    ], state)
+
     logger.info(f"======== End Round {round_number} ========")
     return results
 
-def run_all_tests_and_generate_html(timeout=300):
+def run_warmup(model_keys, timeout=300, state=None):
+    """
+    正式测试前的预热：每个模型依次发送 warmup_requests 个请求（默认 WARMUP_REQUESTS），
+    用于建立连接、预热缓存，避免冷启动开销被计入第一轮。不同模型之间并行执行。
+    返回预热结果列表（轮次记为 0，带 is_warmup 标记）。
+    """
+    if state is None:
+        state = RunState()
+    counts = {k: MODELS_CONFIG[k].get("warmup_requests", WARMUP_REQUESTS) for k in model_keys}
+    warmup_keys = [k for k in model_keys if counts[k] > 0]
+    results = []
+    if not warmup_keys:
+        return results
+
+    logger.info(f"======== Start Warm-up ========")
+    state.start_warmup([MODELS_CONFIG[k]["display_name"] for k in warmup_keys])
+
+    def warm_model(key):
+        for _ in range(counts[key]):
+            test_model(key, results, 0, timeout, None, state, warmup=True)
+
+    _run_staggered([(f"warmup-{key}", warm_model, (key,), {"model_key": key, "round": 0}) for key in warmup_keys],
+                   state)
+
+    logger.info(f"======== End Warm-up ========")
+    return results
+
+def run_interleaved_tests(model_keys, total_rounds, timeout=300, state=None):
     """
-    依次执行三轮测试，并生成每轮的 HTML 表格，以及最终汇总表格的 HTML。
+    交错执行多轮测试：每个模型在自己的线程中依次完成各轮，
+    上一轮结束并冷却 state.cooldown 秒后立即开始下一轮，不等待其他模型。
+    总耗时取决于最慢模型自身的各轮耗时之和，而不是每一轮中最慢的模型。
+    返回按轮次分组的结果列表，与逐轮执行的结果结构一致。
+    """
+    if state is None:
+        state = RunState(mode="interleaved")
+    logger.info(f"======== Start Interleaved Rounds 1-{total_rounds} ========")
+    round_results = [[] for _ in range(total_rounds)]
+    state.start_interleaved([MODELS_CONFIG[k]["display_name"] for k in model_keys])
+
+    def run_model_rounds(key):
+        for round_num in range(1, total_rounds + 1):
+            test_model(key, round_results[round_num - 1], round_num, timeout, None, state)
+            if round_num < total_rounds and state.cooldown > 0:
+                time.sleep(state.cooldown)
+
+    _run_staggered([(f"interleaved-{key}", run_model_rounds, (key,), {"model_key": key, "round": 1})
+                    for key in model_keys], state)
+
+    logger.info(f"======== End Interleaved Rounds 1-{total_rounds} ========")
+    return round_results
+
+def run_all_tests(timeout=300, model_keys=None, state=None):
+    """
+    先执行预热请求，再执行全部轮次的测试，不依赖 pandas（命令行无界面运行时使用）。
+    返回 (预热结果列表, 按轮次分组的结果列表)，汇总数据可从 state.leaderboard 获得。
+    model_keys 为空时测试 MODELS_TO_TEST 中的全部模型（开始前先检查端点注册表是否有更新）。
+    state.mode 为 interleaved 时各模型交错执行各轮，否则逐轮依次执行。
+    """
+    registry.reload()
+    # 复制一份，运行中注册表重新加载不会改变本次测试的端点
+    model_keys = list(model_keys) if model_keys else list(MODELS_TO_TEST)
+    if state is None:
+        state = RunState()
+    total_rounds = state.total_rounds
+
+    warmup_results = run_warmup(model_keys, timeout, state)
+    if state.mode == "interleaved":
+        all_round_results = run_interleaved_tests(model_keys, total_rounds, timeout, state)
+    else:
+        all_round_results = [run_single_test(model_keys, round_num, timeout, state)
+                             for round_num in range(1, total_rounds + 1)]
+    return warmup_results, all_round_results
+
+def run_all_tests_and_generate_html(timeout=300, model_keys=None, state=None):
+    """
+    执行预热与三轮测试（见 run_all_tests），并生成每轮的 HTML 表格，以及最终汇总表格的 HTML。
     同时返回每一轮的 DataFrame，方便后续导出时再次生成不含Response/Reasoning的表。
+    预热结果单独返回（DataFrame 与 HTML），不参与汇总；没有预热时为 None。
     """
-    all_results = []
-    total_rounds = 3
+    import pandas as pd
+
+    if state is None:
+        state = RunState()
     round_html_list = []
     df_rounds = []
 
-    for round_num in range(1, total_rounds + 1):
-        round_results = run_single_test(MODELS_TO_TEST, round_num, timeout)
-        import pandas as pd
+    warmup_results, all_round_results = run_all_tests(timeout, model_keys, state)
+
+    df_warmup = None
+    warmup_html = None
+    if warmup_results:
+        df_warmup = pd.DataFrame(warmup_results)
+        warmup_html = make_styled_table_html(df_warmup, highlight_tps=False, is_summary=False, hide_response_cols=False)
+
+    for round_results in all_round_results:
         df_round = pd.DataFrame(round_results)
         df_rounds.append(df_round)
         round_html = make_styled_table_html(df_round, highlight_tps=True, is_summary=False, hide_response_cols=False)
         round_html_list.append(round_html)
-        all_results.extend(round_results)
-
-    df_all = pd.DataFrame(all_results)
-    df_all['completion_tokens'] = pd.to_numeric(df_all['completion_tokens'], errors='coerce')
-    df_all['time_taken'] = pd.to_numeric(df_all['time_taken'], errors='coerce')
-    df_all['tokens_per_second'] = pd.to_numeric(df_all['tokens_per_second'], errors='coerce')
-
-    df_all = detect_outliers_iqr(df_all, 'model_key', 'tokens_per_second')
-    outlier_count_series = df_all.groupby('model_key')['is_outlier'].sum()
 
-    df_filtered = df_all[~df_all['is_outlier']]
-    agg_dict = {'completion_tokens': 'mean', 'time_taken': 'mean', 'tokens_per_second': 'mean'}
-    df_summary = df_filtered.groupby(['model_key', 'model_name'], as_index=False).agg(agg_dict)
-    df_summary['outlier_count'] = df_summary['model_key'].map(outlier_count_series)
+    # 汇总直接取自测试过程中增量维护的排行榜，不再重新构建 DataFrame 和检测离群值
+    with state.lock:
+        summary_rows = state.leaderboard.summary_rows()
+    df_summary = pd.DataFrame(summary_rows, columns=['model_key', 'model_name'] + MEAN_METRICS +
+                              ['outlier_count'] + TOTAL_METRICS)
+    df_summary['circuit_state'] = df_summary['model_key'].map(lambda k: get_breaker(k).current_state())
 
     df_summary_renamed = df_summary.rename(columns={
         'model_key': 'Model Key',
@@ -206,70 +566,96 @@ def run_all_tests_and_generate_html(timeout=300):
         'completion_tokens': 'Avg Completion Tokens',
         'time_taken': 'Avg Time Taken (s)',
         'tokens_per_second': 'Avg Tokens/s (Token/s)',
-        'outlier_count': 'Outlier Count'
+        'time_to_answer': 'Avg Time to Answer (s)',
+        'time_to_first_token': 'Avg TTFT (s)',
+        'reasoning_tokens': 'Avg Reasoning Tokens',
+        'content_tokens': 'Avg Content Tokens',
+        'reasoning_time': 'Avg Reasoning Time (s)',
+        'content_time': 'Avg Content Time (s)',
+        'content_tokens_per_second': 'Avg Content Tokens/s',
+        'outlier_count': 'Outlier Count',
+        'retries': 'Total 429 Retries',
+        'throttle_time': 'Total Throttle Wait (s)',
+        'circuit_state': 'Circuit State'
     })
     df_summary_renamed = df_summary_renamed.sort_values(by='Avg Tokens/s (Token/s)', ascending=False)
 
     # 生成最终汇总表（web展示时保留所有列）
     summary_html = make_styled_table_html(df_summary_renamed, highlight_tps=False, is_summary=True, hide_response_cols=False)
 
-    return df_rounds, df_summary_renamed, round_html_list, summary_html
+    return df_rounds, df_summary_renamed, round_html_list, summary_html, df_warmup, warmup_html
 
-def background_test_runner(timeout=300):
+def background_test_runner(timeout=300, model_keys=None, state=None):
     """
     后台线程执行完整的三轮测试并保存结果到数据库。
     测试结束后自动导出4张表到一张图片 (不包含Response JSON等列)。
+    state 为本次运行的 RunState（为空时新建并注册），可通过 /test_progress/<run_id> 查询。
     """
-    global test_progress
     from utils import logger
     import datetime
 
+    if state is None:
+        state = register_run(RunState())
+
     try:
-        logger.info("=== 后台测试线程：开始执行测试 ===")
-        with test_progress["lock"]:
-            test_progress["status"] = "running"
+        logger.info(f"=== 后台测试线程 [{state.run_id}]：开始执行测试 ===")
+        state.set_status("running")
         start_ts = datetime.datetime.now().isoformat()
+        state.add_result_listener(store_results_listener(state, COLLECTOR["local_vantage"]))
 
-        df_rounds, df_summary, round_html_list, summary_html = run_all_tests_and_generate_html(timeout=timeout)
+        with profiling.section(state.profiler):
+            df_rounds, df_summary, round_html_list, summary_html, df_warmup, warmup_html = run_all_tests_and_generate_html(
+                timeout=timeout, model_keys=model_keys, state=state
+            )
+        if state.profiler is not None:
+            # 在保存记录之前写入分析结果，详情页（长期缓存）第一次渲染时就能带上链接
+            paths = state.profiler.save(profiling.run_profile_name(state.run_id))
+            logger.info(f"=== 后台测试线程 [{state.run_id}]：性能分析已保存到 {paths} ===")
 
         end_ts = datetime.datetime.now().isoformat()
-        logger.info("=== 后台测试线程：测试完成，开始保存数据库 ===")
-
-        with test_progress["lock"]:
-            test_progress["status"] = "finished"
-            test_progress["unfinished_models"] = []
-            test_progress["finished_models"] = []
-            test_progress["current_round"] = test_progress["total_rounds"]
+        logger.info(f"=== 后台测试线程 [{state.run_id}]：测试完成，开始保存数据库 ===")
+        state.set_status("saving")
 
         # 保存到数据库（web展示用）
-        save_test_result(
+        record_id = save_test_result(
             start_ts,
             end_ts,
             round_html_list[0],
             round_html_list[1],
             round_html_list[2],
-            summary_html
+            summary_html,
+            warmup_html=warmup_html,
+            run_id=state.run_id,
+            trace_json=json.dumps(state.trace.to_dict(), ensure_ascii=False)
         )
 
+        # 请求明细已在测试过程中逐条保存，这里关联到测试记录
+        attach_probe_results(record_id, state.run_id)
+
+        # 用本次各模型的平均值更新突变检测；检测失败不影响已保存的记录
+        try:
+            with state.lock:
+                summary_rows = state.leaderboard.summary_rows()
+            changepoint.record_run(summary_rows, state.run_id, record_id)
+        except Exception as e:
+            logger.exception(f"后台测试线程 [{state.run_id}]：突变检测失败: {e}")
+
         # 导出不包含Response/Content/Reasoning的图片
         export_tables_to_image(df_rounds, df_summary)
 
-        logger.info("=== 后台测试线程：数据库保存完毕，并已导出图片 ===")
+        state.set_status("finished")
+        logger.info(f"=== 后台测试线程 [{state.run_id}]：数据库保存完毕，并已导出图片 ===")
     except Exception as e:
-        logger.exception(f"后台测试线程异常: {e}")
-    finally:
-        with test_progress["lock"]:
-            test_progress["status"] = "idle"
-            test_progress["current_round"] = 0
-            test_progress["unfinished_models"] = []
-            test_progress["finished_models"] = []
+        state.set_status("failed")
+        logger.exception(f"后台测试线程 [{state.run_id}] 异常: {e}")
 
 def scheduled_job():
     """
-    定时任务（例如每小时执行一次）。
-    需在 APScheduler 中配置: @scheduler.task('interval', id='hourly_job', hours=1)
+    定时任务入口，执行 DEFAULT_SCHEDULE_GROUP 分组的测试。
+    周期任务由 job_scheduler.register_scheduled_jobs 按 SCHEDULE_GROUPS 注册，
+    通过 job_scheduler 触发可以避免与正在进行的测试重叠。
     """
-    logger.info("=== APScheduler: Starting scheduled test job (hourly). ===")
-    import threading
-    thread = threading.Thread(target=background_test_runner, args=(300,))
-    thread.start()
+    logger.info("=== APScheduler: Starting scheduled test job. ===")
+    from config import DEFAULT_SCHEDULE_GROUP
+    from job_scheduler import trigger_group
+    trigger_group(DEFAULT_SCHEDULE_GROUP)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+测试公共配置：把项目根目录加入 sys.path，并为每个测试提供独立的临时数据库。
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """把 db_utils.DB_PATH 指向临时文件并建表（使用独立的空闲读连接池），返回数据库路径"""
+    import db_utils
+
+    path = str(tmp_path / "results.db")
+    monkeypatch.setattr(db_utils, "DB_PATH", path)
+    monkeypatch.setattr(db_utils, "_idle_reads", [])
+    db_utils.init_db()
+    return path
+
+
+@pytest.fixture
+def client(temp_db):
+    """使用临时数据库的 Flask 测试客户端"""
+    from app import app
+
+    return app.test_client()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+Web 服务接口的测试：/collect 的口令校验与 /vantage 页面的转义。
+"""
+
+import datetime
+
+from config import COLLECTOR
+
+
+def _payload(vantage="sh", model_key="m1"):
+    return {"vantage": vantage, "run_id": "r1", "results": [{
+        "test_round": 1,
+        "model_key": model_key,
+        "model_name": model_key,
+        "completion_tokens": 8,
+        "tokens_per_second": 40.0,
+        "input_timestamp": datetime.datetime.now().isoformat(),
+    }]}
+
+
+def test_collect_refuses_pushes_without_configured_token(client, monkeypatch):
+    monkeypatch.setitem(COLLECTOR, "token", None)
+    assert client.post("/collect", json=_payload()).status_code == 403
+
+    monkeypatch.setitem(COLLECTOR, "allow_unauthenticated", True)
+    assert client.post("/collect", json=_payload()).get_json()["stored"] == 1
+
+
+def test_collect_checks_token(client, monkeypatch):
+    monkeypatch.setitem(COLLECTOR, "token", "secret")
+    assert client.post("/collect", json=_payload(), headers={"X-Collector-Token": "wrong"}).status_code == 403
+    assert client.post("/collect", json=_payload(), headers={"X-Collector-Token": "secret"}).status_code == 200
+
+
+def test_vantage_page_escapes_pushed_values(client, monkeypatch):
+    monkeypatch.setitem(COLLECTOR, "token", "secret")
+    payload = _payload(vantage="<script>alert(1)</script>", model_key="<img src=x onerror=alert(2)>")
+    client.post("/collect", json=payload, headers={"X-Collector-Token": "secret"})
+
+    page = client.get("/vantage").get_data(as_text=True)
+    assert "<script>alert(1)" not in page and "<img src=x" not in page
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in page
+    assert "&lt;img src=x onerror=alert(2)&gt;" in page
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+数据库读连接复用的测试。
+"""
+
+import threading
+
+import db_utils
+
+
+def _count_opens(monkeypatch):
+    opened = []
+    open_connection = db_utils._open_connection
+
+    def counting_open():
+        conn = open_connection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(db_utils, "_open_connection", counting_open)
+    return opened
+
+
+def _in_new_thread(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+
+def test_released_connections_are_reused_by_new_threads(temp_db, monkeypatch):
+    opened = _count_opens(monkeypatch)
+
+    def request():
+        db_utils.load_records_version()
+        db_utils.release_read_connection()
+
+    for _ in range(20):
+        _in_new_thread(request)
+    assert len(opened) == 1
+
+
+def test_idle_pool_is_bounded(temp_db, monkeypatch):
+    opened = _count_opens(monkeypatch)
+    barrier = threading.Barrier(db_utils.READ_POOL_SIZE + 4)
+
+    def request():
+        db_utils.load_records_version()
+        barrier.wait()
+        db_utils.release_read_connection()
+
+    threads = [threading.Thread(target=request) for _ in range(barrier.parties)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(opened) == barrier.parties
+    assert len(db_utils._idle_reads) == db_utils.READ_POOL_SIZE
+
+
+def _probes(tps, vantage=None, day="2025-01-01"):
+    return [{"test_round": i + 1, "model_key": "m1", "model_name": "M1", "tokens_per_second": value,
+             "completion_tokens": 8, "vantage": vantage, "input_timestamp": f"{day}T12:00:0{i}"}
+            for i, value in enumerate(tps)]
+
+
+def test_rollups_keep_remote_probes_apart_from_local(temp_db):
+    import sqlite3
+    import timeseries
+
+    db_utils.save_probe_results(1, "local-run", _probes([10.0, 20.0]))
+    db_utils.save_probe_results(None, "remote-run", _probes([100.0], vantage="sh"))
+    with sqlite3.connect(temp_db) as conn:
+        ids = [row[0] for row in conn.execute("SELECT id FROM probe_results")]
+    assert db_utils.purge_probes(ids) == 3
+
+    rollups = {row["vantage"]: row for row in db_utils.load_probe_rollups()}
+    assert rollups["local"]["requests"] == 2 and rollups["local"]["avg_tokens_per_second"] == 15.0
+    assert rollups["sh"]["requests"] == 1 and rollups["sh"]["avg_tokens_per_second"] == 100.0
+
+    series = timeseries.load_series(start="2025-01-01T00:00:00", end="2025-01-02T00:00:00")["series"]
+    assert [point[1] for point in series[0]["points"]] == [15.0]
+    series = timeseries.load_series(start="2025-01-01T00:00:00", end="2025-01-02T00:00:00", vantage="sh")["series"]
+    assert [point[1] for point in series[0]["points"]] == [100.0]
+
+
+def test_legacy_rollups_are_migrated_to_local_vantage(temp_db):
+    import sqlite3
+
+    with sqlite3.connect(temp_db) as conn:
+        conn.execute("DROP TABLE probe_rollups")
+        conn.execute("""
+        CREATE TABLE probe_rollups (day TEXT NOT NULL, model_key TEXT NOT NULL, model_name TEXT,
+            requests INTEGER NOT NULL DEFAULT 0, ok_count INTEGER NOT NULL DEFAULT 0,
+            tps_sum REAL NOT NULL DEFAULT 0, PRIMARY KEY (day, model_key))
+        """)
+        conn.execute("INSERT INTO probe_rollups (day, model_key, requests, ok_count, tps_sum) "
+                     "VALUES ('2025-01-01', 'm1', 2, 2, 30.0)")
+    db_utils.init_db()
+
+    rows = db_utils.load_probe_rollups()
+    assert [(row["vantage"], row["requests"], row["avg_tokens_per_second"]) for row in rows] == [("local", 2, 15.0)]
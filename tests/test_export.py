@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+请求明细导出的测试。
+"""
+
+import os
+import datetime
+
+import pytest
+
+import db_utils
+import export
+
+
+def test_parquet_export_with_more_than_1024_partitions(temp_db, tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.dataset as ds
+
+    day0 = datetime.date(2025, 1, 1)
+    results = [{
+        "test_round": 1,
+        "model_key": f"provider-{p:02d}",
+        "model_name": f"Provider {p}",
+        "completion_tokens": 8,
+        "tokens_per_second": 40.0,
+        "input_timestamp": f"{day0 + datetime.timedelta(days=d)}T12:00:00",
+    } for p in range(40) for d in range(40)]
+    db_utils.save_probe_results(1, "run", results)
+
+    out_dir = str(tmp_path / "parquet")
+    assert export.export_parquet(out_dir) == 1600
+
+    dates = [name for name in os.listdir(out_dir) if name.startswith("date=")]
+    assert len(dates) == 40
+    assert all(len(os.listdir(os.path.join(out_dir, d))) == 40 for d in dates)
+    assert ds.dataset(out_dir, format="parquet", partitioning="hive").count_rows() == 1600
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+定时分组调度的测试。
+"""
+
+import time
+
+import job_scheduler
+from config import DEFAULT_SCHEDULE_GROUP
+
+
+def _wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_group_runs_again_after_resolve_models_raises(monkeypatch):
+    calls = []
+
+    def failing_resolve(*args):
+        calls.append("fail")
+        raise ValueError("broken registry")
+
+    def empty_resolve(*args):
+        calls.append("ok")
+        return []
+
+    monkeypatch.setattr(job_scheduler.registry, "resolve_models", failing_resolve)
+    state = job_scheduler._group_states[DEFAULT_SCHEDULE_GROUP]
+    job_scheduler.trigger_group(DEFAULT_SCHEDULE_GROUP)
+    assert _wait_until(lambda: calls == ["fail"] and not state.active)
+    assert not state.pending
+
+    monkeypatch.setattr(job_scheduler.registry, "resolve_models", empty_resolve)
+    job_scheduler.trigger_group(DEFAULT_SCHEDULE_GROUP)
+    assert _wait_until(lambda: calls == ["fail", "ok"] and not state.active)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+增量排行榜的测试：结果需与 detect_outliers_iqr 加 groupby 均值的汇总一致。
+"""
+
+import random
+
+import pytest
+
+import leaderboard
+from leaderboard import Leaderboard, MEAN_METRICS
+
+
+def _results(seed, count):
+    rng = random.Random(seed)
+    results = []
+    for i in range(count):
+        result = {"model_key": f"m{i % 3}", "model_name": f"M{i % 3}"}
+        for k in MEAN_METRICS:
+            result[k] = rng.lognormvariate(3, 0.4)
+        if i % 11 == 0:
+            result["tokens_per_second"] = rng.choice([0.5, 900.0])
+        if i % 17 == 0:
+            result["tokens_per_second"] = "Error"
+        if i % 13 == 0:
+            result["content_tokens_per_second"] = None
+        results.append(result)
+    return results
+
+
+def test_summary_matches_pandas_after_each_result():
+    pd = pytest.importorskip("pandas")
+    from utils import detect_outliers_iqr
+
+    results = _results(1, 120)
+    board = Leaderboard()
+    for n, result in enumerate(results, 1):
+        board.add(result)
+        if n % 10:
+            continue
+        df = detect_outliers_iqr(pd.DataFrame(results[:n]))
+        kept = df[~df["is_outlier"]]
+        expected = kept.groupby("model_key")[MEAN_METRICS].agg(lambda s: pd.to_numeric(s, errors="coerce").mean())
+        outliers = df.groupby("model_key")["is_outlier"].sum()
+        rows = {row["model_key"]: row for row in board.summary_rows()}
+        assert set(rows) == set(expected.index)
+        for model_key, row in rows.items():
+            assert row["outlier_count"] == outliers[model_key]
+            for k in MEAN_METRICS:
+                assert row[k] == pytest.approx(expected.loc[model_key, k], rel=1e-12)
+
+
+def test_ranking_counts_samples_and_orders_by_mean_tps():
+    board = Leaderboard()
+    for result in _results(2, 60):
+        board.add(result)
+    ranking = board.ranking()
+    assert sum(row["samples"] for row in ranking) == 60
+    assert [row["mean_tps"] for row in ranking] == sorted((row["mean_tps"] for row in ranking), reverse=True)
+
+
+def test_statistics_use_most_recent_samples_beyond_limit(monkeypatch):
+    monkeypatch.setattr(leaderboard, "LEADERBOARD_MAX_SAMPLES", 10)
+    results = [r for r in _results(3, 90) if r["model_key"] == "m0" and isinstance(r["tokens_per_second"], float)]
+    board, recent = Leaderboard(), Leaderboard()
+    for result in results:
+        board.add(result)
+    for result in results[-10:]:
+        recent.add(result)
+
+    agg = board.models["m0"]
+    assert len(agg.sorted_tps) == 10 and agg.sample_count == len(results)
+    assert agg.median_tps() == recent.models["m0"].median_tps()
+    assert agg.outlier_count() == recent.models["m0"].outlier_count()
+    for k, value in recent.models["m0"].means().items():
+        assert agg.means()[k] == pytest.approx(value, rel=1e-9)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+按请求性能分析的测试。
+"""
+
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+import profiling
+from config import PROFILING
+
+
+def _profiled_app(tmp_path, monkeypatch):
+    monkeypatch.setitem(PROFILING, "enabled", True)
+    monkeypatch.setitem(PROFILING, "dir", str(tmp_path))
+    app = Flask(__name__)
+    # 异常直接抛出（调试模式下的行为），不经过错误处理和 after_request
+    app.config["PROPAGATE_EXCEPTIONS"] = True
+    profiling.init_app(app)
+
+    @app.route("/ok")
+    def ok():
+        return "ok"
+
+    @app.route("/fail")
+    def fail():
+        raise RuntimeError("boom")
+
+    return app
+
+
+def test_profiler_is_stopped_when_view_raises(tmp_path, monkeypatch):
+    client = _profiled_app(tmp_path, monkeypatch).test_client()
+
+    with pytest.raises(RuntimeError):
+        client.get("/fail?profile=1")
+    assert sys.getprofile() is None
+    assert len(os.listdir(tmp_path / profiling.REQUEST_PROFILE_DIR)) == 2
+
+    response = client.get("/ok?profile=1")
+    assert sys.getprofile() is None
+    report = response.headers["X-Profile"].split("/")[-1]
+    assert os.path.exists(tmp_path / profiling.REQUEST_PROFILE_DIR / report)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+测试线程调度的测试。
+"""
+
+import time
+import threading
+
+import test_runner
+from config import PROBE_CONCURRENCY
+from run_state import RunState
+
+
+def test_stagger_is_bounded_by_window_not_endpoint_count(monkeypatch):
+    monkeypatch.setitem(PROBE_CONCURRENCY, "max_in_flight", 8)
+    monkeypatch.setitem(PROBE_CONCURRENCY, "stagger_seconds", 0.5)
+    monkeypatch.setitem(PROBE_CONCURRENCY, "stagger_window_seconds", 0.4)
+    lock = threading.Lock()
+    running, peak, done = [0], [0], []
+
+    def probe(key):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+            done.append(key)
+
+    began = time.monotonic()
+    test_runner._run_staggered([(f"probe-{i}", probe, (i,), {"model_key": str(i)}) for i in range(200)], RunState())
+    elapsed = time.monotonic() - began
+
+    assert sorted(done) == list(range(200))
+    assert peak[0] <= 8
+    # 旧实现每个端点固定等待 0.5 秒，200 个端点需要约 100 秒
+    assert elapsed < 3
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+趋势图时间范围的测试。
+"""
+
+import timeseries
+
+
+def test_relative_window_slides_by_downsampling_bucket(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(timeseries.time, "time", lambda: now[0])
+    # 1 天、宽度 864 像素：每个桶 100 秒
+    start = timeseries.window_start(days=1, width=864)
+    now[0] += 100 - now[0] % 100 - 1
+    assert timeseries.window_start(days=1, width=864) == start
+    now[0] += 1
+    assert timeseries.window_start(days=1, width=864) > start
+
+
+def test_explicit_start_is_kept():
+    assert timeseries.window_start("2025-01-01T00:00:00", days=1) == "2025-01-01T00:00:00"
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+分布式探测的端到端测试：启动多个 worker.py 进程，按分片测试本地的模拟服务商，
+结果上报到使用临时数据库的主服务 /collect。
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import registry
+from config import COLLECTOR
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_KEYS = [f"m{i}" for i in range(6)]
+ROUNDS = 2
+WORKERS = 2
+
+
+class FakeProvider(BaseHTTPRequestHandler):
+    """流式返回 3 个回答 token 与 usage 的模拟服务商"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        chunks = [{"choices": [{"index": 0, "delta": {"content": f"a{i} "}}]} for i in range(3)]
+        chunks.append({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        chunks.append({"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8}})
+        data = b"".join(f"data: {json.dumps(dict(c, model=body.get('model')))}\n\n".encode() for c in chunks)
+        data += b"data: [DONE]\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+class DropFirstResponses:
+    """/collect 的前 count 次请求照常处理，但响应改为 503，让 worker 重发同一批结果"""
+
+    def __init__(self, app, count):
+        self.app = app
+        self.remaining = count
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self.lock:
+            drop = environ["PATH_INFO"] == "/collect" and self.remaining > 0
+            self.remaining -= drop
+        if not drop:
+            return self.app(environ, start_response)
+        b"".join(self.app(environ, lambda *args: None))
+        start_response("503 Service Unavailable", [("Content-Length", "0")])
+        return [b""]
+
+
+def test_workers_store_each_probe_once_with_their_vantage(temp_db, tmp_path, monkeypatch):
+    pytest.importorskip("yaml")
+    from werkzeug.serving import make_server
+    from app import app
+
+    monkeypatch.setitem(COLLECTOR, "token", "secret")
+    provider = _serve(ThreadingHTTPServer(("127.0.0.1", 0), FakeProvider))
+    dropper = DropFirstResponses(app.wsgi_app, 2)
+    monkeypatch.setattr(app, "wsgi_app", dropper)
+    collector = _serve(make_server("127.0.0.1", 0, app, threaded=True))
+
+    # 注册表文件在 worker 的工作目录下（JSON 也是合法的 YAML）
+    endpoints = {key: {"url": f"http://127.0.0.1:{provider.server_port}/{key}", "api_key": "x",
+                       "payload_model": key, "tags": ["worker-test"]} for key in MODEL_KEYS}
+    (tmp_path / "endpoints.yaml").write_text(json.dumps({"endpoints": endpoints}), encoding="utf-8")
+    owners = {key: f"w{i}" for i in range(WORKERS) for key in registry.shard(MODEL_KEYS, i, WORKERS)}
+    assert set(owners.values()) == {f"w{i}" for i in range(WORKERS)}
+
+    try:
+        workers = [subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "worker.py"),
+             "--collector", f"http://127.0.0.1:{collector.server_port}", "--token", "secret",
+             "--vantage", f"w{i}", "--shard", f"{i}/{WORKERS}", "--tags", "worker-test",
+             "--rounds", str(ROUNDS), "--timeout", "30"],
+            cwd=tmp_path, env=dict(os.environ, PYTHONPATH=ROOT),
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        ) for i in range(WORKERS)]
+        for worker in workers:
+            _, stderr = worker.communicate(timeout=120)
+            assert worker.returncode == 0, stderr.decode("utf-8", "replace")[-2000:]
+    finally:
+        collector.shutdown()
+        provider.shutdown()
+
+    assert dropper.remaining == 0
+    with sqlite3.connect(temp_db) as conn:
+        rows = conn.execute(
+            "SELECT vantage, model_key, test_round, is_warmup, count(*) FROM probe_results GROUP BY 1, 2, 3, 4"
+        ).fetchall()
+    assert all(count == 1 for *_, count in rows)
+    assert {(vantage, key, test_round) for vantage, key, test_round, is_warmup, _ in rows if not is_warmup} == {
+        (owners[key], key, test_round) for key in MODEL_KEYS for test_round in range(1, ROUNDS + 1)}
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+趋势图数据：按模型读取一段时间内每次正式请求的指标（如 tokens/s），在服务端用 LTTB
+（Largest-Triangle-Three-Buckets）降采样到与图表宽度相当的点数，浏览器只需绘制几百个点。
+原始请求已被保留任务删除的日期用 probe_rollups 中同一探测点的日均值补齐。
+结果按请求参数和实际时间范围缓存，有新的请求明细或归档后自动失效。
+"""
+
+import time
+import datetime
+import threading
+from collections import OrderedDict
+
+import db_utils
+from config import TIMESERIES, COLLECTOR
+from models_config import MODELS_CONFIG
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样：保留首尾两点，中间按时间均分为 threshold - 2 个桶，
+    每个桶选出与上一个选中点、下一个桶的平均点构成三角形面积最大的点，保留峰谷形状。
+    points 为按时间排序的 [(x, y)]，点数不超过 threshold 时原样返回。
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_end > end:
+            next_bucket = points[end:next_end]
+            avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+            avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+        else:
+            avg_x, avg_y = points[-1]
+        ax, ay = points[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def _group_by_model(rows):
+    """把按 (模型, 时间) 排序的行分组为 {模型: [(时间, 值)]}"""
+    series = {}
+    current_key, current = None, None
+    for model_key, x, y in rows:
+        if model_key != current_key:
+            current_key, current = model_key, series.setdefault(model_key, [])
+        current.append((x, y))
+    return series
+
+
+def _build(metric, start, end, width, model_keys, vantage):
+    raw = _group_by_model(db_utils.iter_series_points(metric, start, end, model_keys, vantage))
+    rollups = _group_by_model(db_utils.load_series_rollups(
+        metric, start[:10] if start else None, end[:10] if end else None, model_keys, vantage))
+    series = []
+    for model_key in sorted(set(raw) | set(rollups)):
+        points = raw.get(model_key, [])
+        if model_key in rollups:
+            points = sorted(points + rollups[model_key])
+        sampled = lttb(points, width)
+        series.append({
+            "model_key": model_key,
+            "model_name": MODELS_CONFIG.get(model_key, {}).get("display_name", model_key),
+            "count": len(points),
+            "rollup_points": len(rollups.get(model_key, [])),
+            "points": [[round(x), round(y, 4)] for x, y in sampled],
+        })
+    return series
+
+
+def clamp_width(width):
+    return max(3, min(int(width), TIMESERIES["max_width"]))
+
+
+def window_start(start=None, days=None, width=800):
+    """
+    实际的起始时间：给出 start 时原样返回，否则为最近 days（默认 TIMESERIES["default_days"]）天，
+    并向下取整到一个降采样桶的时长（days / width），窗口每滑过一个桶才变化一次。
+    """
+    if start is not None:
+        return start
+    days = days or TIMESERIES["default_days"]
+    bucket = max(days * 86400 / clamp_width(width), 1.0)
+    begin = time.time() - days * 86400
+    return datetime.datetime.fromtimestamp(begin - begin % bucket).isoformat()
+
+
+def load_series(metric="tokens_per_second", start=None, end=None, days=None, width=800, model_keys=None,
+                vantage=None):
+    """
+    返回趋势图数据 dict：每个模型一条序列，点为 [时间毫秒, 值]，每条不超过 width 个点。
+    时间范围见 window_start；vantage 默认为本地探测点。
+    """
+    if metric not in db_utils.SERIES_METRICS:
+        raise ValueError(f"unsupported metric: {metric}")
+    width = clamp_width(width)
+    vantage = vantage or COLLECTOR["local_vantage"]
+    model_keys = tuple(sorted(model_keys)) if model_keys else None
+    start_value = window_start(start, days, width)
+
+    key = (metric, start_value, end, width, model_keys, vantage, db_utils.load_probes_version())
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and now - cached[0] < TIMESERIES["cache_seconds"]:
+            _cache.move_to_end(key)
+            return dict(cached[1], cached=True)
+
+    began = time.perf_counter()
+    series = _build(metric, start_value, end, width, model_keys, vantage)
+    result = {
+        "metric": metric,
+        "start": start_value,
+        "end": end,
+        "width": width,
+        "vantage": vantage,
+        "series": series,
+        "took_ms": round((time.perf_counter() - began) * 1000, 1),
+        "cached": False,
+    }
+    with _cache_lock:
+        _cache[key] = (now, result)
+        while len(_cache) > TIMESERIES["cache_size"]:
+            _cache.popitem(last=False)
+    return result
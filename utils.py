@@ -6,19 +6,19 @@ Version: 0.2.0
 Author: Gwaanl
 
 一些常用的辅助函数，如日志配置、导出图片、生成带样式的HTML表格等
+pandas 与 imgkit 只在用到的函数内导入，仅使用 logger 时不会加载它们；
+日志文件在第一条日志写入时才打开
 """
 
 import os
 import logging
 import json
-import pandas as pd
-import imgkit
 
 # ========== 日志配置 ==========
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-file_handler = logging.FileHandler("test.log", mode="a", encoding="utf-8")
+file_handler = logging.FileHandler("test.log", mode="a", encoding="utf-8", delay=True)
 file_handler.setLevel(logging.DEBUG)
 file_formatter = logging.Formatter(
     "%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d - %(message)s"
@@ -38,6 +38,8 @@ os.environ['no_proxy'] = '*'
 
 def detect_outliers_iqr(df, group_col='model_key', target_col='tokens_per_second'):
     """使用 IQR 方法检测并标记离群值"""
+    import pandas as pd
+
     df = df.copy()
     df['is_outlier'] = False
     df[target_col] = pd.to_numeric(df[target_col], errors='coerce')
@@ -59,10 +61,37 @@ def detect_outliers_iqr(df, group_col='model_key', target_col='tokens_per_second
         df.loc[outlier_index, 'is_outlier'] = True
     return df
 
+# 扩展指标列（推理/回答拆分、限流等）的显示格式，单轮表与汇总表共用
+METRIC_COLUMN_FORMATS = {
+    'Time to Answer (s)': "{:.2f}",
+    'TTFT (s)': "{:.2f}",
+    'Reasoning Tokens': "{:.0f}",
+    'Content Tokens': "{:.0f}",
+    'Reasoning Time (s)': "{:.2f}",
+    'Content Time (s)': "{:.2f}",
+    'Content Tokens/s': "{:.2f}",
+    'Avg Time to Answer (s)': "{:.2f}",
+    'Avg TTFT (s)': "{:.2f}",
+    'Avg Reasoning Tokens': "{:.0f}",
+    'Avg Content Tokens': "{:.0f}",
+    'Avg Reasoning Time (s)': "{:.2f}",
+    'Avg Content Time (s)': "{:.2f}",
+    'Avg Content Tokens/s': "{:.2f}",
+    '429 Retries': "{:.0f}",
+    'Throttle Wait (s)': "{:.2f}",
+    'Total 429 Retries': "{:.0f}",
+    'Total Throttle Wait (s)': "{:.2f}",
+}
+
+def _lazy_text_link(probe_id, field):
+    """响应文本未保留在内存中时，表格单元格显示为按需加载的链接"""
+    return f'<a href="/probe/{int(probe_id)}/{field}" target="_blank">查看</a>'
+
 def make_styled_table_html(df, highlight_tps=True, is_summary=False, hide_response_cols=False):
     """
     生成带有自定义CSS的HTML表格。
     - hide_response_cols=True 时，会隐藏 "Response JSON"、"Content" 和 "Reasoning Content" 列。
+    - 带 probe_id 且 raw_response 为空的行（响应文本只保存在数据库中），这三列显示为按需加载的链接。
     """
     import pandas as pd
     import json
@@ -85,6 +114,11 @@ def make_styled_table_html(df, highlight_tps=True, is_summary=False, hide_respon
             return pd.Series({'Content': content, 'Reasoning Content': reasoning})
         extracted = df['raw_response'].apply(extract_fields)
         df = pd.concat([df, extracted], axis=1)
+        if 'probe_id' in df.columns:
+            lazy = df['raw_response'].isna() & df['probe_id'].notna()
+            for column, field in (('raw_response', 'raw'), ('Content', 'content'), ('Reasoning Content', 'reasoning')):
+                df[column] = df[column].astype(object)
+                df.loc[lazy, column] = df.loc[lazy, 'probe_id'].map(lambda probe_id: _lazy_text_link(probe_id, field))
 
     # 移除不需要展示的 test_round 列
     df = df.drop(columns=['test_round'], errors='ignore')
@@ -95,6 +129,16 @@ def make_styled_table_html(df, highlight_tps=True, is_summary=False, hide_respon
         'completion_tokens': 'Completion Tokens',
         'time_taken': 'Time Taken (s)',
         'tokens_per_second': 'Tokens/s (Token/s)',
+        'time_to_answer': 'Time to Answer (s)',
+        'time_to_first_token': 'TTFT (s)',
+        'reasoning_tokens': 'Reasoning Tokens',
+        'content_tokens': 'Content Tokens',
+        'reasoning_time': 'Reasoning Time (s)',
+        'content_time': 'Content Time (s)',
+        'content_tokens_per_second': 'Content Tokens/s',
+        'retries': '429 Retries',
+        'throttle_time': 'Throttle Wait (s)',
+        'circuit_state': 'Circuit',
         'input_timestamp': 'Input Time',
         'output_timestamp': 'Output Time',
         'raw_response': 'Response JSON'
@@ -111,6 +155,16 @@ def make_styled_table_html(df, highlight_tps=True, is_summary=False, hide_respon
             'Tokens/s (Token/s)',
             'Completion Tokens',
             'Time Taken (s)',
+            'Time to Answer (s)',
+            'TTFT (s)',
+            'Reasoning Tokens',
+            'Content Tokens',
+            'Reasoning Time (s)',
+            'Content Time (s)',
+            'Content Tokens/s',
+            '429 Retries',
+            'Throttle Wait (s)',
+            'Circuit',
             'Input Time',
             'Output Time',
             'Response JSON',
@@ -125,7 +179,17 @@ def make_styled_table_html(df, highlight_tps=True, is_summary=False, hide_respon
             "Avg Tokens/s (Token/s)",
             "Avg Completion Tokens",
             "Avg Time Taken (s)",
-            "Outlier Count"
+            "Avg Time to Answer (s)",
+            "Avg TTFT (s)",
+            "Avg Reasoning Tokens",
+            "Avg Content Tokens",
+            "Avg Reasoning Time (s)",
+            "Avg Content Time (s)",
+            "Avg Content Tokens/s",
+            "Outlier Count",
+            "Total 429 Retries",
+            "Total Throttle Wait (s)",
+            "Circuit State"
         ]
         existing_cols = [col for col in desired_order_summary if col in df_renamed.columns]
         remaining_cols = [c for c in df_renamed.columns if c not in existing_cols]
@@ -135,7 +199,7 @@ def make_styled_table_html(df, highlight_tps=True, is_summary=False, hide_respon
     numeric_cols = [
         'Completion Tokens', 'Time Taken (s)', 'Tokens/s (Token/s)',
         'Avg Completion Tokens', 'Avg Time Taken (s)', 'Avg Tokens/s (Token/s)'
-    ]
+    ] + list(METRIC_COLUMN_FORMATS.keys())
     for col in numeric_cols:
         if col in df_renamed.columns:
             df_renamed[col] = pd.to_numeric(df_renamed[col], errors='coerce')
@@ -171,7 +235,8 @@ def make_styled_table_html(df, highlight_tps=True, is_summary=False, hide_respon
             'Tokens/s (Token/s)': "{:.2f}",
             'Avg Completion Tokens': "{:.0f}",
             'Avg Time Taken (s)': "{:.2f}",
-            'Avg Tokens/s (Token/s)': "{:.2f}"
+            'Avg Tokens/s (Token/s)': "{:.2f}",
+            **METRIC_COLUMN_FORMATS
         }, na_rep='Error')
 
     if highlight_tps and ('Tokens/s (Token/s)' in df_renamed.columns):
@@ -190,8 +255,10 @@ def export_tables_to_image(df_rounds, df_summary):
     将 4 个表格合并为一张长图片并保存到 output 文件夹中。
     在导出的图片里，不显示 Response JSON / Content / Reasoning Content。
     """
-    os.makedirs('output', exist_ok=True)
+    import imgkit
     import datetime
+
+    os.makedirs('output', exist_ok=True)
     filename = os.path.join('output', f"test_results_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
 
     round_htmls_for_export = []
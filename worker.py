@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek Api Test
+Version: 0.2.0
+Author: Gwaanl
+
+轻量的分布式探测 worker：在本机运行与主服务相同的 test_model 测试逻辑，
+每条结果到达后由后台线程推送到主服务的 /collect，结果按 --vantage 标记探测点。
+不启动 Flask / APScheduler，也不写本地数据库。
+
+用法示例：
+    python worker.py --collector http://10.0.0.5:5000 --vantage shanghai --token 口令 --rounds 3 --interval 60
+"""
+
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+
+# 每次上报的最大结果数，以及上报失败时的重试次数
+PUSH_BATCH_SIZE = 20
+PUSH_RETRIES = 5
+
+
+def _split_list(value):
+    """逗号分隔的参数转换为列表"""
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="DeepSeek Api Test 分布式探测 worker")
+    parser.add_argument("--collector", required=True, help="主服务地址，例如 http://127.0.0.1:5000")
+    parser.add_argument("--vantage", default=socket.gethostname(), help="探测点名称，默认为主机名")
+    parser.add_argument("--token", help="与主服务 COLLECTOR['token'] 一致的上报口令")
+    parser.add_argument("--models", help="逗号分隔的模型 key，默认测试 MODELS_TO_TEST 中的全部模型")
+    parser.add_argument("--tags", help="未指定 --models 时，只测试带有这些标签（逗号分隔，任一即可）的注册表端点")
+    parser.add_argument("--groups", help="未指定 --models 时，只测试这些分组（逗号分隔）的注册表端点")
+    parser.add_argument("--shard", default="0/1", help="i/n：把端点按哈希分为 n 片，本 worker 只测试第 i 片（从 0 开始）")
+    parser.add_argument("--timeout", type=int, default=300, help="单次请求超时（秒），默认 300")
+    parser.add_argument("--rounds", type=int, default=3, help="每次测试的轮数，默认 3")
+    parser.add_argument("--mode", choices=["sequential", "interleaved"], default=None, help="执行模式")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="两次测试之间的间隔（分钟），0 表示只运行一次")
+    return parser.parse_args(argv)
+
+
+class ResultPusher:
+    """后台线程批量上报结果，测试线程只负责入队，不会被网络上报拖慢"""
+
+    def __init__(self, collector, vantage, token=None):
+        self.url = collector.rstrip("/") + "/collect"
+        self.vantage = vantage
+        self.headers = {"Content-Type": "application/json"}
+        if token:
+            self.headers["X-Collector-Token"] = token
+        self.queue = queue.Queue()
+        self.failed = 0
+        self.thread = threading.Thread(target=self._loop, name="result-pusher", daemon=True)
+        self.thread.start()
+
+    def push(self, run_id, label, result):
+        self.queue.put((run_id, label, result))
+
+    def close(self):
+        """等待队列中的结果全部上报完成"""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < PUSH_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
+            by_run = {}
+            for run_id, label, result in batch:
+                by_run.setdefault((run_id, label), []).append(result)
+            for (run_id, label), results in by_run.items():
+                self._send(run_id, label, results)
+
+    def _send(self, run_id, label, results):
+        import requests
+        from utils import logger
+
+        body = json.dumps({"vantage": self.vantage, "run_id": run_id, "label": label, "results": results},
+                          ensure_ascii=False, default=str)
+        for attempt in range(PUSH_RETRIES):
+            try:
+                response = requests.post(self.url, data=body.encode("utf-8"), headers=self.headers,
+                                         timeout=30, proxies={})
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    return
+                logger.warning(f"上报结果失败 HTTP {response.status_code}，第 {attempt + 1} 次")
+            except requests.HTTPError as e:
+                logger.error(f"上报结果被拒绝: {e}")
+                break
+            except requests.RequestException as e:
+                logger.warning(f"上报结果失败: {e}，第 {attempt + 1} 次")
+            time.sleep(min(2 ** attempt, 30))
+        self.failed += len(results)
+        logger.error(f"{len(results)} 条结果未能上报到 {self.url}")
+
+
+def select_models(args, shard_index, shard_count):
+    """每次测试前重新选择端点，注册表更新后无需重启 worker"""
+    import registry
+    from models_config import MODELS_TO_TEST
+
+    registry.reload()
+    model_keys = registry.resolve_models(_split_list(args.models), _split_list(args.tags), _split_list(args.groups))
+    if model_keys is None:
+        model_keys = list(MODELS_TO_TEST)
+    return registry.shard(model_keys, shard_index, shard_count)
+
+
+def run_once(args, model_keys, pusher):
+    import test_runner
+    from config import DEFAULT_RUN_MODE, INTERLEAVE_COOLDOWN_SECONDS
+    from run_state import RunState
+
+    state = RunState(label=f"worker:{args.vantage}", total_rounds=args.rounds,
+                     mode=args.mode or DEFAULT_RUN_MODE, cooldown=INTERLEAVE_COOLDOWN_SECONDS)
+    state.add_result_listener(lambda result: pusher.push(state.run_id, state.label, result))
+    state.set_status("running")
+    try:
+        test_runner.run_all_tests(args.timeout, model_keys, state)
+        state.set_status("finished")
+    except Exception:
+        state.set_status("failed")
+        raise
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from models_config import MODELS_CONFIG
+    from utils import logger
+
+    try:
+        shard_index, shard_count = (int(v) for v in args.shard.split("/"))
+        if not 0 <= shard_index < shard_count:
+            raise ValueError
+    except ValueError:
+        print(f"无效的 --shard: {args.shard}，格式为 i/n 且 0 <= i < n", file=sys.stderr)
+        return EXIT_ERROR
+    model_keys = select_models(args, shard_index, shard_count)
+    unknown = [k for k in model_keys if k not in MODELS_CONFIG]
+    if unknown:
+        print(f"未知的模型: {', '.join(unknown)}", file=sys.stderr)
+        return EXIT_ERROR
+
+    pusher = ResultPusher(args.collector, args.vantage, args.token)
+    logger.info(f"worker 启动，探测点 {args.vantage}，上报到 {pusher.url}")
+    try:
+        while True:
+            started = time.time()
+            try:
+                model_keys = select_models(args, shard_index, shard_count)
+                if model_keys:
+                    run_once(args, model_keys, pusher)
+                else:
+                    logger.info(f"分片 {args.shard} 没有需要测试的端点")
+            except Exception as e:
+                logger.exception(f"worker 测试异常: {e}")
+            if args.interval <= 0:
+                break
+            time.sleep(max(args.interval * 60 - (time.time() - started), 0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pusher.close()
+    return EXIT_ERROR if pusher.failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())